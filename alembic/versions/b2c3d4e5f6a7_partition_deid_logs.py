@@ -0,0 +1,166 @@
+"""monthly deid_logs partitions, created_at indexes and hourly rollups
+
+On PostgreSQL ``deid_logs`` becomes a table range-partitioned by month on
+``created_at`` (primary key ``(id, created_at)``, ``id`` now bigint on the
+same sequence), with a default partition for rows no monthly one covers.
+Existing rows are copied across in this migration: on a large table, run it
+in a maintenance window. Later partitions are created ahead of time, and
+expired ones dropped, by ``workers.maintain_deid_logs`` (app/db/maintenance.py).
+
+Other databases keep a plain ``deid_logs`` and only get the indexes and the
+rollup tables.
+
+Revision ID: b2c3d4e5f6a7
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19
+"""
+
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2c3d4e5f6a7'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+# Months created after the current one; the maintenance task keeps this up
+PARTITIONS_AHEAD = 2
+
+COLUMNS = (
+    "id, created_at, request_id, num_entities, time_ms, input_len, output_len, "
+    "policy_version, lang_hint, sample_preview"
+)
+
+
+def _months(first: datetime, ahead: int):
+    year, month = first.year, first.month
+    now = datetime.now(timezone.utc)
+    last = now.year * 12 + now.month - 1 + ahead
+    while year * 12 + month - 1 <= last:
+        start = datetime(year, month, 1, tzinfo=timezone.utc)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        yield start, datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def _partition_deid_logs() -> None:
+    bind = op.get_bind()
+    op.execute("ALTER TABLE deid_logs RENAME TO deid_logs_legacy")
+    op.execute("ALTER TABLE deid_logs_legacy RENAME CONSTRAINT deid_logs_pkey TO deid_logs_legacy_pkey")
+    op.execute("ALTER SEQUENCE deid_logs_id_seq AS bigint")
+    op.execute(
+        """
+        CREATE TABLE deid_logs (
+            id bigint NOT NULL DEFAULT nextval('deid_logs_id_seq'),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            request_id uuid NOT NULL,
+            num_entities integer NOT NULL,
+            time_ms double precision NOT NULL,
+            input_len integer NOT NULL,
+            output_len integer NOT NULL,
+            policy_version varchar(64) NOT NULL,
+            lang_hint varchar(8),
+            sample_preview text,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("CREATE TABLE deid_logs_default PARTITION OF deid_logs DEFAULT")
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM deid_logs_legacy")).scalar()
+    first = oldest.astimezone(timezone.utc) if oldest is not None else datetime.now(timezone.utc)
+    for start, end in _months(first, PARTITIONS_AHEAD):
+        op.execute(
+            f"CREATE TABLE deid_logs_y{start.year:04d}m{start.month:02d} PARTITION OF deid_logs "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    op.execute(f"INSERT INTO deid_logs ({COLUMNS}) SELECT {COLUMNS} FROM deid_logs_legacy")
+    op.execute("ALTER SEQUENCE deid_logs_id_seq OWNED BY deid_logs.id")
+    op.execute("DROP TABLE deid_logs_legacy")
+
+
+def _unpartition_deid_logs() -> None:
+    op.execute("ALTER TABLE deid_logs RENAME TO deid_logs_partitioned")
+    op.execute("ALTER TABLE deid_logs_partitioned RENAME CONSTRAINT deid_logs_pkey TO deid_logs_partitioned_pkey")
+    op.execute(
+        """
+        CREATE TABLE deid_logs (
+            id integer NOT NULL DEFAULT nextval('deid_logs_id_seq') PRIMARY KEY,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            request_id uuid NOT NULL,
+            num_entities integer NOT NULL,
+            time_ms double precision NOT NULL,
+            input_len integer NOT NULL,
+            output_len integer NOT NULL,
+            policy_version varchar(64) NOT NULL,
+            lang_hint varchar(8),
+            sample_preview text
+        )
+        """
+    )
+    op.execute(f"INSERT INTO deid_logs ({COLUMNS}) SELECT {COLUMNS} FROM deid_logs_partitioned")
+    op.execute("ALTER SEQUENCE deid_logs_id_seq OWNED BY deid_logs.id")
+    op.execute("ALTER SEQUENCE deid_logs_id_seq AS integer")
+    op.execute("DROP TABLE deid_logs_partitioned")
+
+
+def upgrade() -> None:
+    postgres = op.get_bind().dialect.name == "postgresql"
+    if postgres:
+        _partition_deid_logs()
+    # On a partitioned table these cascade to every partition, current and future
+    op.create_index('ix_deid_logs_created_at', 'deid_logs', ['created_at'])
+    op.create_index('ix_deid_logs_request_id', 'deid_logs', ['request_id'])
+    op.create_index('ix_metric_runs_created_at', 'metric_runs', ['created_at'])
+
+    op.create_table(
+        'deid_log_rollups_hourly',
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('policy_version', sa.String(length=64), nullable=False),
+        sa.Column('lang_hint', sa.String(length=8), nullable=False, server_default=''),
+        sa.Column('requests', sa.BigInteger(), nullable=False),
+        sa.Column('entities', sa.BigInteger(), nullable=False),
+        sa.Column('input_chars', sa.BigInteger(), nullable=False),
+        sa.Column('output_chars', sa.BigInteger(), nullable=False),
+        sa.Column('time_ms_sum', sa.Float(), nullable=False),
+        sa.Column('time_ms_p50', sa.Float(), nullable=False),
+        sa.Column('time_ms_p95', sa.Float(), nullable=False),
+        sa.Column('time_ms_p99', sa.Float(), nullable=False),
+        sa.Column('time_ms_max', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket', 'policy_version', 'lang_hint'),
+    )
+    # Hours the audit writer replayed rows into; the next maintenance pass recomputes from them
+    op.create_table(
+        'deid_log_rollups_stale',
+        sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('hour'),
+    )
+    if postgres:
+        # Backfill: dashboards start with the full history
+        op.execute(
+            """
+            INSERT INTO deid_log_rollups_hourly
+            SELECT
+                date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', policy_version, coalesce(lang_hint, ''),
+                count(*), sum(num_entities), sum(input_len), sum(output_len), sum(time_ms),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY time_ms),
+                percentile_cont(0.95) WITHIN GROUP (ORDER BY time_ms),
+                percentile_cont(0.99) WITHIN GROUP (ORDER BY time_ms),
+                max(time_ms)
+            FROM deid_logs
+            GROUP BY 1, 2, 3
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('deid_log_rollups_stale')
+    op.drop_table('deid_log_rollups_hourly')
+    op.drop_index('ix_metric_runs_created_at', table_name='metric_runs')
+    op.drop_index('ix_deid_logs_request_id', table_name='deid_logs')
+    op.drop_index('ix_deid_logs_created_at', table_name='deid_logs')
+    if op.get_bind().dialect.name == "postgresql":
+        # Rows of partitions already dropped by the retention job are gone for good
+        _unpartition_deid_logs()
@@ -0,0 +1,173 @@
+"""
+Admission control: shed load early instead of timing everyone out together.
+
+Each API process counts the requests it is serving per endpoint class and the
+characters (request body bytes) held by expensive ones. Beyond the configured
+budgets a request is answered at once with ``503`` and ``Retry-After``, before
+its body is read or any work is done:
+
+- ``expensive``: engine calls (``/deid``, ``/deid/file``, ``/scan``), bounded
+  by ADMISSION_EXPENSIVE_MAX_INFLIGHT and ADMISSION_MAX_INFLIGHT_CHARS
+- ``cheap``: everything else under ``/api/v1``, ADMISSION_CHEAP_MAX_INFLIGHT;
+  job submissions are also refused while their Celery queue holds more than
+  ADMISSION_MAX_QUEUE_DEPTH messages
+
+Health, metrics and event streams are never shed. Queue depths are read from
+the broker in the background at most every ADMISSION_QUEUE_CHECK_SEC, so a
+request never waits on the broker; while it is unreachable depths count as
+unknown and nothing is shed for them. A limit of 0 disables its check.
+Decisions are exported as ``deid_admission_total{class,decision}`` and the
+current load as ``deid_in_flight{class}`` / ``deid_in_flight_chars``.
+"""
+
+import asyncio
+from time import monotonic
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app.core import metrics
+from app.core.logging import get_logger
+from app.workers.queues import BULK, INTERACTIVE
+
+
+log = get_logger("admission")
+
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+
+_PREFIX = "/api/v1"
+_EXPENSIVE_ROUTES = frozenset({"/deid", "/deid/file", "/scan"})
+# Job submissions and the queue they land in (None: routed by size, as in queues.route_task)
+_JOB_ROUTES: Dict[str, Optional[str]] = {
+    "/jobs/deid": None,
+    "/jobs/deid/batch": None,
+    "/jobs/evaluate": BULK,
+    "/jobs/deid/bulk": BULK,
+}
+_UNTRACKED_ROUTES = frozenset({"/health", "/metrics"})
+
+
+def classify(method: str, path: str, chars: int, interactive_max_chars: int) -> Optional[Tuple[str, Optional[str]]]:
+    """(endpoint class, target queue) of a request; None if it is never shed."""
+    if not path.startswith(_PREFIX + "/"):
+        return None
+    route = path[len(_PREFIX):]
+    if route in _UNTRACKED_ROUTES or route.endswith("/events"):
+        return None
+    if method == "POST" and route in _EXPENSIVE_ROUTES:
+        return EXPENSIVE, None
+    if method == "POST" and route in _JOB_ROUTES:
+        queue = _JOB_ROUTES[route] or (BULK if chars > interactive_max_chars else INTERACTIVE)
+        return CHEAP, queue
+    return CHEAP, None
+
+
+class AdmissionController:
+    """Per-process in-flight budgets; one instance per API process (app.state.admission)."""
+
+    def __init__(self, settings, depth_source: Optional[Callable[[], Dict[str, int]]] = None) -> None:
+        self.settings = settings
+        self.in_flight: Dict[str, int] = {CHEAP: 0, EXPENSIVE: 0}
+        self.in_flight_chars = 0
+        # Blocking broker read, run in the threadpool; None disables the queue check
+        self._depth_source = depth_source
+        self._depths: Dict[str, int] = {}
+        self._depths_at = float("-inf")
+        self._refresh: Optional[asyncio.Task] = None
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Latest known depths; starts a background refresh when they are stale."""
+        if (
+            self._depth_source is not None
+            and (self._refresh is None or self._refresh.done())
+            and monotonic() - self._depths_at >= self.settings.admission_queue_check_sec
+        ):
+            self._refresh = asyncio.get_running_loop().create_task(self.refresh_queue_depths())
+        return self._depths
+
+    async def refresh_queue_depths(self) -> None:
+        try:
+            self._depths = await run_in_threadpool(self._depth_source)
+        except Exception as e:
+            log.warning(f"Queue depths unavailable, not shedding on them: {e}")
+            self._depths = {}
+        finally:
+            self._depths_at = monotonic()
+            self._refresh = None
+
+    def check(self, cls: str, chars: int, queue: Optional[str] = None) -> Optional[str]:
+        """The reason to shed this request, or None to admit it."""
+        s = self.settings
+        limit = s.admission_expensive_max_inflight if cls == EXPENSIVE else s.admission_cheap_max_inflight
+        if limit > 0 and self.in_flight[cls] >= limit:
+            return "in_flight"
+        if (
+            cls == EXPENSIVE
+            and s.admission_max_inflight_chars > 0
+            and self.in_flight_chars > 0
+            and self.in_flight_chars + chars > s.admission_max_inflight_chars
+        ):
+            # One oversized request alone is admitted; the body limit bounds it
+            return "chars"
+        if queue is not None and s.admission_max_queue_depth > 0:
+            if self.queue_depths().get(queue, 0) >= s.admission_max_queue_depth:
+                return "queue_depth"
+        return None
+
+    def acquire(self, cls: str, chars: int) -> None:
+        self.in_flight[cls] += 1
+        metrics.set_in_flight(cls, self.in_flight[cls])
+        if cls == EXPENSIVE:
+            self.in_flight_chars += chars
+            metrics.set_in_flight_chars(self.in_flight_chars)
+
+    def release(self, cls: str, chars: int) -> None:
+        self.in_flight[cls] -= 1
+        metrics.set_in_flight(cls, self.in_flight[cls])
+        if cls == EXPENSIVE:
+            self.in_flight_chars -= chars
+            metrics.set_in_flight_chars(self.in_flight_chars)
+
+
+def _content_length(scope) -> int:
+    for name, value in scope.get("headers") or ():
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController; add it outermost."""
+
+    def __init__(self, app, controller: AdmissionController) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        chars = _content_length(scope)
+        route = classify(scope["method"], scope["path"], chars, self.controller.settings.interactive_max_chars)
+        if route is None:
+            return await self.app(scope, receive, send)
+        cls, queue = route
+        reason = self.controller.check(cls, chars, queue)
+        metrics.admission(cls, reason or "admitted")
+        if reason is not None:
+            retry_after = max(int(self.controller.settings.admission_retry_after_sec), 1)
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Server overloaded ({cls} {reason.replace('_', ' ')}); retry later"},
+                headers={"Retry-After": str(retry_after)},
+            )
+            return await response(scope, receive, send)
+        self.controller.acquire(cls, chars)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(cls, chars)
@@ -3,6 +3,7 @@ from typing import Optional, Dict, Tuple
 import time
 from fastapi import Header, HTTPException, Request
 
+from app.core import metrics
 from app.core.config import get_settings
 
 
@@ -23,13 +24,38 @@ async def require_api_key(
     return
 
 
+async def require_admin(
+    request: Request, x_api_key: Optional[str] = Header(default=None, alias="X-API-Key")
+) -> None:
+    # Admin features stay off in demo mode: an API key must be configured and supplied
+    settings = get_settings()
+    if not settings.api_key:
+        raise HTTPException(status_code=403, detail="Admin features require API_KEY to be configured")
+    supplied = x_api_key or request.cookies.get("X-API-Key") or request.cookies.get("api_key")
+    if not supplied or supplied != settings.api_key:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+
+
+async def profile_requested(
+    request: Request,
+    x_profile: Optional[str] = Header(default=None, alias="X-Profile"),
+    x_api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+) -> bool:
+    """True when the caller asked for a profile (X-Profile header or ?profile=1) and is admin."""
+    flag = x_profile or request.query_params.get("profile")
+    if not flag or flag.lower() in ("0", "false", "no"):
+        return False
+    await require_admin(request, x_api_key)
+    return True
+
+
 # Simple in-process rate limiter (per IP per minute) for critical endpoints
 _rate_store: Dict[Tuple[str, str, int], int] = {}
 
 
 async def rate_limit(request: Request) -> None:
     path = request.url.path
-    if not (path.endswith("/deid") or path.endswith("/deid/file")):
+    if not (path.endswith("/deid") or path.endswith("/deid/file") or path.endswith("/scan")):
         return
     client_ip = request.client.host if request.client else "unknown"
     minute_window = int(time.time() // 60)
@@ -37,4 +63,5 @@ async def rate_limit(request: Request) -> None:
     count = _rate_store.get(key, 0) + 1
     _rate_store[key] = count
     if count > 30:
+        metrics.rejection("rate_limited")
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
@@ -1,17 +1,37 @@
-from typing import Dict, List, Optional
-
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, Request
+import math
+import os
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, UploadFile, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Literal
 
+from app.core import metrics, profiling
+from app.api.security import profile_requested, require_admin
 from app.core.config import get_settings
+from app.deid.cost import load_cost_model
 from app.deid.engine import DeidEngine, POLICY_MAP as DEFAULT_POLICY_MAP
+from app.deid.recognizers import contains_phi, detector_plan
 from app.core.limiter import limiter
-from app.db.session import get_db
-from app.db.models import MetricRun
-from sqlalchemy.orm import Session
-from app.workers.tasks import deid_text_task, evaluate_dataset_task
+from app.db.audit import audit_log, deid_log_row
+from app.db.session import get_async_db
+from app.db.models import DeidLogRollup, MetricRun
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deid.bulk import bulk_progress
+from app.workers.tasks import bulk_deid, deid_batch_task, deid_text_task, evaluate_dataset_distributed, evaluate_dataset_task
 from app.workers.celery_app import celery_app
+from app.workers.events import JobEvents
+from app.workers.queues import queue_depths
+from app.workers.status import job_results, job_statuses, wait_for_job
+from redis.exceptions import RedisError
 
 
 router = APIRouter()
@@ -38,11 +58,21 @@ _engine = DeidEngine(
     salt=_settings.deid_salt,
     default_policy=_policy_state.default_policy,
 )
+# Calibrated by scripts/calibrate_cost.py; without it only the size rule offloads
+_cost_model = load_cost_model(_settings.cost_model_path)
+
+
+ResultMode = Literal["full", "spans", "patch", "counts"]
 
 
 class DeidRequest(BaseModel):
     text: str
     lang_hint: Optional[Literal["en", "el"]] = None
+    mode: ResultMode = "full"
+    labels: Optional[List[str]] = None
+    exclude_labels: Optional[List[str]] = None
+    fail_closed: Optional[bool] = None
+    timings: bool = False
 
 
 class EngineEntity(BaseModel):
@@ -51,11 +81,125 @@ class EngineEntity(BaseModel):
     action: str
 
 
+class PatchOp(BaseModel):
+    span: List[int] = Field(..., min_items=2, max_items=2)
+    replacement: str
+
+
 class DeidResult(BaseModel):
+    # Only the fields produced by the requested mode are populated; unset ones
+    # are dropped from the response via response_model_exclude_none.
     original_len: int
-    result_text: str
-    entities: List[EngineEntity]
+    result_text: Optional[str] = None
+    entities: Optional[List[EngineEntity]] = None
+    patch: Optional[List[PatchOp]] = None
+    counts: Optional[Dict[str, int]] = None
+    plan: Optional[Dict] = None
+    coverage: Optional[Dict] = None
     time_ms: int
+    timings: Optional[Dict[str, int]] = None
+
+
+def _check_labels(labels: Optional[List[str]], exclude_labels: Optional[List[str]]) -> None:
+    try:
+        detector_plan(labels, exclude_labels)
+    except ValueError as e:
+        metrics.rejection("unknown_label")
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _split_labels(value: Optional[str]) -> Optional[List[str]]:
+    # Multipart forms carry label lists as comma separated strings
+    if not value:
+        return None
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _deadline(x_deadline_ms: Optional[int]) -> Optional[float]:
+    # Header wins over the configured default; <= 0 means no deadline
+    budget_ms = x_deadline_ms if x_deadline_ms is not None else _settings.deid_deadline_ms
+    if not budget_ms or budget_ms <= 0:
+        return None
+    return monotonic() + budget_ms / 1000.0
+
+
+def _fail_closed(value: Optional[bool]) -> bool:
+    return _settings.deid_fail_closed if value is None else value
+
+
+def _offload_reason(req: "DeidRequest") -> Tuple[Optional[str], Optional[float]]:
+    # Why a /deid request should run on the workers ("size" or "cost"), plus its estimated seconds
+    chars = len(req.text)
+    if chars > _settings.max_text_size:
+        return None, None  # rejected with a 413 by the engine
+    estimate = (
+        _cost_model.estimate(chars, req.lang_hint, req.mode, req.labels, req.exclude_labels)
+        if _cost_model is not None else None
+    )
+    if 0 < _settings.deid_async_chars < chars:
+        return "size", estimate
+    if estimate is not None and 0 < _settings.deid_async_cost_sec < estimate:
+        return "cost", estimate
+    return None, estimate
+
+
+def _task_policy() -> Dict:
+    # Workers start from the configured policy; send the runtime one (PUT /config) if it differs
+    if _policy_state.policy_map == DEFAULT_POLICY_MAP and _policy_state.default_policy == _settings.deid_default_policy:
+        return {}
+    return {"policy_map": _policy_state.policy_map, "default_policy": _policy_state.default_policy}
+
+
+async def _offload(req: "DeidRequest", request: Request, reason: str, estimate: Optional[float], wait: float):
+    metrics.offload(reason)
+    task = deid_text_task.apply_async(kwargs=dict(
+        text=req.text,
+        lang_hint=req.lang_hint,
+        mode=req.mode,
+        labels=req.labels,
+        exclude_labels=req.exclude_labels,
+        fail_closed=req.fail_closed,
+        **_task_policy(),
+    ))
+    wait = min(wait, _settings.deid_async_max_wait_sec)
+    if wait > 0:
+        try:
+            state = await wait_for_job(task.id, wait)
+            if state in ("SUCCESS", "FAILURE"):
+                job = (await job_results([task.id]))[task.id]
+                if state == "SUCCESS":
+                    return job["result"]
+                raise HTTPException(status_code=500, detail=f"De-identification job failed: {job['error']}")
+        except RedisError:
+            pass  # the client can still poll the status URL
+    status_url = request.app.url_path_for("job_status", task_id=task.id)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "task_id": task.id,
+            "status": "queued",
+            "status_url": status_url,
+            "reason": reason,
+            "estimated_sec": estimate,
+        },
+        headers={"Location": status_url, "Retry-After": str(min(max(math.ceil(estimate or 1), 1), 60))},
+    )
+
+
+def _audit(result: Dict, lang_hint: Optional[str]) -> None:
+    # Enqueue only: the audit writer inserts in batches off the request path
+    if _settings.deid_api_logs:
+        policy_version = f"{_settings.app_version}:{_policy_state.default_policy}"
+        audit_log().record(deid_log_row(result, lang_hint, policy_version))
+
+
+def _timed_response(payload, timings_us: Dict[str, int]) -> JSONResponse:
+    # Serialize by hand so the header can include serialization time as well
+    t0 = perf_counter()
+    response = JSONResponse(content=jsonable_encoder(payload, exclude_none=True))
+    serialize_us = int((perf_counter() - t0) * 1_000_000)
+    response.headers["Server-Timing"] = metrics.server_timing({**timings_us, "serialize": serialize_us})
+    return response
 
 
 @limiter.exempt
@@ -64,6 +208,20 @@ async def health():
     return {"status": "ok", "version": _settings.app_version}
 
 
+@limiter.exempt
+@router.get("/metrics")
+async def prometheus_metrics():
+    if not metrics.AVAILABLE:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    if metrics.enabled():
+        try:
+            await run_in_threadpool(_queue_depths)
+        except Exception:
+            pass  # broker down: scrape the remaining metrics anyway
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 @router.get("/config", response_model=PolicyConfig)
 async def get_config():
     return _policy_state
@@ -89,36 +247,173 @@ async def update_config(update: PolicyUpdate):
 
 
 @limiter.limit("30/minute")
-@router.post("/deid", response_model=DeidResult)
-async def deid(req: DeidRequest, request: Request):
+@router.post(
+    "/deid",
+    response_model=DeidResult,
+    response_model_exclude_none=True,
+    responses={202: {"description": "Queued to the workers; poll status_url (Location)"}},
+)
+async def deid(
+    req: DeidRequest,
+    request: Request,
+    wait: float = Query(default=0.0, ge=0),
+    x_deadline_ms: Optional[int] = Header(default=None, alias="X-Deadline-Ms"),
+    profile: bool = Depends(profile_requested),
+):
+    deadline = _deadline(x_deadline_ms)
+    _check_labels(req.labels, req.exclude_labels)
+    # Deadline, profile and timings requests are about this run: they stay synchronous
+    if x_deadline_ms is None and not profile and not req.timings:
+        reason, estimate = _offload_reason(req)
+        if reason is not None:
+            # ?wait=<sec> long-polls: the result if the job finishes in time, else 202
+            return await _offload(req, request, reason, estimate, wait)
+    profiler = (
+        profiling.profile("api.deid", {"chars": len(req.text), "mode": req.mode})
+        if profile else nullcontext()
+    )
     try:
-        result = _engine.deidentify(req.text, lang_hint=req.lang_hint)
-        return result
+        with profiler as prof:
+            result = _engine.deidentify(
+                req.text,
+                lang_hint=req.lang_hint,
+                mode=req.mode,
+                labels=req.labels,
+                exclude_labels=req.exclude_labels,
+                deadline=deadline,
+                fail_closed=_fail_closed(req.fail_closed),
+                timings=req.timings,
+            )
+        _audit(result, req.lang_hint)
+        if req.timings:
+            response = _timed_response(DeidResult(**result), result["timings"])
+        elif prof is not None:
+            response = JSONResponse(content=jsonable_encoder(DeidResult(**result), exclude_none=True))
+        else:
+            return result
+        if prof is not None:
+            response.headers["X-Profile-Id"] = prof.id
+        return response
     except ValueError as e:
+        metrics.rejection("too_large")
         raise HTTPException(status_code=413, detail=str(e))
 
 
 @limiter.limit("30/minute")
-@router.post("/deid/file", response_model=List[DeidResult])
+@router.post("/deid/file", response_model=List[DeidResult], response_model_exclude_none=True)
 async def deid_file(
     request: Request,
     files: List[UploadFile] = File(...),
     lang_hint: Optional[Literal["en", "el"]] = Form(None),
+    mode: ResultMode = Form("full"),
+    labels: Optional[str] = Form(None),
+    exclude_labels: Optional[str] = Form(None),
+    fail_closed: Optional[bool] = Form(None),
+    timings: bool = Form(False),
+    x_deadline_ms: Optional[int] = Header(default=None, alias="X-Deadline-Ms"),
 ):
+    # One budget for the whole upload, shared by all files
+    deadline = _deadline(x_deadline_ms)
+    include, exclude = _split_labels(labels), _split_labels(exclude_labels)
+    _check_labels(include, exclude)
     results: List[DeidResult] = []  # type: ignore
     for f in files:
         try:
             content = (await f.read()).decode("utf-8", errors="ignore")
-            res = _engine.deidentify(content, lang_hint=lang_hint)
+            res = _engine.deidentify(
+                content,
+                lang_hint=lang_hint,
+                mode=mode,
+                labels=include,
+                exclude_labels=exclude,
+                deadline=deadline,
+                fail_closed=_fail_closed(fail_closed),
+                timings=timings,
+            )
+            _audit(res, lang_hint)
             results.append(DeidResult(**res))
         except ValueError as e:
+            metrics.rejection("too_large")
             raise HTTPException(status_code=413, detail=f"{f.filename}: {e}")
+    if timings:
+        # Header carries the per-stage sum over all files
+        total: Dict[str, int] = {}
+        for r in results:
+            for name, us in (r.timings or {}).items():
+                total[name] = total.get(name, 0) + us
+        return _timed_response(results, total)
     return results
 
 
+class ScanRequest(BaseModel):
+    text: str
+    lang_hint: Optional[Literal["en", "el"]] = None
+    min_priority: int = 0
+
+
+class ScanResult(BaseModel):
+    contains_phi: bool
+    label: Optional[str] = None
+    span: Optional[List[int]] = None
+    detector: Optional[str] = None
+    time_ms: int
+
+
+@limiter.limit("30/minute")
+@router.post("/scan", response_model=ScanResult)
+async def scan(req: ScanRequest, request: Request):
+    if len(req.text) > _settings.max_text_size:
+        metrics.rejection("too_large")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text too long: {len(req.text)} chars (max {_settings.max_text_size})",
+        )
+    t0 = perf_counter()
+    hit = contains_phi(req.text, lang_hint=req.lang_hint, min_priority=req.min_priority)
+    elapsed_ms = int((perf_counter() - t0) * 1000)
+    if hit is None:
+        return ScanResult(contains_phi=False, time_ms=elapsed_ms)
+    return ScanResult(
+        contains_phi=True,
+        label=hit.label,
+        span=[hit.start, hit.end],
+        detector=hit.detector,
+        time_ms=elapsed_ms,
+    )
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def profiles_list():
+    return profiling.list_profiles()
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def profile_summary(profile_id: str):
+    try:
+        return profiling.load_summary(profile_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+
+@router.get("/profiles/{profile_id}/collapsed", dependencies=[Depends(require_admin)])
+async def profile_collapsed(profile_id: str):
+    try:
+        body = profiling.load_collapsed(profile_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=body, media_type="text/plain; charset=utf-8")
+
+
 @router.get("/metrics/last")
-async def metrics_last(db: Session = Depends(get_db)):
-    run = db.query(MetricRun).order_by(MetricRun.created_at.desc()).first()
+async def metrics_last(db: AsyncSession = Depends(get_async_db)):
+    # Benchmark rows (scripts/benchmark.py --write-db) are not evaluation results
+    query = (
+        select(MetricRun)
+        .where(~MetricRun.dataset_name.like("benchmark:%"))
+        .order_by(MetricRun.created_at.desc())
+        .limit(1)
+    )
+    run = (await db.execute(query)).scalars().first()
     if not run:
         return None
     return {
@@ -133,29 +428,210 @@ async def metrics_last(db: Session = Depends(get_db)):
     }
 
 
+@router.get("/metrics/hourly")
+async def metrics_hourly(hours: int = Query(default=24, ge=1, le=24 * 90), db: AsyncSession = Depends(get_async_db)):
+    # Dashboards read the rollups (workers.maintain_deid_logs), never the raw deid_logs rows
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    query = (
+        select(DeidLogRollup)
+        .where(DeidLogRollup.bucket >= since)
+        .order_by(DeidLogRollup.bucket, DeidLogRollup.policy_version, DeidLogRollup.lang_hint)
+    )
+    rows = (await db.execute(query)).scalars().all()
+    return {
+        "hours": [
+            {
+                "bucket": r.bucket.isoformat(),
+                "policy_version": r.policy_version,
+                "lang_hint": r.lang_hint or None,
+                "requests": r.requests,
+                "entities": r.entities,
+                "input_chars": r.input_chars,
+                "output_chars": r.output_chars,
+                "time_ms_avg": r.time_ms_sum / r.requests if r.requests else 0.0,
+                "time_ms_p50": r.time_ms_p50,
+                "time_ms_p95": r.time_ms_p95,
+                "time_ms_p99": r.time_ms_p99,
+                "time_ms_max": r.time_ms_max,
+            }
+            for r in rows
+        ]
+    }
+
+
 # --- Optional job queue endpoints ---
 @router.post("/jobs/deid")
-async def queue_deid(req: DeidRequest):
-    task = deid_text_task.delay(req.text, req.lang_hint)
+async def queue_deid(
+    req: DeidRequest,
+    x_deadline_ms: Optional[int] = Header(default=None, alias="X-Deadline-Ms"),
+    profile: bool = Depends(profile_requested),
+):
+    _check_labels(req.labels, req.exclude_labels)
+    # Monotonic clocks are per process, so the worker gets the relative budget
+    task = deid_text_task.delay(
+        req.text,
+        req.lang_hint,
+        req.mode,
+        req.labels,
+        req.exclude_labels,
+        x_deadline_ms,
+        req.fail_closed,
+        profile,
+    )
     return {"task_id": task.id, "status": "queued"}
 
 
+class DeidBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_items=1)
+    lang_hint: Optional[Literal["en", "el"]] = None
+    mode: ResultMode = "full"
+    labels: Optional[List[str]] = None
+    exclude_labels: Optional[List[str]] = None
+
+
+@router.post("/jobs/deid/batch")
+async def queue_deid_batch(req: DeidBatchRequest):
+    # One message for many short notes: one broker round trip, NER via nlp.pipe
+    if len(req.texts) > _settings.deid_batch_max:
+        metrics.rejection("batch_too_large")
+        raise HTTPException(
+            status_code=413, detail=f"Too many texts: {len(req.texts)} (max {_settings.deid_batch_max})"
+        )
+    _check_labels(req.labels, req.exclude_labels)
+    task = deid_batch_task.delay(req.texts, req.lang_hint, req.mode, req.labels, req.exclude_labels)
+    return {"task_id": task.id, "status": "queued", "texts": len(req.texts)}
+
+
 class EvalRequest(BaseModel):
     dataset_path: str
+    # Byte-range shards fanned out across workers (default EVAL_SHARDS; 1 = single task)
+    shards: Optional[int] = Field(default=None, ge=1)
 
 
 @router.post("/jobs/evaluate")
 async def queue_evaluate(req: EvalRequest):
-    task = evaluate_dataset_task.delay(req.dataset_path)
-    return {"task_id": task.id, "status": "queued"}
+    shards = req.shards or _settings.eval_shards
+    if shards <= 1:
+        task = evaluate_dataset_task.delay(req.dataset_path)
+        return {"task_id": task.id, "status": "queued", "shards": 1}
+    if not os.path.isfile(req.dataset_path):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    # task_id is the chord callback: its result is the merged MetricRun summary
+    result = evaluate_dataset_distributed(req.dataset_path, shards)
+    return {"task_id": result.id, "status": "queued", "shards": shards}
+
+
+class BulkDeidRequest(BaseModel):
+    # Both paths are resolved under BULK_ROOT (relative paths are relative to it)
+    # A JSONL file or a directory of *.jsonl files, readable by the workers
+    input_path: str
+    # Directory for part files, checkpoints and the manifest; re-submit to resume
+    output_path: str
+    shards: Optional[int] = Field(default=None, ge=1)
+    text_field: str = "text"
+    lang_hint: Optional[Literal["en", "el"]] = None
+    batch_size: int = Field(default=256, ge=1, le=10_000)
+
+
+def _bulk_path(path: str) -> str:
+    # Workers read and write whatever the job names: keep it inside BULK_ROOT
+    root = Path(_settings.bulk_root).resolve()
+    resolved = (root / path).resolve()
+    if not resolved.is_relative_to(root):
+        raise HTTPException(status_code=400, detail=f"Path must be inside BULK_ROOT ({root})")
+    return str(resolved)
+
+
+@router.post("/jobs/deid/bulk")
+async def queue_bulk_deid(req: BulkDeidRequest):
+    input_path, output_path = _bulk_path(req.input_path), _bulk_path(req.output_path)
+    try:
+        result, shards = bulk_deid(
+            input_path,
+            output_path,
+            req.shards or _settings.bulk_shards,
+            req.text_field,
+            req.lang_hint,
+            req.batch_size,
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Input not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    # task_id is the chord callback: its result is the job summary
+    return {"task_id": result.id, "status": "queued", "shards": shards, "output_path": output_path}
+
+
+@router.get("/jobs/deid/bulk/progress")
+async def bulk_deid_progress(output_path: str):
+    try:
+        return bulk_progress(_bulk_path(output_path))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No bulk job in this output path")
+
+
+def _queue_depths() -> Dict[str, int]:
+    with celery_app.connection_for_read(connect_timeout=2) as conn:
+        # Fail fast instead of kombu's default reconnect backoff
+        conn.ensure_connection(max_retries=1, interval_start=0)
+        return queue_depths(conn)
+
+
+@router.get("/jobs/queues")
+async def job_queues():
+    try:
+        depths = await run_in_threadpool(_queue_depths)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Broker unavailable: {e}")
+    return {"queues": depths, "interactive_max_chars": _settings.interactive_max_chars}
+
+
+class JobStatusRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_items=1)
+    # Status only by default: result bodies are not read from the backend
+    include_result: bool = False
+
+
+@router.post("/jobs/status")
+async def jobs_status(req: JobStatusRequest):
+    if len(req.task_ids) > _settings.status_max_ids:
+        raise HTTPException(
+            status_code=413, detail=f"Too many task ids: {len(req.task_ids)} (max {_settings.status_max_ids})"
+        )
+    try:
+        if req.include_result:
+            views = await job_results(req.task_ids)
+            jobs = [views[t] for t in req.task_ids]
+        else:
+            states = await job_statuses(req.task_ids)
+            jobs = [{"task_id": t, "status": states[t]} for t in req.task_ids]
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Result backend unavailable: {e}")
+    return {"jobs": jobs}
+
+
+@router.get("/jobs/{task_id}/events")
+async def job_events(task_id: str):
+    # SSE: a "progress" event per shard report, then "done" with the final status
+    try:
+        events = await JobEvents(task_id).open()
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Progress events unavailable: {e}")
+    return StreamingResponse(
+        events.stream(),
+        media_type="text/event-stream",
+        # No caching or proxy buffering of the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/jobs/{task_id}")
-async def job_status(task_id: str):
-    res = celery_app.AsyncResult(task_id)
-    payload = {"task_id": task_id, "status": res.status}
-    if res.successful():
-        payload["result"] = res.result
-    elif res.failed():
-        payload["error"] = str(res.result)
-    return payload
+async def job_status(task_id: str, status_only: bool = False, wait: float = Query(default=0.0, ge=0)):
+    try:
+        if wait > 0:
+            await wait_for_job(task_id, min(wait, _settings.deid_async_max_wait_sec))
+        if status_only:
+            return {"task_id": task_id, "status": (await job_statuses([task_id]))[task_id]}
+        return (await job_results([task_id]))[task_id]
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Result backend unavailable: {e}")
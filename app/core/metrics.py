@@ -0,0 +1,212 @@
+"""
+Prometheus metrics for the de-identification hot path.
+
+Stage timers are shared no-op objects unless metrics are enabled
+(METRICS_ENABLED) or the current request collects its own timings
+(``collect_timings``), so the engine and recognizers are instrumented
+unconditionally at the cost of one function call per stage.
+
+With PROMETHEUS_MULTIPROC_DIR set (before the process starts), prometheus_client
+writes per-process sample files and ``render()`` aggregates them, so one scrape
+of /api/v1/metrics covers every API worker and Celery prefork child sharing
+that directory.
+"""
+
+import os
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import (  # type: ignore
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+except Exception:  # pragma: no cover - prometheus_client optional at runtime
+    Counter = Gauge = Histogram = None  # type: ignore
+
+from app.core.config import get_settings
+
+
+AVAILABLE = Histogram is not None
+
+if AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        "deid_stage_seconds",
+        "Time spent per de-identification stage",
+        ["stage", "detector"],
+        buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    )
+    ENTITIES = Counter("deid_entities_total", "Entities detected", ["label"])
+    DOCUMENT_CHARS = Histogram(
+        "deid_document_chars",
+        "Input document size in characters",
+        buckets=(100, 1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000),
+    )
+    CACHE = Counter("deid_cache_total", "Cache lookups", ["cache", "result"])
+    REJECTIONS = Counter("deid_rejections_total", "Requests rejected before processing", ["reason"])
+    OFFLOADS = Counter("deid_offloaded_total", "/deid requests handed to the workers", ["reason"])
+    AUDIT_ROWS = Counter("deid_audit_rows_total", "DeidLog audit rows by outcome", ["outcome"])
+    ADMISSIONS = Counter(
+        "deid_admission_total", "Admission decisions: admitted or the reason shed", ["class", "decision"]
+    )
+    IN_FLIGHT = Gauge("deid_in_flight", "Requests being served", ["class"], multiprocess_mode="livesum")
+    IN_FLIGHT_CHARS = Gauge(
+        "deid_in_flight_chars", "Body bytes of expensive requests being served", multiprocess_mode="livesum"
+    )
+    QUEUE_WAIT = Histogram(
+        "deid_queue_wait_seconds",
+        "Time a Celery task waited in its queue before a worker started it",
+        ["queue"],
+        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+    )
+    QUEUE_DEPTH = Gauge(
+        "deid_queue_depth", "Messages waiting per Celery queue", ["queue"], multiprocess_mode="max"
+    )
+
+_enabled = AVAILABLE and bool(get_settings().metrics_enabled)
+# Per-request stage durations (seconds), set only while collect_timings() is active
+_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("deid_timings", default=None)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = AVAILABLE and bool(flag)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _StageTimer:
+    __slots__ = ("stage", "detector", "t0")
+
+    def __init__(self, stage: str, detector: str) -> None:
+        self.stage = stage
+        self.detector = detector
+
+    def __enter__(self):
+        self.t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        elapsed = perf_counter() - self.t0
+        if _enabled:
+            STAGE_SECONDS.labels(self.stage, self.detector).observe(elapsed)
+        sink = _TIMINGS.get()
+        if sink is not None:
+            key = f"{self.stage}.{self.detector}" if self.detector else self.stage
+            sink[key] = sink.get(key, 0.0) + elapsed
+        return False
+
+
+def stage(name: str, detector: str = ""):
+    """Context manager timing one stage; a shared no-op when nothing records it."""
+    if not _enabled and _TIMINGS.get() is None:
+        return _NOOP
+    return _StageTimer(name, detector)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect stage durations (seconds, keyed "stage" or "stage.detector") for the current context."""
+    sink: Dict[str, float] = {}
+    token = _TIMINGS.set(sink)
+    try:
+        yield sink
+    finally:
+        _TIMINGS.reset(token)
+
+
+def server_timing(timings_us: Dict[str, int]) -> str:
+    """Format microsecond timings as a Server-Timing header value (dur is in ms)."""
+    return ", ".join(f"{name};dur={us / 1000:.3f}" for name, us in timings_us.items())
+
+
+def count_entities(labels: Iterable[str]) -> None:
+    if not _enabled:
+        return
+    for label, n in _Tally(labels).items():
+        ENTITIES.labels(label).inc(n)
+
+
+def observe_document(chars: int) -> None:
+    if _enabled:
+        DOCUMENT_CHARS.observe(chars)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    if _enabled:
+        CACHE.labels(cache, "hit" if hit else "miss").inc()
+
+
+def rejection(reason: str) -> None:
+    if _enabled:
+        REJECTIONS.labels(reason).inc()
+
+
+def offload(reason: str) -> None:
+    if _enabled:
+        OFFLOADS.labels(reason).inc()
+
+
+def audit_rows(outcome: str, n: int) -> None:
+    if _enabled and n:
+        AUDIT_ROWS.labels(outcome).inc(n)
+
+
+def admission(cls: str, decision: str) -> None:
+    if _enabled:
+        ADMISSIONS.labels(cls, decision).inc()
+
+
+def set_in_flight(cls: str, n: int) -> None:
+    if _enabled:
+        IN_FLIGHT.labels(cls).set(n)
+
+
+def set_in_flight_chars(n: int) -> None:
+    if _enabled:
+        IN_FLIGHT_CHARS.set(n)
+
+
+def observe_queue_wait(queue: str, seconds: float) -> None:
+    if _enabled:
+        QUEUE_WAIT.labels(queue).observe(max(seconds, 0.0))
+
+
+def set_queue_depth(queue: str, depth: int) -> None:
+    if _enabled:
+        QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition-format payload and content type for the scrape endpoint."""
+    if not AVAILABLE:
+        raise RuntimeError("prometheus_client is not installed")
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,170 @@
+"""
+On-demand profiling of single requests, tasks or script runs.
+
+``profile(label)`` runs the enclosed block under a deterministic profiler
+(sys.setprofile, current thread only) that attributes self time to full call
+stacks. On exit two artifacts are written to ``PROFILE_DIR``:
+
+- ``<id>.collapsed``: one ``frame;frame;frame <microseconds>`` line per stack,
+  the input format of flamegraph.pl / speedscope / inferno
+- ``<id>.json``: metadata plus the top functions by self time
+
+Only the newest ``PROFILE_KEEP`` profiles are kept.
+"""
+
+import json
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional
+
+from app.core.config import get_settings
+
+
+_ID_RE = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+
+class StackProfiler:
+    """Deterministic profiler aggregating self time per call stack."""
+
+    def __init__(self) -> None:
+        self.totals: Dict[str, float] = defaultdict(float)
+        self._paths: List[str] = []
+        self._last = 0.0
+
+    def _charge(self, now: float) -> None:
+        if self._paths:
+            self.totals[self._paths[-1]] += now - self._last
+        self._last = now
+
+    def _callback(self, frame, event, arg) -> None:
+        now = perf_counter()
+        self._charge(now)
+        if event == "call":
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            self._push(f"{module}.{getattr(code, 'co_qualname', code.co_name)}")
+        elif event == "c_call":
+            module = getattr(arg, "__module__", None) or "builtins"
+            self._push(f"{module}.{getattr(arg, '__qualname__', repr(arg))}")
+        elif self._paths:
+            # return / c_return / c_exception; frames entered before start are ignored
+            self._paths.pop()
+        self._last = perf_counter()
+
+    def _push(self, name: str) -> None:
+        name = name.replace(";", ":").replace(" ", "_")
+        self._paths.append(f"{self._paths[-1]};{name}" if self._paths else name)
+
+    def start(self) -> None:
+        self._last = perf_counter()
+        sys.setprofile(self._callback)
+
+    def stop(self) -> None:
+        sys.setprofile(None)
+        self._charge(perf_counter())
+        self._paths.clear()
+
+    def collapsed(self) -> str:
+        lines = [
+            f"{path} {int(sec * 1_000_000)}"
+            for path, sec in sorted(self.totals.items())
+            if sec >= 0.000_001
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def top(self, n: int = 20) -> List[Dict]:
+        by_func: Dict[str, float] = defaultdict(float)
+        for path, sec in self.totals.items():
+            by_func[path.rsplit(";", 1)[-1]] += sec
+        ranked = sorted(by_func.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [{"function": f, "self_ms": sec * 1000} for f, sec in ranked]
+
+
+class ProfileHandle:
+    def __init__(self, profile_id: str, directory: Path) -> None:
+        self.id = profile_id
+        self.directory = directory
+
+    @property
+    def collapsed_path(self) -> Path:
+        return self.directory / f"{self.id}.collapsed"
+
+    @property
+    def summary_path(self) -> Path:
+        return self.directory / f"{self.id}.json"
+
+
+def _profile_dir() -> Path:
+    return Path(get_settings().profile_dir)
+
+
+def _prune(directory: Path, keep: int) -> None:
+    summaries = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in summaries[max(keep, 1):]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".collapsed").unlink(missing_ok=True)
+
+
+@contextmanager
+def profile(label: str, meta: Optional[Dict] = None) -> Iterator[ProfileHandle]:
+    """Profile the enclosed block and persist its artifacts; yields the handle (``.id``)."""
+    settings = get_settings()
+    directory = _profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    handle = ProfileHandle(f"{int(time.time())}-{uuid.uuid4().hex[:8]}", directory)
+    profiler = StackProfiler()
+    t0 = perf_counter()
+    profiler.start()
+    try:
+        yield handle
+    finally:
+        profiler.stop()
+        duration = perf_counter() - t0
+        handle.collapsed_path.write_text(profiler.collapsed(), encoding="utf-8")
+        summary = {
+            "id": handle.id,
+            "label": label,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": duration * 1000,
+            "meta": meta or {},
+            "top": profiler.top(),
+        }
+        handle.summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        _prune(directory, settings.profile_keep)
+
+
+def _checked_path(profile_id: str, suffix: str) -> Path:
+    if not _ID_RE.match(profile_id or ""):
+        raise KeyError(profile_id)
+    path = _profile_dir() / f"{profile_id}{suffix}"
+    if not path.exists():
+        raise KeyError(profile_id)
+    return path
+
+
+def list_profiles() -> List[Dict]:
+    directory = _profile_dir()
+    if not directory.exists():
+        return []
+    out: List[Dict] = []
+    for p in sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        data = json.loads(p.read_text(encoding="utf-8"))
+        out.append({k: data.get(k) for k in ("id", "label", "created_at", "duration_ms")})
+    return out
+
+
+def load_summary(profile_id: str) -> Dict:
+    """Raises KeyError for unknown or malformed ids."""
+    return json.loads(_checked_path(profile_id, ".json").read_text(encoding="utf-8"))
+
+
+def load_collapsed(profile_id: str) -> str:
+    """Raises KeyError for unknown or malformed ids."""
+    return _checked_path(profile_id, ".collapsed").read_text(encoding="utf-8")
@@ -0,0 +1,42 @@
+"""
+Byte-range sharding of line-oriented files (JSONL).
+
+A file is cut into contiguous byte ranges without looking at its content; a
+line belongs to the range containing its first byte. Every reader can then
+seek straight to its range, and the ranges together yield each line exactly once.
+"""
+
+import os
+from typing import Iterator, List, Tuple
+
+
+def byte_range_shards(path: str, n_shards: int) -> List[Tuple[int, int]]:
+    """Split a file into at most ``n_shards`` contiguous ``(start, end)`` byte ranges."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+    n_shards = max(1, min(n_shards, size))
+    step = -(-size // n_shards)
+    return [(start, min(size, start + step)) for start in range(0, size, step)]
+
+
+def iter_line_offsets(path: str, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield ``(offset, raw line)`` for the lines that start within [start, end)."""
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # tail of a line owned by the previous range
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            yield pos, line
+            pos += len(line)
+
+
+def iter_byte_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Yield the raw lines that start within [start, end)."""
+    for _offset, line in iter_line_offsets(path, start, end):
+        yield line
@@ -0,0 +1,269 @@
+"""
+Buffered DeidLog audit writer shared by the API and the Celery workers.
+
+``audit_log().record(row)`` only enqueues: rows wait in a bounded in-memory
+queue, and a background thread per process inserts them in batches of up to
+AUDIT_BATCH_SIZE rows, at least every AUDIT_FLUSH_INTERVAL_SEC. A batch is
+one transaction and one multi-row INSERT (``create_deid_logs``), so auditing
+every request costs the request nothing but a queue put.
+
+Rows the database does not take (it is down) and rows that find the queue
+full are appended to the spill file (AUDIT_SPILL_PATH, JSON lines). The
+flusher replays it once the database answers again, including rows spilled
+by earlier or other processes sharing the file. ``created_at`` is stamped
+when a row is recorded, not when it is written; replayed rows also mark
+their hours stale so the hourly rollups are recomputed (app/db/maintenance.py).
+
+Outcomes are counted in ``deid_audit_rows_total{outcome}``: written
+(replayed rows included), spilled, replayed, and dropped (spilling failed
+as well).
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process spill only
+    fcntl = None  # type: ignore
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.db.crud import create_deid_logs
+from app.db.maintenance import mark_stale_hours
+from app.db.session import session_scope
+
+
+log = get_logger("audit")
+
+# Seconds between replay attempts while the spill file is not empty
+_REPLAY_INTERVAL_SEC = 30.0
+_PREVIEW_CHARS = 200
+
+Row = Dict[str, Any]
+
+
+def deid_log_row(
+    result: Dict[str, Any], lang_hint: Optional[str], policy_version: str, request_id: Optional[str] = None
+) -> Row:
+    """DeidLog column values for an engine result (any mode)."""
+    # Only "full" mode carries the transformed text; other modes log input size
+    result_text = result.get("result_text")
+    output_len = len(result_text) if result_text is not None else int(result.get("original_len", 0))
+    num_entities = (
+        sum(result["counts"].values()) if "counts" in result
+        else len(result.get("entities") or result.get("patch") or [])
+    )
+    request_id = request_id or result.get("request_id")
+    return dict(
+        request_id=uuid.UUID(request_id) if request_id else uuid.uuid4(),
+        num_entities=num_entities,
+        time_ms=float(result.get("time_ms", 0)),
+        input_len=int(result.get("original_len", 0)),
+        output_len=output_len,
+        policy_version=policy_version,
+        lang_hint=lang_hint or "",
+        sample_preview=(result_text or "")[:_PREVIEW_CHARS],
+    )
+
+
+def _insert_rows(rows: List[Row], replayed: bool = False) -> None:
+    with session_scope() as db:
+        create_deid_logs(db, rows)
+        if replayed:
+            # Same transaction: the next maintenance pass re-rolls these hours
+            mark_stale_hours(db, (row["created_at"] for row in rows))
+
+
+def _dump(row: Row) -> str:
+    return json.dumps(
+        {**row, "request_id": str(row["request_id"]), "created_at": row["created_at"].isoformat()},
+        ensure_ascii=False,
+    )
+
+
+def _load(line: str) -> Row:
+    row = json.loads(line)
+    row["request_id"] = uuid.UUID(row["request_id"])
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return row
+
+
+class AuditLog:
+    """Bounded queue plus flusher thread; one per process (``audit_log()``)."""
+
+    def __init__(self, settings=None, sink: Optional[Callable[[List[Row], bool], None]] = None) -> None:
+        self.settings = settings or get_settings()
+        # sink(rows, replayed) raises on failure; the default inserts through the sync session
+        self._sink = sink or _insert_rows
+        self._queue: "queue.Queue[Row]" = queue.Queue(maxsize=max(self.settings.audit_queue_size, 1))
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._next_replay = 0.0
+        self._failing = False
+
+    @property
+    def spill_path(self) -> Path:
+        return Path(self.settings.audit_spill_path)
+
+    def record(self, row: Row) -> None:
+        """Queue one DeidLog row without blocking; spills it if the queue is full."""
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._spill([row])
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued row is written or spilled; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline or not self._running():
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._running():
+            self.flush(timeout)
+            self._stop.set()
+            self._thread.join(timeout)
+
+    def _running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self) -> None:
+        if self._running():
+            return
+        with self._start_lock:
+            if self._running():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked (Celery prefork): the parent's queue and thread do not exist here
+                self._queue = queue.Queue(maxsize=max(self.settings.audit_queue_size, 1))
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="deid-audit", daemon=True)
+            self._thread.start()
+
+    def _take(self) -> List[Row]:
+        # First row blocks up to the interval; the rest fill the batch until it elapses
+        interval = self.settings.audit_flush_interval_sec
+        try:
+            batch = [self._queue.get(timeout=interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + interval
+        while len(batch) < self.settings.audit_batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take()
+            if batch:
+                try:
+                    self._write(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            # While inserts fail this is also the probe for the database coming back
+            if time.monotonic() >= self._next_replay:
+                self._replay()
+
+    def _write(self, rows: List[Row], replayed: bool = False) -> bool:
+        try:
+            self._sink(rows, replayed)
+        except Exception as e:
+            if not self._failing:
+                log.warning(f"DeidLog insert failed, spilling to {self.spill_path}: {e}")
+            self._failing = True
+            self._next_replay = time.monotonic() + _REPLAY_INTERVAL_SEC
+            self._spill(rows)
+            return False
+        if self._failing:
+            log.info("DeidLog inserts recovered")
+            # Replay what the outage spilled right away
+            self._failing = False
+            self._next_replay = 0.0
+        metrics.audit_rows("written", len(rows))
+        return True
+
+    def _spill(self, rows: List[Row]) -> None:
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)  # other processes append and replay too
+                f.write("".join(_dump(row) + "\n" for row in rows))
+        except OSError as e:
+            log.error(f"DeidLog spill failed, {len(rows)} rows dropped: {e}")
+            metrics.audit_rows("dropped", len(rows))
+            return
+        metrics.audit_rows("spilled", len(rows))
+
+    def _claim_spill(self) -> List[str]:
+        # Read and truncate under the lock: rows appended later stay for the next replay
+        with self._spill_lock, open(self.spill_path, "r+", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            lines = f.read().splitlines()
+            f.seek(0)
+            f.truncate()
+        return [line for line in lines if line.strip()]
+
+    def _replay(self) -> None:
+        self._next_replay = time.monotonic() + _REPLAY_INTERVAL_SEC
+        try:
+            if self.spill_path.stat().st_size == 0:
+                return
+            lines = self._claim_spill()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.warning(f"DeidLog spill file unreadable: {e}")
+            return
+        rows = []
+        for line in lines:
+            try:
+                rows.append(_load(line))
+            except (ValueError, KeyError) as e:
+                log.warning(f"Skipping malformed spilled DeidLog row: {e}")
+        size = max(self.settings.audit_batch_size, 1)
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            if not self._write(chunk, replayed=True):
+                self._spill(rows[start + size:])  # _write spilled the failed chunk itself
+                return
+            metrics.audit_rows("replayed", len(chunk))
+
+
+_audit: Optional[AuditLog] = None
+_audit_lock = threading.Lock()
+
+
+def audit_log() -> AuditLog:
+    """The process's audit writer, created on first use and drained at exit."""
+    global _audit
+    if _audit is None:
+        with _audit_lock:
+            if _audit is None:
+                _audit = AuditLog()
+                atexit.register(_audit.close)
+    return _audit
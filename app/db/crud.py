@@ -1,5 +1,5 @@
 import uuid
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from sqlalchemy.orm import Session
 
@@ -44,6 +44,12 @@ def create_deid_log(
     return log
 
 
+def create_deid_logs(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Insert many DeidLog rows (create_deid_log keyword sets) in one executemany."""
+    if rows:
+        db.execute(DeidLog.__table__.insert(), rows)
+
+
 def create_metric_run(
     db: Session,
     *,
@@ -0,0 +1,188 @@
+"""
+``deid_logs`` partition maintenance and hourly rollups (PostgreSQL).
+
+``deid_logs`` is range-partitioned by ``created_at`` into monthly tables
+named ``deid_logs_yYYYYmMM`` (migration b2c3d4e5f6a7), plus a default
+partition that only catches rows no monthly table covers. The hourly
+``workers.maintain_deid_logs`` task (Celery beat):
+
+- creates the partitions for the current month and DEID_LOG_PARTITIONS_AHEAD
+  months after it, so inserts never land in the default partition
+- recomputes the hourly rollups (``deid_log_rollups_hourly``) of the last
+  DEID_LOG_ROLLUP_LOOKBACK_HOURS, and from the oldest hour marked stale in
+  ``deid_log_rollups_stale``: the audit writer marks the hours of the rows it
+  replays from its spill file, in the same transaction as the rows, since
+  they keep their original ``created_at`` however long the outage was
+- drops partitions entirely older than DEID_LOG_RETENTION_DAYS (0 keeps
+  everything), after a final rollup of their hours: dropping a partition
+  is a catalog change, where deleting the same rows would rewrite the table
+
+Rollups keep request counts, entity and character totals and latency
+percentiles per hour, policy version and language, so dashboards never scan
+raw rows and keep their history after the rows themselves are gone.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+PARENT = "deid_logs"
+_PARTITION_RE = re.compile(r"^deid_logs_y(\d{4})m(\d{2})$")
+
+_ROLLUP_SQL = text(
+    """
+    INSERT INTO deid_log_rollups_hourly (
+        bucket, policy_version, lang_hint, requests, entities, input_chars, output_chars,
+        time_ms_sum, time_ms_p50, time_ms_p95, time_ms_p99, time_ms_max
+    )
+    SELECT
+        date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', policy_version, coalesce(lang_hint, ''),
+        count(*), sum(num_entities), sum(input_len), sum(output_len), sum(time_ms),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY time_ms),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY time_ms),
+        percentile_cont(0.99) WITHIN GROUP (ORDER BY time_ms),
+        max(time_ms)
+    FROM deid_logs
+    WHERE created_at >= :start AND created_at < :end
+    GROUP BY 1, 2, 3
+    ON CONFLICT (bucket, policy_version, lang_hint) DO UPDATE SET
+        requests = EXCLUDED.requests,
+        entities = EXCLUDED.entities,
+        input_chars = EXCLUDED.input_chars,
+        output_chars = EXCLUDED.output_chars,
+        time_ms_sum = EXCLUDED.time_ms_sum,
+        time_ms_p50 = EXCLUDED.time_ms_p50,
+        time_ms_p95 = EXCLUDED.time_ms_p95,
+        time_ms_p99 = EXCLUDED.time_ms_p99,
+        time_ms_max = EXCLUDED.time_ms_max
+    """
+)
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1, tzinfo=ts.tzinfo or timezone.utc)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    index = ts.year * 12 + ts.month - 1 + months
+    return ts.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_bounds(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """[start, end) of a monthly partition; None for other tables (e.g. the default one)."""
+    match = _PARTITION_RE.match(name)
+    if match is None:
+        return None
+    start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+    return start, add_months(start, 1)
+
+
+def months_between(start: datetime, end: datetime) -> List[datetime]:
+    """First days of the months from ``start``'s through ``end``'s."""
+    month, last, out = month_start(start), month_start(end), []
+    while month <= last:
+        out.append(month)
+        month = add_months(month, 1)
+    return out
+
+
+def expired_partitions(names: Iterable[str], retention_days: int, now: datetime) -> List[str]:
+    """Monthly partitions whose rows are all older than the retention period."""
+    if retention_days <= 0:
+        return []
+    cutoff = now - timedelta(days=retention_days)
+    expired = []
+    for name in names:
+        bounds = partition_bounds(name)
+        if bounds is not None and bounds[1] <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+def create_partition_sql(month: datetime) -> str:
+    start, end = month_start(month), add_months(month_start(month), 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def hour_start(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def mark_stale_hours(db: Session, timestamps: Iterable[datetime]) -> None:
+    """Record that rows were added to these hours after their rollup may have run."""
+    hours = sorted({hour_start(ts) for ts in timestamps})
+    if hours:
+        db.execute(
+            text("INSERT INTO deid_log_rollups_stale (hour) VALUES (:hour) ON CONFLICT DO NOTHING"),
+            [{"hour": h} for h in hours],
+        )
+
+
+def take_stale_since(db: Session) -> Optional[datetime]:
+    """Oldest stale hour, clearing the marks; hours marked later stay for the next pass."""
+    hours = [r[0] for r in db.execute(text("DELETE FROM deid_log_rollups_stale RETURNING hour"))]
+    return min(hours) if hours else None
+
+
+def list_partitions(db: Session) -> List[str]:
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": PARENT})
+    return [r[0] for r in rows]
+
+
+def ensure_partitions(db: Session, now: datetime, ahead: int) -> List[str]:
+    """Create the monthly partitions from ``now``'s month through ``ahead`` months later."""
+    existing = set(list_partitions(db))
+    created = []
+    for month in months_between(now, add_months(month_start(now), max(ahead, 0))):
+        if partition_name(month) not in existing:
+            db.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+    return created
+
+
+def rollup_hours(db: Session, start: datetime, end: datetime) -> None:
+    """(Re)compute the hourly rollups of [start, end), truncated to whole hours."""
+    start = hour_start(start)
+    db.execute(_ROLLUP_SQL, {"start": start, "end": end})
+
+
+def drop_expired_partitions(db: Session, retention_days: int, now: datetime) -> List[str]:
+    dropped = []
+    for name in expired_partitions(list_partitions(db), retention_days, now):
+        start, end = partition_bounds(name)
+        rollup_hours(db, start, end)  # the rollups outlive the rows
+        db.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+def maintain(
+    db: Session, now: datetime, ahead: int, lookback_hours: int, retention_days: int
+) -> Dict[str, object]:
+    """One maintenance pass; the caller commits."""
+    created = ensure_partitions(db, now, ahead)
+    start = now - timedelta(hours=max(lookback_hours, 1))
+    stale = take_stale_since(db)
+    if stale is not None and stale < start:
+        # Never before the retention cutoff: older hours' partitions (and rows) may be gone,
+        # and a recompute would overwrite their rollups with the replayed rows alone
+        cutoff = now - timedelta(days=retention_days) if retention_days > 0 else stale
+        start = max(stale, cutoff)
+    rollup_hours(db, start, now)
+    dropped = drop_expired_partitions(db, retention_days, now)
+    return {"created": created, "dropped": dropped}
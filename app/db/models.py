@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Text, DateTime, Integer, Float, func
+from sqlalchemy import BigInteger, String, Text, DateTime, Integer, Float, func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 
@@ -20,13 +20,19 @@ class Document(Base):
 
 
 class DeidLog(Base):
+    # On PostgreSQL partitioned by month on created_at, primary key (id, created_at);
+    # see alembic b2c3d4e5f6a7 and app/db/maintenance.py. The ORM identity is the same
+    # pair, but the table's own key stays ``id``: SQLite only autoincrements a
+    # single INTEGER PRIMARY KEY, and create_all builds the SQLite stand-ins.
     __tablename__ = "deid_logs"
 
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
-    request_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    request_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False, index=True)
     num_entities: Mapped[int] = mapped_column(Integer, nullable=False)
     time_ms: Mapped[float] = mapped_column(Float, nullable=False)
     input_len: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -35,13 +41,15 @@ class DeidLog(Base):
     lang_hint: Mapped[str] = mapped_column(String(8), nullable=True)
     sample_preview: Mapped[str] = mapped_column(Text, nullable=True)
 
+    __mapper_args__ = {"primary_key": [id, created_at]}
+
 
 class MetricRun(Base):
     __tablename__ = "metric_runs"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
     dataset_name: Mapped[str] = mapped_column(String(255), nullable=False)
     precision: Mapped[dict] = mapped_column(JSONB, nullable=False)
@@ -49,3 +57,30 @@ class MetricRun(Base):
     f1: Mapped[dict] = mapped_column(JSONB, nullable=False)
     docs_per_sec: Mapped[float] = mapped_column(Float, nullable=True)
     false_negative_rate: Mapped[dict] = mapped_column(JSONB, nullable=True)
+
+
+class DeidLogRollup(Base):
+    """Hourly DeidLog aggregates per policy version and language (app/db/maintenance.py)."""
+
+    __tablename__ = "deid_log_rollups_hourly"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    policy_version: Mapped[str] = mapped_column(String(64), primary_key=True)
+    lang_hint: Mapped[str] = mapped_column(String(8), primary_key=True, server_default="")
+    requests: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    entities: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    input_chars: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    output_chars: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    time_ms_sum: Mapped[float] = mapped_column(Float, nullable=False)
+    time_ms_p50: Mapped[float] = mapped_column(Float, nullable=False)
+    time_ms_p95: Mapped[float] = mapped_column(Float, nullable=False)
+    time_ms_p99: Mapped[float] = mapped_column(Float, nullable=False)
+    time_ms_max: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class DeidLogRollupStale(Base):
+    """Hours that got rows after their rollup was computed (audit spill replay)."""
+
+    __tablename__ = "deid_log_rollups_stale"
+
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
@@ -1,16 +1,67 @@
+"""
+Database engines and sessions.
+
+Two paths share POSTGRES_DSN and the DB_POOL_* settings:
+
+- sync (``SessionLocal``, ``session_scope``, ``get_db``): Celery tasks and
+  scripts
+- async (``get_async_db``): API routes, so a query never blocks the event
+  loop. The psycopg driver runs in its async mode; ``sqlite://`` DSNs map to
+  aiosqlite for local stand-ins
+
+Async connections belong to the event loop that opened them, so each loop
+gets its own engine (one per API process in production).
+"""
+
+import asyncio
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Generator
+from weakref import WeakKeyDictionary
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import get_settings
 
 
+# Drivers without an async mode, and the async driver used instead
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def _engine_options(dsn: str) -> Dict[str, Any]:
+    settings = get_settings()
+    options: Dict[str, Any] = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if make_url(dsn).get_backend_name() != "sqlite":
+        # SQLite stand-ins use SQLAlchemy's per-file pools, which take no sizing
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return options
+
+
+def async_dsn(dsn: str) -> str:
+    """``dsn`` with a driver that supports asyncio."""
+    url = make_url(dsn)
+    driver = _ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False) if driver else dsn
+
+
 settings = get_settings()
-engine = create_engine(settings.postgres_dsn, future=True)
+engine = create_engine(settings.postgres_dsn, future=True, **_engine_options(settings.postgres_dsn))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+_async_sessions: "WeakKeyDictionary[asyncio.AbstractEventLoop, async_sessionmaker]" = WeakKeyDictionary()
+
 
 def get_db() -> Generator:
     db = SessionLocal()
@@ -31,3 +82,28 @@ def session_scope() -> Generator:
         raise
     finally:
         session.close()
+
+
+def async_session_factory() -> async_sessionmaker:
+    """Session factory bound to the running loop's async engine, created on first use."""
+    loop = asyncio.get_running_loop()
+    factory = _async_sessions.get(loop)
+    if factory is None:
+        dsn = get_settings().postgres_dsn
+        async_engine = create_async_engine(async_dsn(dsn), **_engine_options(dsn))
+        # Routes read attributes after commit without another round trip
+        factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        _async_sessions[loop] = factory
+    return factory
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_factory()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Close the running loop's pooled connections (API shutdown)."""
+    factory = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if factory is not None:
+        await factory.kw["bind"].dispose()
@@ -0,0 +1,289 @@
+"""
+Bulk de-identification of JSONL exports: one file or a directory of ``*.jsonl``.
+
+The input is cut into byte-range shards (see app.core.sharding) recorded once
+in ``manifest.json`` in the output directory. Each shard is processed in
+batches of ``batch_size`` records, one ``engine.deidentify_batch`` call each
+(spaCy sees ``nlp.pipe`` batches, not single documents), and written to its
+own ``part-NNNNN.jsonl`` with buffered I/O; output records are the input
+records with the text field replaced by the de-identified text plus
+per-label entity counts.
+
+Every ``checkpoint_every`` batches the part file is flushed to disk and
+``part-NNNNN.ckpt`` records the next input byte offset and the part's size.
+Re-running the same job resumes each shard from its checkpoint: the part is
+truncated back to the checkpointed size first, so a record is never written
+twice. Checkpoints double as the job's progress report (``bulk_progress``).
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.core.sharding import byte_range_shards, iter_line_offsets
+from app.deid.engine import DeidEngine
+
+
+MANIFEST = "manifest.json"
+SUMMARY = "_SUCCESS"
+
+Progress = Callable[[Dict[str, Any]], None]
+
+
+@dataclass
+class Shard:
+    part: str
+    input: str
+    start: int
+    end: int
+
+
+def list_inputs(input_path: str) -> List[str]:
+    """The JSONL files of a bulk job; raises FileNotFoundError when there are none."""
+    p = Path(input_path)
+    if p.is_file():
+        return [str(p)]
+    if p.is_dir():
+        files = sorted(str(f) for f in p.glob("*.jsonl") if f.is_file())
+        if files:
+            return files
+    raise FileNotFoundError(input_path)
+
+
+def _split(files: List[str], shards: int) -> List[Shard]:
+    # Shards are spread over files in proportion to their size
+    sizes = [os.path.getsize(f) for f in files]
+    total = sum(sizes) or 1
+    out: List[Shard] = []
+    for path, size in zip(files, sizes):
+        n = max(1, round(shards * size / total))
+        for start, end in byte_range_shards(path, n):
+            out.append(Shard(part=f"part-{len(out):05d}", input=path, start=start, end=end))
+    return out
+
+
+def plan_shards(input_path: str, output_dir: str, shards: int) -> List[Shard]:
+    """
+    Shard plan of a job, written to the output directory's manifest. An existing
+    manifest for the same input is reused so a resumed job keeps its boundaries.
+    """
+    out = Path(output_dir)
+    manifest = out / MANIFEST
+    if manifest.exists():
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+        if data.get("input") != str(input_path):
+            raise ValueError(f"{output_dir} holds the output of another input ({data.get('input')})")
+        return [Shard(**s) for s in data["shards"]]
+    plan = _split(list_inputs(input_path), shards)
+    out.mkdir(parents=True, exist_ok=True)
+    _write_json(manifest, {"input": str(input_path), "shards": [asdict(s) for s in plan]})
+    return plan
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    # Write-then-rename so a crash never leaves a torn file behind
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_checkpoint(output_dir: str, part: str) -> Optional[Dict[str, Any]]:
+    path = Path(output_dir) / f"{part}.ckpt"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _parse_line(line: bytes, text_field: str) -> Optional[Dict[str, Any]]:
+    """The record of one input line, or None for a blank line; raises ValueError on bad records."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        rec = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from None
+    if not isinstance(rec, dict) or not isinstance(rec.get(text_field), str):
+        raise ValueError(f"missing string field {text_field!r}")
+    return rec
+
+
+def _output_line(rec: Dict[str, Any], text_field: str, result: Dict[str, Any]) -> bytes:
+    counts: Dict[str, int] = {}
+    for ent in result["entities"]:
+        counts[ent["label"]] = counts.get(ent["label"], 0) + 1
+    rec[text_field] = result["result_text"]
+    rec["deid"] = {"counts": counts}
+    return (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _deid_records(
+    engine: DeidEngine, texts: List[str], lang_hints: List[Optional[str]]
+) -> List[Union[Dict[str, Any], ValueError]]:
+    """Engine results for a batch, one ``deidentify_batch`` call (spaCy ``nlp.pipe``)."""
+    try:
+        return list(engine.deidentify_batch(texts, lang_hints))
+    except ValueError:
+        # A text the engine refuses (e.g. too long) fails the whole call: isolate it
+        results: List[Union[Dict[str, Any], ValueError]] = []
+        for text, lang in zip(texts, lang_hints):
+            try:
+                results.append(engine.deidentify(text, lang_hint=lang))
+            except ValueError as e:
+                results.append(e)
+        return results
+
+
+def process_shard(
+    shard: Shard,
+    output_dir: str,
+    engine: DeidEngine,
+    text_field: str = "text",
+    lang_hint: Optional[str] = None,
+    batch_size: int = 256,
+    checkpoint_every: int = 4,
+    progress: Optional[Progress] = None,
+) -> Dict[str, Any]:
+    """
+    De-identify one shard into its part file, resuming from its checkpoint.
+    Returns the final checkpoint (records, errors, offsets, ``done``).
+    """
+    out_dir = Path(output_dir)
+    ckpt = load_checkpoint(output_dir, shard.part) or {
+        "part": shard.part,
+        "offset": shard.start,
+        "out_bytes": 0,
+        "err_bytes": 0,
+        "records": 0,
+        "errors": 0,
+        "busy_sec": 0.0,
+        "done": False,
+    }
+    if ckpt["done"]:
+        return ckpt
+
+    part_path = out_dir / f"{shard.part}.jsonl"
+    err_path = out_dir / f"{shard.part}.errors.jsonl"
+    # Drop whatever was written after the last checkpoint
+    for path, size in ((part_path, ckpt["out_bytes"]), (err_path, ckpt["err_bytes"])):
+        if path.exists():
+            with path.open("r+b") as f:
+                f.truncate(size)
+
+    t0 = perf_counter()
+    busy_before = float(ckpt["busy_sec"])
+    ckpt_path = out_dir / f"{shard.part}.ckpt"
+
+    with part_path.open("ab", buffering=1 << 20) as out, err_path.open("ab") as err:
+
+        def checkpoint(offset: int, done: bool = False) -> None:
+            out.flush()
+            err.flush()
+            os.fsync(out.fileno())
+            os.fsync(err.fileno())
+            ckpt.update(
+                offset=offset,
+                out_bytes=out.tell(),
+                err_bytes=err.tell(),
+                busy_sec=busy_before + perf_counter() - t0,
+                done=done,
+            )
+            _write_json(ckpt_path, ckpt)
+            if progress is not None:
+                progress({**ckpt, "start": shard.start, "end": shard.end})
+
+        batch: List[tuple] = []
+        batches = 0
+        next_offset = ckpt["offset"]
+
+        def error(offset: int, e: ValueError) -> None:
+            ckpt["errors"] += 1
+            err.write((json.dumps({"input": shard.input, "offset": offset, "error": str(e)}) + "\n").encode())
+
+        def flush_batch() -> None:
+            # Parse first, run the valid records through the engine together, write in input order
+            parsed: List[tuple] = []
+            for offset, line in batch:
+                try:
+                    rec = _parse_line(line, text_field)
+                except ValueError as e:
+                    parsed.append((offset, e))
+                    continue
+                if rec is not None:
+                    parsed.append((offset, rec))
+            records = [rec for _, rec in parsed if isinstance(rec, dict)]
+            results = iter(_deid_records(
+                engine, [rec[text_field] for rec in records], [rec.get("lang") or lang_hint for rec in records]
+            ) if records else [])
+            for offset, rec in parsed:
+                if isinstance(rec, ValueError):
+                    error(offset, rec)
+                    continue
+                result = next(results)
+                if isinstance(result, ValueError):
+                    error(offset, result)
+                    continue
+                out.write(_output_line(rec, text_field, result))
+                ckpt["records"] += 1
+            batch.clear()
+
+        for offset, line in iter_line_offsets(shard.input, ckpt["offset"], shard.end):
+            batch.append((offset, line))
+            next_offset = offset + len(line)
+            if len(batch) >= batch_size:
+                flush_batch()
+                batches += 1
+                if batches % checkpoint_every == 0:
+                    checkpoint(next_offset)
+        flush_batch()
+        checkpoint(max(next_offset, shard.end), done=True)
+    return ckpt
+
+
+def summarize(output_dir: str, results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Job totals from the shards' final checkpoints, written to ``_SUCCESS``."""
+    records = sum(int(r.get("records", 0)) for r in results)
+    summary = {
+        "output_path": str(output_dir),
+        "shards": len(results),
+        "records": records,
+        "errors": sum(int(r.get("errors", 0)) for r in results),
+        "elapsed_sec": elapsed,
+        "docs_per_sec": (records / elapsed) if elapsed > 0 else 0.0,
+        # Sum of per-shard processing time; busy_sec / elapsed ~ effective parallelism
+        "worker_busy_sec": sum(float(r.get("busy_sec", 0.0)) for r in results),
+    }
+    _write_json(Path(output_dir) / SUMMARY, summary)
+    return summary
+
+
+def bulk_progress(output_dir: str) -> Dict[str, Any]:
+    """Progress of a bulk job from its manifest and checkpoints; KeyError if there is no job."""
+    manifest = Path(output_dir) / MANIFEST
+    if not manifest.exists():
+        raise KeyError(output_dir)
+    shards = [Shard(**s) for s in json.loads(manifest.read_text(encoding="utf-8"))["shards"]]
+    bytes_total = sum(s.end - s.start for s in shards)
+    bytes_done = records = errors = done = 0
+    for s in shards:
+        ckpt = load_checkpoint(output_dir, s.part)
+        if ckpt is None:
+            continue
+        bytes_done += min(ckpt["offset"], s.end) - s.start
+        records += ckpt["records"]
+        errors += ckpt["errors"]
+        done += bool(ckpt["done"])
+    return {
+        "output_path": str(output_dir),
+        "shards": len(shards),
+        "shards_done": done,
+        "records": records,
+        "errors": errors,
+        "bytes_done": bytes_done,
+        "bytes_total": bytes_total,
+        "percent": (100.0 * bytes_done / bytes_total) if bytes_total else 100.0,
+        "complete": (Path(output_dir) / SUMMARY).exists(),
+    }
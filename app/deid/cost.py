@@ -0,0 +1,137 @@
+"""
+Cost estimates for de-identification requests, calibrated from per-stage timings.
+
+The engine reports per-stage durations (``timings=True``: ``regex.<LABEL>``,
+``ner.<lang>``, ..., ``total``). Each stage is modeled as linear in the
+document length, ``fixed + per_char * chars``, fit by least squares over
+recorded samples; everything outside the detectors (MRN filter, dedupe,
+overlap, replacement) is one ``rest.<mode>`` stage. An estimate sums the
+stages the request's detector plan would run, so label selections and a
+language hint (NER for one language instead of both) lower it.
+
+Stages never observed during calibration (e.g. NER without spaCy models)
+count as free. ``scripts/calibrate_cost.py`` records samples on the target
+hardware and writes the model to COST_MODEL_PATH.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.deid.recognizers import _spacy_langs, detector_plan
+
+
+# (chars, mode, engine timings in microseconds)
+Sample = Tuple[int, str, Dict[str, int]]
+
+
+@dataclass
+class StageFit:
+    fixed_sec: float
+    per_char_sec: float
+    samples: int
+
+    def seconds(self, chars: int) -> float:
+        return self.fixed_sec + self.per_char_sec * chars
+
+
+def _fit_line(points: Sequence[Tuple[int, float]]) -> StageFit:
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        # One document size: all of it is per-char cost
+        return StageFit(0.0, mean_y / mean_x if mean_x else 0.0, n)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    if slope <= 0:
+        return StageFit(max(mean_y, 0.0), 0.0, n)
+    fixed = mean_y - slope * mean_x
+    if fixed < 0:
+        # Keep small documents from estimating negative: refit through the origin
+        slope = sum(x * y for x, y in points) / sum(x * x for x, _ in points)
+        fixed = 0.0
+    return StageFit(fixed, slope, n)
+
+
+def _stage_seconds(mode: str, timings_us: Dict[str, int]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    detectors = 0.0
+    for name, us in timings_us.items():
+        if name.startswith(("regex.", "ner.")):
+            out[name] = us / 1e6
+            detectors += us / 1e6
+    if "total" in timings_us:
+        out[f"rest.{mode}"] = max(timings_us["total"] / 1e6 - detectors, 0.0)
+    return out
+
+
+class CostModel:
+    """Per-stage linear fits; ``estimate`` predicts a request's engine seconds."""
+
+    def __init__(self, stages: Dict[str, StageFit]) -> None:
+        self.stages = stages
+
+    @classmethod
+    def fit(cls, samples: Iterable[Sample]) -> "CostModel":
+        points: Dict[str, List[Tuple[int, float]]] = {}
+        for chars, mode, timings_us in samples:
+            for stage, sec in _stage_seconds(mode, timings_us).items():
+                points.setdefault(stage, []).append((chars, sec))
+        return cls({stage: _fit_line(pts) for stage, pts in points.items()})
+
+    def estimate(
+        self,
+        chars: int,
+        lang_hint: Optional[str] = None,
+        mode: str = "full",
+        labels: Optional[Iterable[str]] = None,
+        exclude_labels: Optional[Iterable[str]] = None,
+    ) -> float:
+        """Estimated engine seconds; raises ValueError for unknown labels."""
+        plan = detector_plan(labels, exclude_labels)
+        keys = [f"regex.{label}" for label in plan.regex]
+        if plan.run_ner:
+            keys += [f"ner.{lang}" for lang in _spacy_langs(lang_hint)]
+        rest = self.stages.get(f"rest.{mode}") or self.stages.get("rest.full")
+        total = rest.seconds(chars) if rest is not None else 0.0
+        return total + sum(self.stages[k].seconds(chars) for k in keys if k in self.stages)
+
+    def to_dict(self) -> Dict:
+        return {"stages": {name: asdict(fit) for name, fit in sorted(self.stages.items())}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CostModel":
+        return cls({name: StageFit(**fit) for name, fit in data["stages"].items()})
+
+    def save(self, path: str) -> None:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+        os.replace(tmp, target)
+
+
+def load_cost_model(path: Optional[str]) -> Optional[CostModel]:
+    """The calibrated model at ``path``; None if there is none yet."""
+    if not path or not os.path.isfile(path):
+        return None
+    return CostModel.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def record_samples(
+    engine,
+    texts: Sequence[str],
+    lang_hints: Optional[Sequence[Optional[str]]] = None,
+    modes: Sequence[str] = ("full",),
+) -> List[Sample]:
+    """Run ``engine`` with per-stage timings over ``texts`` in each mode."""
+    hints = list(lang_hints) if lang_hints is not None else [None] * len(texts)
+    samples: List[Sample] = []
+    for mode in modes:
+        for text, hint in zip(texts, hints):
+            result = engine.deidentify(text, lang_hint=hint, mode=mode, timings=True)
+            samples.append((len(text), mode, result["timings"]))
+    return samples
@@ -1,8 +1,15 @@
 from time import perf_counter
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
+from app.core import metrics
 from app.core.config import get_settings
-from .recognizers import detect_entities, recognize
+from .recognizers import (
+    Entity,
+    detect_entities_batch,
+    detect_entities_report,
+    detector_plan,
+    recognize,
+)
 from .policies import apply_policies, hash_value, mask_value, redact_value
 
 
@@ -19,6 +26,12 @@ POLICY_MAP: Dict[str, str] = {
     "IP": "redact",
 }
 
+# Label used for regions left unscanned by a deadline when failing closed
+UNSCANNED_LABEL = "UNSCANNED"
+
+# Response shapes supported by DeidEngine.deidentify
+RESULT_MODES: Tuple[str, ...] = ("full", "spans", "patch", "counts")
+
 
 def _canonical_label(label: str) -> str:
     # Normalize label for display/replacement
@@ -31,6 +44,19 @@ def _canonical_label(label: str) -> str:
     return label
 
 
+def _cover_unscanned(entities: List[Entity], unscanned: List[Tuple[int, int]]) -> List[Entity]:
+    # Unscanned ranges win over any entity they overlap
+    out = [
+        e for e in entities
+        if all(e.end <= s or e.start >= end for s, end in unscanned)
+    ]
+    out.extend(
+        Entity(start=s, end=e, text="", label=UNSCANNED_LABEL, detector="deadline")
+        for s, e in unscanned
+    )
+    return sorted(out, key=lambda e: e.start)
+
+
 class DeidEngine:
     def __init__(self, policy_map: Dict[str, str], salt: str, default_policy: str) -> None:
         self.policy_map = dict(policy_map or {})
@@ -38,6 +64,9 @@ class DeidEngine:
         self.default_policy = default_policy
 
     def _resolve_policy(self, label: str) -> str:
+        # Fail-closed regions are always redacted, whatever the policy map says
+        if label == UNSCANNED_LABEL:
+            return "redact"
         # Exact match
         if label in self.policy_map:
             return self.policy_map[label]
@@ -50,65 +79,216 @@ class DeidEngine:
             return self.policy_map["PHONE_GR"]
         return self.default_policy
 
-    def deidentify(self, text: str, lang_hint: Optional[str] = None) -> Dict:
+    def _replacement(self, action: str, label: str, value: str) -> str:
+        canon = _canonical_label(label)
+        if action == "mask":
+            return mask_value(value)
+        if action == "redact":
+            return redact_value(canon)
+        if action == "hash":
+            return hash_value(value, self.salt, canon)
+        return value  # unknown action -> passthrough
+
+    def _shape(self, text: str, merged: List[Tuple[int, int, str, str]], mode: str) -> Dict:
+        # Apply policies to resolved spans, producing only what ``mode`` needs
+        out: Dict = {}
+        if mode == "counts":
+            counts: Dict[str, int] = {}
+            for _s, _e, label, _v in merged:
+                counts[label] = counts.get(label, 0) + 1
+            out["counts"] = counts
+        elif mode == "spans":
+            out["entities"] = [
+                {"label": label, "span": [start, end], "action": self._resolve_policy(label)}
+                for start, end, label, _v in merged
+            ]
+        elif mode == "patch":
+            out["patch"] = [
+                {
+                    "span": [start, end],
+                    "replacement": self._replacement(self._resolve_policy(label), label, value),
+                }
+                for start, end, label, value in merged
+            ]
+        else:
+            # Build result text while applying per-entity policy
+            result_parts: List[str] = []
+            last = 0
+            results_meta: List[Dict] = []
+            for start, end, label, value in merged:
+                result_parts.append(text[last:start])
+                action = self._resolve_policy(label)
+                result_parts.append(self._replacement(action, label, value))
+                results_meta.append({
+                    "label": label,
+                    "span": [start, end],
+                    "action": action,
+                })
+                last = end
+
+            result_parts.append(text[last:])
+            out["result_text"] = "".join(result_parts)
+            out["entities"] = results_meta
+        return out
+
+    def deidentify(
+        self,
+        text: str,
+        lang_hint: Optional[str] = None,
+        mode: str = "full",
+        labels: Optional[Iterable[str]] = None,
+        exclude_labels: Optional[Iterable[str]] = None,
+        deadline: Optional[float] = None,
+        fail_closed: bool = False,
+        timings: bool = False,
+    ) -> Dict:
+        """De-identify ``text`` and shape the response according to ``mode``.
+
+        ``full`` returns the transformed text plus entity metadata, ``spans`` only
+        offsets/labels/actions, ``patch`` the list of replacements to apply
+        client-side and ``counts`` per-label entity counts. Work a mode does not
+        need (building the output string, hashing values) is skipped.
+
+        ``labels``/``exclude_labels`` restrict detection to a label subset; only
+        the detectors that subset needs are run and the executed plan is
+        returned under ``plan``.
+
+        ``deadline`` is a time.monotonic() timestamp. Detectors that cannot
+        finish in time are skipped or stopped between NER chunks and reported
+        under ``coverage``; with ``fail_closed`` the unscanned regions are
+        redacted instead of passed through.
+
+        ``timings`` adds per-stage durations in microseconds under ``timings``
+        (``regex.<LABEL>``, ``ner.<lang>``, ``mrn_filter``, ``dedupe``,
+        ``detect``, ``overlap``, ``replace.<mode>`` and ``total``).
+        """
+        kwargs = dict(
+            lang_hint=lang_hint,
+            mode=mode,
+            labels=labels,
+            exclude_labels=exclude_labels,
+            deadline=deadline,
+            fail_closed=fail_closed,
+        )
+        if not timings:
+            return self._deidentify(text, **kwargs)
+        with metrics.collect_timings() as sink:
+            t0 = perf_counter()
+            out = self._deidentify(text, **kwargs)
+            sink["total"] = perf_counter() - t0
+        out["timings"] = {name: int(sec * 1_000_000) for name, sec in sink.items()}
+        return out
+
+    def _deidentify(
+        self,
+        text: str,
+        lang_hint: Optional[str],
+        mode: str,
+        labels: Optional[Iterable[str]],
+        exclude_labels: Optional[Iterable[str]],
+        deadline: Optional[float],
+        fail_closed: bool,
+    ) -> Dict:
+        settings = get_settings()
+        text = self._checked(text, mode)
+        metrics.observe_document(len(text))
+        selective = bool(labels) or bool(exclude_labels)
+        plan = detector_plan(labels, exclude_labels) if selective else None
+
+        t0 = perf_counter()
+        with metrics.stage("detect"):
+            report = detect_entities_report(
+                text,
+                lang_hint=lang_hint,
+                labels=labels,
+                exclude_labels=exclude_labels,
+                deadline=deadline,
+                chunk_size=settings.ner_chunk_size,
+            )
+        entities = report.entities
+        if fail_closed and report.unscanned:
+            entities = _cover_unscanned(entities, report.unscanned)
+
+        out = self._resolve(text, entities, mode)
+        if plan is not None:
+            out["plan"] = plan.as_dict()
+        if deadline is not None:
+            out["coverage"] = {
+                "complete": report.complete,
+                "completed": report.completed,
+                "incomplete": report.incomplete,
+                "unscanned": [[s, e] for s, e in report.unscanned],
+                "fail_closed": fail_closed,
+            }
+        out["time_ms"] = int((perf_counter() - t0) * 1000)
+        return out
+
+    def deidentify_batch(
+        self,
+        texts: Sequence[str],
+        lang_hints: Optional[Sequence[Optional[str]]] = None,
+        mode: str = "full",
+        labels: Optional[Iterable[str]] = None,
+        exclude_labels: Optional[Iterable[str]] = None,
+    ) -> List[Dict]:
+        """``deidentify`` for many texts, with NER batched through ``nlp.pipe``.
+
+        Results match per-text ``deidentify`` calls without a deadline;
+        ``time_ms`` is the batch time spread evenly over its texts. Raises
+        ValueError if any text is too long.
+        """
+        texts = [self._checked(t, mode) for t in texts]
+        selective = bool(labels) or bool(exclude_labels)
+        plan = detector_plan(labels, exclude_labels) if selective else None
+
+        t0 = perf_counter()
+        with metrics.stage("detect"):
+            detected = detect_entities_batch(
+                texts, lang_hints, labels=labels, exclude_labels=exclude_labels
+            )
+        results: List[Dict] = []
+        for text, entities in zip(texts, detected):
+            metrics.observe_document(len(text))
+            out = self._resolve(text, entities, mode)
+            if plan is not None:
+                out["plan"] = plan.as_dict()
+            results.append(out)
+        per_text = int((perf_counter() - t0) * 1000 / len(texts)) if texts else 0
+        for out in results:
+            out["time_ms"] = per_text
+        return results
+
+    def _checked(self, text: Optional[str], mode: str) -> str:
         settings = get_settings()
+        if mode not in RESULT_MODES:
+            raise ValueError(f"Unknown result mode: {mode}")
         if text is None:
             text = ""
         if len(text) > settings.max_text_size:
             raise ValueError(
                 f"Text too long: {len(text)} chars (max {settings.max_text_size})"
             )
+        return text
 
-        t0 = perf_counter()
-        entities = detect_entities(text, lang_hint=lang_hint)
-
+    def _resolve(self, text: str, entities: List[Entity], mode: str) -> Dict:
         # Ensure non-overlapping spans, sorted by start
-        spans = sorted(((e.start, e.end, e.label, e.text) for e in entities), key=lambda x: x[0])
-        merged: List[Tuple[int, int, str, str]] = []
-        last_end = -1
-        for s, e, label, txt in spans:
-            if s >= last_end:
-                merged.append((s, e, label, txt))
-                last_end = e
-            else:
-                # Overlap: skip lower-priority span (detect_entities already resolves priority)
-                continue
-
-        # Build result text while applying per-entity policy
-        result_parts: List[str] = []
-        last = 0
-        results_meta: List[Dict] = []
-        for start, end, label, value in merged:
-            result_parts.append(text[last:start])
-            action = self._resolve_policy(label)
-            canon = _canonical_label(label)
-            if action == "mask":
-                replacement = mask_value(value)
-            elif action == "redact":
-                replacement = redact_value(canon)
-            elif action == "hash":
-                replacement = hash_value(value, self.salt, canon)
-            else:
-                replacement = value  # unknown action -> passthrough
-
-            result_parts.append(replacement)
-            results_meta.append({
-                "label": label,
-                "span": [start, end],
-                "action": action,
-            })
-            last = end
-
-        result_parts.append(text[last:])
-        result_text = "".join(result_parts)
-        elapsed_ms = int((perf_counter() - t0) * 1000)
-
-        return {
-            "original_len": len(text),
-            "result_text": result_text,
-            "entities": results_meta,
-            "time_ms": elapsed_ms,
-        }
+        with metrics.stage("overlap"):
+            spans = sorted(((e.start, e.end, e.label, e.text) for e in entities), key=lambda x: x[0])
+            merged: List[Tuple[int, int, str, str]] = []
+            last_end = -1
+            for s, e, label, txt in spans:
+                if s >= last_end:
+                    merged.append((s, e, label, txt))
+                    last_end = e
+                else:
+                    # Overlap: skip lower-priority span (detect_entities already resolves priority)
+                    continue
+        metrics.count_entities(label for _s, _e, label, _v in merged)
+
+        out: Dict = {"original_len": len(text)}
+        with metrics.stage("replace", mode):
+            out.update(self._shape(text, merged, mode))
+        return out
 
 
 # Backward-compatible function kept for current API/tests
@@ -0,0 +1,205 @@
+"""
+Span-level evaluation against gold labels, shared by scripts/evaluate.py and
+the distributed Celery evaluation.
+
+A prediction is a true positive only on an exact (start, end, label) match.
+Counts merge associatively, so a dataset can be scored in shards anywhere and
+reduced afterwards with the same result as one sequential pass.
+"""
+
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.sharding import iter_byte_range, iter_line_offsets
+from app.deid.recognizers import Entity, detect_entities
+
+
+Detect = Callable[[str, Optional[str]], List[Entity]]
+# Called after each line with the next byte offset and the documents scored so far
+Progress = Callable[[int, int], None]
+
+
+def gold_spans(rec: dict) -> Set[Tuple[int, int, str]]:
+    gold: Set[Tuple[int, int, str]] = set()
+    for item in rec.get("labels", []) or []:
+        try:
+            s = int(item["start"])  # type: ignore[index]
+            e = int(item["end"])  # type: ignore[index]
+            lab = str(item["label"])  # type: ignore[index]
+        except Exception:
+            continue
+        gold.add((s, e, lab))
+    return gold
+
+
+@dataclass
+class Counts:
+    """TP/FP/FN per label over a set of documents; merging is order independent."""
+
+    tps: Counter = field(default_factory=Counter)
+    fps: Counter = field(default_factory=Counter)
+    fns: Counter = field(default_factory=Counter)
+    labels_present: Set[str] = field(default_factory=set)
+    n_docs: int = 0
+    # Bookkeeping, not part of the result
+    skipped_lines: int = 0
+    cache_hits: int = 0
+    recomputed: Counter = field(default_factory=Counter)
+
+    def add_doc(self, rec: dict, detect: Optional[Detect] = None) -> None:
+        text = rec.get("text", "") or ""
+        lang = rec.get("lang") or None
+        gold = gold_spans(rec)
+        ents = detect(text, lang) if detect else detect_entities(text, lang_hint=lang)
+        preds: Set[Tuple[int, int, str]] = {(e.start, e.end, e.label) for e in ents}
+        self.labels_present.update(lab for (_, _, lab) in gold)
+        self.labels_present.update(lab for (_, _, lab) in preds)
+
+        matched = gold.intersection(preds)
+        for (_, _, lab) in matched:
+            self.tps[lab] += 1
+        for (_, _, lab) in preds.difference(matched):
+            self.fps[lab] += 1
+        for (_, _, lab) in gold.difference(matched):
+            self.fns[lab] += 1
+        self.n_docs += 1
+
+    def add_line(self, line, detect: Optional[Detect] = None) -> bool:
+        """Score one raw JSONL line (str or bytes); False when it is blank or not JSON."""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            return False
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            self.skipped_lines += 1
+            return False
+        self.add_doc(rec, detect)
+        return True
+
+    def merge(self, other: "Counts") -> None:
+        self.tps.update(other.tps)
+        self.fps.update(other.fps)
+        self.fns.update(other.fns)
+        self.labels_present |= other.labels_present
+        self.n_docs += other.n_docs
+        self.skipped_lines += other.skipped_lines
+        self.cache_hits += other.cache_hits
+        self.recomputed.update(other.recomputed)
+
+    def key(self) -> Tuple:
+        return (
+            self.n_docs,
+            sorted(self.tps.items()),
+            sorted(self.fps.items()),
+            sorted(self.fns.items()),
+            sorted(self.labels_present),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form (Celery results)."""
+        return {
+            "tps": dict(self.tps),
+            "fps": dict(self.fps),
+            "fns": dict(self.fns),
+            "labels_present": sorted(self.labels_present),
+            "n_docs": self.n_docs,
+            "skipped_lines": self.skipped_lines,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Counts":
+        return cls(
+            tps=Counter(data.get("tps") or {}),
+            fps=Counter(data.get("fps") or {}),
+            fns=Counter(data.get("fns") or {}),
+            labels_present=set(data.get("labels_present") or []),
+            n_docs=int(data.get("n_docs", 0)),
+            skipped_lines=int(data.get("skipped_lines", 0)),
+        )
+
+
+def f1_score(p: float, r: float) -> float:
+    return 0.0 if (p + r) == 0 else (2 * p * r) / (p + r)
+
+
+def score_byte_range(
+    path: str, start: int, end: int, detect: Optional[Detect] = None, progress: Optional[Progress] = None
+) -> Counts:
+    counts = Counts()
+    if progress is None:
+        for line in iter_byte_range(path, start, end):
+            counts.add_line(line, detect)
+        return counts
+    for offset, line in iter_line_offsets(path, start, end):
+        counts.add_line(line, detect)
+        progress(offset + len(line), counts.n_docs)
+    return counts
+
+
+def label_metrics(counts: Counts) -> Dict[str, Any]:
+    """Per-label, micro and macro precision/recall/F1 plus false-negative rates."""
+    tps, fps, fns = counts.tps, counts.fps, counts.fns
+    per_label: Dict[str, Dict[str, float]] = {}
+    all_labels = sorted(counts.labels_present)
+    for lab in all_labels:
+        tp, fp, fn = tps.get(lab, 0), fps.get(lab, 0), fns.get(lab, 0)
+        p = (tp / (tp + fp)) if (tp + fp) > 0 else 0.0
+        r = (tp / (tp + fn)) if (tp + fn) > 0 else 0.0
+        per_label[lab] = {
+            "precision": p,
+            "recall": r,
+            "f1": f1_score(p, r),
+            "false_negative_rate": (fn / (tp + fn)) if (tp + fn) > 0 else 0.0,
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+        }
+
+    tp_sum, fp_sum, fn_sum = sum(tps.values()), sum(fps.values()), sum(fns.values())
+    p_micro = (tp_sum / (tp_sum + fp_sum)) if (tp_sum + fp_sum) > 0 else 0.0
+    r_micro = (tp_sum / (tp_sum + fn_sum)) if (tp_sum + fn_sum) > 0 else 0.0
+    fnr_overall = (fn_sum / (tp_sum + fn_sum)) if (tp_sum + fn_sum) > 0 else 0.0
+
+    # Macro over labels with support in gold (tp+fn > 0)
+    supported = [lab for lab in all_labels if (tps.get(lab, 0) + fns.get(lab, 0)) > 0]
+    if supported:
+        p_macro = sum(per_label[lab]["precision"] for lab in supported) / len(supported)
+        r_macro = sum(per_label[lab]["recall"] for lab in supported) / len(supported)
+        f1_macro = sum(per_label[lab]["f1"] for lab in supported) / len(supported)
+    else:
+        p_macro = r_macro = f1_macro = 0.0
+
+    return {
+        "per_label": per_label,
+        "totals": {"tp": tp_sum, "fp": fp_sum, "fn": fn_sum},
+        "micro": {"precision": p_micro, "recall": r_micro, "f1": f1_score(p_micro, r_micro)},
+        "macro": {"precision": p_macro, "recall": r_macro, "f1": f1_macro},
+        "false_negative_rate": {
+            **{k: v["false_negative_rate"] for k, v in per_label.items()},
+            "overall": fnr_overall,
+        },
+    }
+
+
+def metric_run_fields(metrics: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """MetricRun JSON columns (per label plus micro/macro) from label_metrics output."""
+    per_label = metrics["per_label"]
+
+    def column(name: str) -> Dict[str, float]:
+        return {
+            **{k: v[name] for k, v in per_label.items()},
+            "micro": metrics["micro"][name],
+            "macro": metrics["macro"][name],
+        }
+
+    return {
+        "precision": column("precision"),
+        "recall": column("recall"),
+        "f1": column("f1"),
+        "false_negative_rate": metrics["false_negative_rate"],
+    }
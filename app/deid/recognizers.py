@@ -1,8 +1,12 @@
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
 
 import re
 
+from app.core import metrics
+
 try:
     import spacy  # type: ignore
 except Exception:  # pragma: no cover - spaCy optional at runtime
@@ -53,33 +57,158 @@ def _get_nlp(lang: str):
     return None
 
 
-def _spacy_entities(text: str, lang_hint: Optional[str]) -> List[Entity]:
+SPACY_LABELS = frozenset({"PERSON", "ORG", "GPE", "LOC", "DATE"})
+
+
+def _spacy_langs(lang_hint: Optional[str]) -> List[str]:
+    return [lang_hint] if lang_hint in {"en", "el"} else ["en", "el"]
+
+
+# Pipes the NER component needs; all others are disabled while it runs
+_NER_PIPES: Tuple[str, ...] = ("tok2vec", "ner")
+
+
+@dataclass(frozen=True)
+class DetectorPlan:
+    """Minimal set of detectors needed to produce a given label selection."""
+
+    regex: Tuple[str, ...]  # regex labels to run, in priority order
+    ner_labels: FrozenSet[str]  # spaCy labels to keep; empty -> NER skipped
+    spacy_pipes: Tuple[str, ...]  # spaCy components left enabled
+
+    @property
+    def run_ner(self) -> bool:
+        return bool(self.ner_labels)
+
+    def as_dict(self) -> Dict:
+        return {
+            "regex": list(self.regex),
+            "ner": self.run_ner,
+            "ner_labels": sorted(self.ner_labels),
+            "spacy_pipes": list(self.spacy_pipes),
+        }
+
+
+def _regex_labels() -> List[str]:
+    ordered = sorted(PATTERNS, key=lambda t: t[2], reverse=True)
+    return [name for name, _pattern, _prio in ordered] + ["ADDRESS_GR"]
+
+
+def _selects(selection: Iterable[str], label: str) -> bool:
+    # "PHONE" selects PHONE_GR and PHONE_INTL, "ADDRESS" selects ADDRESS_GR, etc.
+    return any(label == s or label.startswith(s + "_") for s in selection)
+
+
+@lru_cache(maxsize=128)
+def _build_plan(include: Optional[FrozenSet[str]], exclude: FrozenSet[str]) -> DetectorPlan:
+    known = _regex_labels() + sorted(SPACY_LABELS)
+    requested = (include or frozenset()) | exclude
+    unknown = sorted(s for s in requested if not any(_selects((s,), lab) for lab in known))
+    if unknown:
+        raise ValueError(f"Unknown labels: {', '.join(unknown)}")
+
+    def wanted(label: str) -> bool:
+        return (include is None or _selects(include, label)) and not _selects(exclude, label)
+
+    ner_labels = frozenset(lab for lab in SPACY_LABELS if wanted(lab))
+    return DetectorPlan(
+        regex=tuple(lab for lab in _regex_labels() if wanted(lab)),
+        ner_labels=ner_labels,
+        spacy_pipes=_NER_PIPES if ner_labels else (),
+    )
+
+
+def detector_plan(
+    labels: Optional[Iterable[str]] = None, exclude_labels: Optional[Iterable[str]] = None
+) -> DetectorPlan:
+    """
+    Compute (and cache per label set) the detectors needed for ``labels`` minus
+    ``exclude_labels``. An empty or missing ``labels`` means all labels. Label
+    prefixes select their variants ("PHONE" -> PHONE_GR, PHONE_INTL). Raises
+    ValueError for labels no detector can produce.
+    """
+    include = frozenset(labels) if labels else None
+    exclude = frozenset(exclude_labels or ())
+    if not metrics.enabled():
+        return _build_plan(include, exclude)
+    hits = _build_plan.cache_info().hits
+    plan = _build_plan(include, exclude)
+    metrics.cache_lookup("detector_plan", _build_plan.cache_info().hits > hits)
+    return plan
+
+
+def _spacy_entities(text: str, lang_hint: Optional[str], plan: Optional[DetectorPlan] = None) -> List[Entity]:
     ents: List[Entity] = []
-    labels = {"PERSON", "ORG", "GPE", "LOC", "DATE"}
-    langs = [lang_hint] if lang_hint in {"en", "el"} else ["en", "el"]
-    for lang in langs:
+    plan = plan or detector_plan()
+    if not plan.run_ner:
+        return ents
+    for lang in _spacy_langs(lang_hint):
         nlp = _get_nlp(lang)
         if nlp is None:
             continue
-        doc = nlp(text)
-        for e in doc.ents:
-            if e.label_ in labels:
-                ents.append(Entity(start=e.start_char, end=e.end_char, text=e.text, label=e.label_, detector="spacy"))
+        ents.extend(_ner_entities(nlp, text, plan))
     return ents
 
 
-def _regex_entities(text: str) -> List[Entity]:
+def _ner_entities(nlp, text: str, plan: DetectorPlan, offset: int = 0) -> List[Entity]:
+    # Per-call disable keeps the shared pipeline untouched (safe across threads)
+    doc = nlp(text, disable=[p for p in nlp.pipe_names if p not in plan.spacy_pipes])
+    return _doc_entities(doc, plan, offset)
+
+
+def _doc_entities(doc, plan: DetectorPlan, offset: int = 0) -> List[Entity]:
     ents: List[Entity] = []
+    labels = plan.ner_labels
+    for e in doc.ents:
+        if e.label_ in labels:
+            ents.append(
+                Entity(
+                    start=e.start_char + offset,
+                    end=e.end_char + offset,
+                    text=e.text,
+                    label=e.label_,
+                    detector="spacy",
+                )
+            )
+    return ents
+
+
+def _chunk_bounds(text: str, size: int) -> List[Tuple[int, int]]:
+    """Split ``text`` into ~``size`` char chunks, cutting at whitespace where possible."""
+    bounds: List[Tuple[int, int]] = []
+    n = len(text)
+    start = 0
+    size = max(1, size)
+    while start < n:
+        end = min(n, start + size)
+        if end < n:
+            cut = max(text.rfind("\n", start, end), text.rfind(" ", start, end))
+            if cut > start:
+                end = cut + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _regex_entities(text: str, labels: Optional[Iterable[str]] = None) -> List[Entity]:
+    ents: List[Entity] = []
+    selected = None if labels is None else set(labels)
     for name, pattern, _prio in sorted(PATTERNS, key=lambda t: t[2], reverse=True):
+        if selected is not None and name not in selected:
+            continue
         for m in pattern.finditer(text):
             ents.append(Entity(start=m.start(), end=m.end(), text=m.group(0), label=name, detector="regex"))
     # Greek address heuristic
-    greek_addr = _detect_greek_addresses(text)
-    ents.extend(greek_addr)
+    if selected is None or "ADDRESS_GR" in selected:
+        greek_addr = _detect_greek_addresses(text)
+        ents.extend(greek_addr)
     return ents
 
 
-_GREEK_ADDR_RE = re.compile(r"\b(Οδός|Λεωφόρος|Πλ\.|Οικ\.|ΤΚ)\s+[^\n,;]{0,50}?\d+\b")
+# Possessive \s++/\d++ and (?<!\d) match exactly what the backtracking form did
+# (giving back whitespace or digits can never create a new match) but stop the
+# lazy prefix from re-trying every offset inside long whitespace/digit runs.
+_GREEK_ADDR_RE = re.compile(r"\b(Οδός|Λεωφόρος|Πλ\.|Οικ\.|ΤΚ)\s++[^\n,;]{0,50}?(?<!\d)\d++\b")
 
 
 def _detect_greek_addresses(text: str) -> List[Entity]:
@@ -114,6 +243,26 @@ def _priority(label: str) -> int:
     return PRIORITY.get(label, 10)
 
 
+_MRN_CONTEXT_KEYS = ("mrn", "record", "id", "αμκα", "αριθμός φακέλου")
+
+
+def _mrn_candidate_ok(lowered: str, e: Entity) -> bool:
+    span_txt = e.text
+    has_digit = any(ch.isdigit() for ch in span_txt)
+    is_alpha_only = span_txt.isalpha()
+    long_enough = len(span_txt) >= 6
+    line_start = lowered.rfind("\n", 0, e.start) + 1
+    left_ctx = lowered[max(line_start, e.start - 12):e.start]
+    ctx_ok = any(k in left_ctx for k in _MRN_CONTEXT_KEYS)
+    if (not has_digit) or is_alpha_only or (not long_enough and not ctx_ok):
+        return False
+    alnum_mix = any(c.isalpha() for c in span_txt) and any(c.isdigit() for c in span_txt)
+    has_delim = ("-" in span_txt) or ("_" in span_txt)
+    if not ctx_ok and not (alnum_mix and has_delim):
+        return False
+    return True
+
+
 def _filter_mrn_overdetections(text: str, entities: List[Entity]) -> List[Entity]:
     """
     Drop MRN candidates that:
@@ -126,23 +275,8 @@ def _filter_mrn_overdetections(text: str, entities: List[Entity]) -> List[Entity
     out: List[Entity] = []
     lowered = text.lower()
     for e in entities:
-        if e.label != "MRN":
+        if e.label != "MRN" or _mrn_candidate_ok(lowered, e):
             out.append(e)
-            continue
-        span_txt = e.text
-        has_digit = any(ch.isdigit() for ch in span_txt)
-        is_alpha_only = span_txt.isalpha()
-        long_enough = len(span_txt) >= 6
-        line_start = lowered.rfind("\n", 0, e.start) + 1
-        left_ctx = lowered[max(line_start, e.start - 12):e.start]
-        ctx_ok = any(k in left_ctx for k in ["mrn", "record", "id", "αμκα", "αριθμός φακέλου"])
-        if (not has_digit) or is_alpha_only or (not long_enough and not ctx_ok):
-            continue
-        alnum_mix = any(c.isalpha() for c in span_txt) and any(c.isdigit() for c in span_txt)
-        has_delim = ("-" in span_txt) or ("_" in span_txt)
-        if not ctx_ok and not (alnum_mix and has_delim):
-            continue
-        out.append(e)
     return out
 
 
@@ -163,12 +297,223 @@ def _dedupe(entities: List[Entity]) -> List[Entity]:
     return sorted(kept, key=lambda e: e.start)
 
 
-def detect_entities(text: str, lang_hint: Optional[str] = None) -> List[Entity]:
-    sp = _spacy_entities(text, lang_hint)
-    rx = _regex_entities(text)
-    combined = sp + rx
-    combined = _filter_mrn_overdetections(text, combined)
-    return _dedupe(combined)
+# Regex detectors ordered cheapest first (measured on clean mixed EL/EN notes).
+# Labels added to PATTERNS later run after these; spaCy always runs last.
+_SCAN_ORDER: Tuple[str, ...] = (
+    "PHONE_INTL",
+    "GENERIC_ID",
+    "URL",
+    "AMKA",
+    "ADDRESS_GR",
+    "EMAIL",
+    "POSTAL_CODE_GR",
+    "PHONE_GR",
+    "IP",
+    "MRN",
+)
+
+
+def _cost_order(labels: Iterable[str]) -> List[str]:
+    labels = list(labels)
+    known = [label for label in _SCAN_ORDER if label in labels]
+    return known + [label for label in labels if label not in _SCAN_ORDER]
+
+
+@dataclass
+class DetectionReport:
+    """Entities plus which detectors ran to completion under a deadline."""
+
+    entities: List[Entity]
+    completed: List[str]
+    incomplete: List[str]
+    unscanned: List[Tuple[int, int]]  # merged char ranges some detector did not cover
+
+    @property
+    def complete(self) -> bool:
+        return not self.incomplete
+
+
+def _expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for s, e in sorted(ranges):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def _merge_detections(text: str, ner: List[Entity], regex: List[Entity], plan: DetectorPlan) -> List[Entity]:
+    """
+    Final merge of raw detector output: NER spans (per language, in
+    _spacy_langs order) then regex spans (in cost order), MRN filter, dedupe.
+    Callers that cache raw per-detector output re-merge through here.
+    """
+    combined = ner + regex
+    if "MRN" in plan.regex:
+        with metrics.stage("mrn_filter"):
+            combined = _filter_mrn_overdetections(text, combined)
+    with metrics.stage("dedupe"):
+        return _dedupe(combined)
+
+
+def detect_entities_report(
+    text: str,
+    lang_hint: Optional[str] = None,
+    labels: Optional[Iterable[str]] = None,
+    exclude_labels: Optional[Iterable[str]] = None,
+    deadline: Optional[float] = None,
+    chunk_size: int = 20_000,
+) -> DetectionReport:
+    """
+    Run the detector plan against an optional ``deadline`` (a time.monotonic()
+    timestamp). Regexes run cheapest first; NER only starts if budget remains
+    and, under a deadline, runs chunk by chunk so it can stop cleanly between
+    chunks. Detectors that did not finish are reported as incomplete together
+    with the text ranges they left unscanned.
+    """
+    plan = detector_plan(labels, exclude_labels)
+    completed: List[str] = []
+    incomplete: List[str] = []
+    unscanned: List[Tuple[int, int]] = []
+
+    rx: List[Entity] = []
+    for label in _cost_order(plan.regex):
+        if _expired(deadline):
+            incomplete.append(label)
+            unscanned.append((0, len(text)))
+            continue
+        with metrics.stage("regex", label):
+            rx.extend(_regex_entities(text, [label]))
+        completed.append(label)
+
+    sp: List[Entity] = []
+    if plan.run_ner:
+        for lang in _spacy_langs(lang_hint):
+            nlp = _get_nlp(lang)
+            if nlp is None:
+                continue
+            name = f"ner:{lang}"
+            if deadline is None:
+                with metrics.stage("ner", lang):
+                    sp.extend(_ner_entities(nlp, text, plan))
+                completed.append(name)
+                continue
+            done = 0
+            with metrics.stage("ner", lang):
+                for start, end in _chunk_bounds(text, chunk_size):
+                    if _expired(deadline):
+                        break
+                    sp.extend(_ner_entities(nlp, text[start:end], plan, offset=start))
+                    done = end
+            if done >= len(text):
+                completed.append(name)
+            else:
+                incomplete.append(name)
+                unscanned.append((done, len(text)))
+
+    return DetectionReport(
+        entities=_merge_detections(text, sp, rx, plan),
+        completed=completed,
+        incomplete=incomplete,
+        unscanned=_merge_ranges(unscanned),
+    )
+
+
+def detect_entities(
+    text: str,
+    lang_hint: Optional[str] = None,
+    labels: Optional[Iterable[str]] = None,
+    exclude_labels: Optional[Iterable[str]] = None,
+) -> List[Entity]:
+    # Detectors outside the selection never run, so a pruned higher-priority
+    # detector can no longer suppress an overlapping span of a selected label.
+    return detect_entities_report(text, lang_hint, labels, exclude_labels).entities
+
+
+def detect_entities_batch(
+    texts: Sequence[str],
+    lang_hints: Optional[Sequence[Optional[str]]] = None,
+    labels: Optional[Iterable[str]] = None,
+    exclude_labels: Optional[Iterable[str]] = None,
+    batch_size: int = 64,
+) -> List[List[Entity]]:
+    """
+    ``detect_entities`` for many texts at once, with identical results per text.
+    NER streams each language's texts through ``nlp.pipe`` instead of one
+    pipeline call per text; regexes and the final merge run per text.
+    """
+    hints = list(lang_hints) if lang_hints is not None else [None] * len(texts)
+    plan = detector_plan(labels, exclude_labels)
+    ner: List[List[Entity]] = [[] for _ in texts]
+    if plan.run_ner:
+        # "en" before "el", the per-text order of _spacy_langs
+        for lang in ("en", "el"):
+            idx = [i for i, hint in enumerate(hints) if lang in _spacy_langs(hint)]
+            nlp = _get_nlp(lang) if idx else None
+            if nlp is None:
+                continue
+            disable = [p for p in nlp.pipe_names if p not in plan.spacy_pipes]
+            with metrics.stage("ner", lang):
+                docs = nlp.pipe((texts[i] for i in idx), batch_size=batch_size, disable=disable)
+                for i, doc in zip(idx, docs):
+                    ner[i].extend(_doc_entities(doc, plan))
+
+    out: List[List[Entity]] = []
+    order = _cost_order(plan.regex)
+    for text, sp in zip(texts, ner):
+        rx: List[Entity] = []
+        for label in order:
+            with metrics.stage("regex", label):
+                rx.extend(_regex_entities(text, [label]))
+        out.append(_merge_detections(text, sp, rx, plan))
+    return out
+
+
+def contains_phi(text: str, lang_hint: Optional[str] = None, min_priority: int = 0) -> Optional[Entity]:
+    """
+    Short-circuit scan: return the first entity whose label priority is at least
+    ``min_priority``, or None when the text is clean.
+
+    Detectors run cheapest first and stop at the first qualifying hit; detectors
+    whose labels cannot qualify are never run. Unlike detect_entities, no dedupe
+    happens, so the returned span is the one that triggered, not necessarily the
+    one full detection would keep.
+    """
+    if not text:
+        return None
+    patterns = {name: pattern for name, pattern, _prio in PATTERNS}
+    patterns["ADDRESS_GR"] = _GREEK_ADDR_RE
+    order = _cost_order(patterns)
+    lowered: Optional[str] = None
+    for label in order:
+        if _priority(label) < min_priority:
+            continue
+        for m in patterns[label].finditer(text):
+            ent = Entity(start=m.start(), end=m.end(), text=m.group(0), label=label, detector="regex")
+            if label == "MRN":
+                if lowered is None:
+                    lowered = text.lower()
+                if not _mrn_candidate_ok(lowered, ent):
+                    continue
+            return ent
+
+    wanted = {label for label in SPACY_LABELS if _priority(label) >= min_priority}
+    if not wanted:
+        return None
+    for lang in _spacy_langs(lang_hint):
+        nlp = _get_nlp(lang)
+        if nlp is None:
+            continue
+        doc = nlp(text)
+        for e in doc.ents:
+            if e.label_ in wanted:
+                return Entity(start=e.start_char, end=e.end_char, text=e.text, label=e.label_, detector="spacy")
+    return None
 
 
 def recognize(text: str, lang: str = "en") -> List[Dict]:
@@ -1,9 +1,21 @@
 import re
 from typing import List, Tuple
 
-# RFC-lite email pattern
+# RFC-lite email pattern, matching what ``\b[L]+@domain\b`` did (L: local-part
+# chars) without its quadratic case: every word boundary inside a long dotted
+# token used to rescan the token to its end (see scripts/regex_audit.py).
+# - At the start of a run of L chars the run is taken whole and possessively;
+#   giving chars back can never reach an "@", so this matches the same.
+# - A run whose start is not a word boundary (after "Γ" or " .") is also
+#   taken whole once it is 65+ chars long; the old pattern began at the first
+#   boundary inside it, so it only ever masked less.
+# - Other boundaries inside a run (the first one after such a prefix, or the
+#   end of a previous match) scan at most 64 chars (the RFC 5321 local-part
+#   limit), so a long token is rescanned a bounded number of times.
+_LOCAL = r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]"
 EMAIL = re.compile(
-    r"\b[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+\b"
+    rf"(?:(?<!{_LOCAL})\b{_LOCAL}++|(?<!{_LOCAL})(?={_LOCAL}{{65}}){_LOCAL}++|(?<={_LOCAL})\b{_LOCAL}{{1,64}}+)"
+    r"@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+\b"
 )
 
 # Phones
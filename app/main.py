@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -9,20 +11,38 @@ from slowapi.errors import RateLimitExceeded
 
 from app.api.v1 import router as api_v1_router
 from app.api import v1 as api_v1_module
+from app.api.admission import AdmissionController, AdmissionMiddleware
 from app.core.logging import setup_logging, get_logger
 from app.core.config import get_settings
+from app.db.session import dispose_async_engine
 from app.deid.engine import DeidEngine, POLICY_MAP as DEFAULT_POLICY_MAP
 from app.api.security import require_api_key, rate_limit
 from app.core.limiter import limiter
+from app.core import metrics
+from app.workers.celery_app import celery_app
 
 setup_logging(component="api")
 log = get_logger("api")
 
 settings = get_settings()
-app = FastAPI(title=settings.app_name, version=settings.app_version)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await dispose_async_engine()
+
+
+app = FastAPI(title=settings.app_name, version=settings.app_version, lifespan=lifespan)
+
+
+def _rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    metrics.rejection("rate_limited")
+    return _rate_limit_exceeded_handler(request, exc)
+
 
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, _rate_limit_handler)
 app.add_middleware(SlowAPIMiddleware)
 
 # CORS allowlist from settings (comma separated)
@@ -81,20 +101,31 @@ class BodySizeLimitMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
         body = await request.body()
         if len(body) > self.max_body_size:
+            metrics.rejection("body_too_large")
             return JSONResponse(
                 status_code=413,
                 content={"detail": "Payload too large: request exceeds server body limit."},
             )
 
-        async def receive():
-            return {"type": "http.request", "body": body, "more_body": False}
-
-        request._receive = receive
+        # Starlette replays the body read above to the endpoint; the receive
+        # channel itself must stay intact, streaming responses wait on its disconnect
         return await call_next(request)
 
 
 app.add_middleware(BodySizeLimitMiddleware, max_body_size=settings.request_body_limit)
 
+
+def _admission_queue_depths():
+    # Eager mode runs jobs in-process: nothing is ever queued
+    if celery_app.conf.task_always_eager:
+        return {}
+    return api_v1_module._queue_depths()
+
+
+# Added last so it runs first: overloaded requests are shed before their body is read
+app.state.admission = AdmissionController(settings, depth_source=_admission_queue_depths)
+app.add_middleware(AdmissionMiddleware, controller=app.state.admission)
+
 # Provide a default in-memory engine singleton for app state (available to routes if needed)
 app.state.policy_map = {**DEFAULT_POLICY_MAP}
 app.state.deid_engine = DeidEngine(
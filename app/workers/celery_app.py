@@ -2,6 +2,8 @@ from celery import Celery
 
 from app.core.config import get_settings
 from app.core.logging import setup_logging, get_logger
+from app.workers.payloads import RESULT_SERIALIZER, TASK_SERIALIZER, register_serializers
+from app.workers.queues import INTERACTIVE, PRIORITY_STEPS, TASK_QUEUES, route_task
 
 
 setup_logging(component="worker")
@@ -13,12 +15,29 @@ celery_app = Celery(
     backend=settings.redis_url,
 )
 
+register_serializers()
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    # Compact binary frames; plain JSON is still accepted from older producers
+    task_serializer=TASK_SERIALIZER,
+    accept_content=[TASK_SERIALIZER, RESULT_SERIALIZER, "json"],
+    result_serializer=RESULT_SERIALIZER,
+    result_accept_content=[TASK_SERIALIZER, RESULT_SERIALIZER, "json"],
+    result_expires=settings.result_expires or None,
     timezone="UTC",
     enable_utc=True,
+    # Interactive vs bulk queues; a worker without -Q consumes both
+    task_queues=TASK_QUEUES,
+    task_default_queue=INTERACTIVE,
+    task_routes=(route_task,),
+    broker_transport_options={"priority_steps": PRIORITY_STEPS, "queue_order_strategy": "priority"},
+    # A worker reserves one message at a time, so queued jobs are not held behind a long one
+    worker_prefetch_multiplier=settings.celery_prefetch_multiplier,
+    task_always_eager=settings.celery_task_always_eager,
+    task_eager_propagates=settings.celery_task_eager_propagates,
+    # Run by `celery beat` (one instance per deployment)
+    beat_schedule={
+        "maintain-deid-logs": {"task": "workers.maintain_deid_logs", "schedule": settings.deid_log_maintenance_sec},
+    },
 )
 
 # Autodiscover tasks from package
@@ -0,0 +1,208 @@
+"""
+Server-Sent Events for job progress (``GET /jobs/{task_id}/events``).
+
+Each event loop (one per API process) holds a single Redis pattern
+subscription on every job's progress channel, opened when the first stream
+starts and closed when the last one ends; reports are decoded once and fanned
+out to the watchers of their job through bounded in-memory queues. Thousands
+of open streams thus cost one Redis connection, not one each.
+
+A stream starts from the job's stored state (app/workers/progress.py), then
+sends an event per report. It ends with a ``done`` event when the job's
+callback finishes, or when a heartbeat status check finds the job ready
+(e.g. the chord failed before its callback ran). Heartbeats are SSE comments,
+which keep proxies from closing idle streams.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from weakref import WeakKeyDictionary
+
+from celery import states
+from redis import asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.workers.progress import KEY_PREFIX, JobProgress, progress_key
+from app.workers.status import job_statuses, redis_client
+
+
+log = get_logger("events")
+
+# Reports buffered per stream; a slow client only ever needs the latest one
+_QUEUE_SIZE = 64
+_READY_TIMEOUT_SEC = 5.0
+_RETRY_MAX_SEC = 10.0
+# EventSource reconnect delay sent to clients
+_CLIENT_RETRY_MS = 3000
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class ProgressHub:
+    """One pattern subscription fanned out to per-job watcher queues."""
+
+    def __init__(self) -> None:
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        # Set while the subscription is down, so new streams fail fast
+        self._failed = asyncio.Event()
+        self._error: Optional[Exception] = None
+
+    @property
+    def watchers(self) -> int:
+        return sum(len(qs) for qs in self._watchers.values())
+
+    def watch(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(_QUEUE_SIZE)
+        self._watchers.setdefault(job_id, set()).add(queue)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unwatch(self, job_id: str, queue: asyncio.Queue) -> None:
+        queues = self._watchers.get(job_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._watchers[job_id]
+        if not self._watchers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._ready.clear()
+            self._failed.clear()
+
+    async def ready(self) -> None:
+        waits = [asyncio.ensure_future(self._ready.wait()), asyncio.ensure_future(self._failed.wait())]
+        try:
+            await asyncio.wait(waits, timeout=_READY_TIMEOUT_SEC, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waits:
+                w.cancel()
+        if not self._ready.is_set():
+            raise RedisConnectionError(f"Progress subscription not established: {self._error or 'timeout'}")
+
+    def _dispatch(self, channel: bytes, data: bytes) -> None:
+        queues = self._watchers.get(channel.decode()[len(KEY_PREFIX):])
+        if not queues:
+            return
+        report = json.loads(data)
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()  # drop the oldest report
+            queue.put_nowait(report)
+
+    async def _run(self) -> None:
+        delay = 0.5
+        while True:
+            # A dedicated connection: a subscription blocks on reads indefinitely
+            client = aioredis.from_url(
+                get_settings().redis_url, socket_connect_timeout=2, health_check_interval=30
+            )
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(KEY_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message["type"] == "psubscribe":
+                        self._failed.clear()
+                        self._ready.set()
+                        delay = 0.5
+                    elif message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+            except RedisError as e:
+                self._ready.clear()
+                self._error = e
+                self._failed.set()
+                log.warning(f"Progress subscription lost, retrying in {delay:.1f}s: {e}")
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RETRY_MAX_SEC)
+
+
+_hubs: "WeakKeyDictionary[asyncio.AbstractEventLoop, ProgressHub]" = WeakKeyDictionary()
+
+
+def hub() -> ProgressHub:
+    loop = asyncio.get_running_loop()
+    h = _hubs.get(loop)
+    if h is None:
+        h = _hubs[loop] = ProgressHub()
+    return h
+
+
+class JobEvents:
+    """
+    One client's event stream. ``await open()`` subscribes and reads the
+    job's current state, raising RedisError if Redis is unreachable, so the
+    caller can still answer with an error status; ``stream()`` yields SSE text.
+    """
+
+    def __init__(self, job_id: str, heartbeat: Optional[float] = None) -> None:
+        self.job_id = job_id
+        self.heartbeat = get_settings().events_heartbeat_sec if heartbeat is None else heartbeat
+        self.progress = JobProgress(job_id)
+        self._hub: Optional[ProgressHub] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._status = states.PENDING
+
+    async def open(self) -> "JobEvents":
+        self._hub = hub()
+        self._queue = self._hub.watch(self.job_id)
+        try:
+            await self._hub.ready()
+            # Subscribed first, so no report falls between this read and the stream
+            stored = await redis_client().hgetall(progress_key(self.job_id))
+            for raw in stored.values():
+                self.progress.update(json.loads(raw))
+            self._status = (await job_statuses([self.job_id]))[self.job_id]
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def close(self) -> None:
+        if self._hub is not None and self._queue is not None:
+            self._hub.unwatch(self.job_id, self._queue)
+            self._queue = None
+
+    def _done(self, status: str) -> str:
+        return _sse("done", {"task_id": self.job_id, "status": status})
+
+    async def stream(self) -> AsyncIterator[str]:
+        assert self._queue is not None, "open() first"
+        try:
+            yield f"retry: {_CLIENT_RETRY_MS}\n\n"
+            if self.progress.shards:
+                yield _sse("progress", self.progress.snapshot())
+            status = self.progress.status or self._status
+            if status in states.READY_STATES:
+                yield self._done(status)
+                return
+            while True:
+                try:
+                    report = await asyncio.wait_for(self._queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    try:
+                        status = (await job_statuses([self.job_id]))[self.job_id]
+                    except RedisError as e:
+                        yield _sse("error", {"task_id": self.job_id, "detail": str(e)})
+                        return
+                    if status in states.READY_STATES:
+                        yield self._done(status)
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                self.progress.update(report)
+                if self.progress.status is not None:
+                    yield self._done(self.progress.status)
+                    return
+                yield _sse("progress", self.progress.snapshot())
+        finally:
+            self.close()
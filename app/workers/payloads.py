@@ -0,0 +1,185 @@
+"""
+Compact Celery payloads: binary frames for messages and results.
+
+Celery's default JSON is ASCII-escaped (each Greek character becomes a
+6-byte ``\\uXXXX``) and uncompressed, and results stay in Redis whole. Two
+kombu serializers replace it:
+
+- ``deid`` (task messages): one flag byte plus compact UTF-8 JSON, zlib
+  compressed once the encoded body reaches PAYLOAD_COMPRESS_MIN_BYTES
+- ``deid-ref`` (results): the same frame, but frames larger than
+  RESULT_INLINE_MAX_BYTES are written to RESULT_STORE_DIR and the backend
+  only keeps a small reference frame; decoding resolves it transparently.
+  Result metadata frames start with a ``@<STATUS>\\0`` header, so a job's
+  state can be read from the first bytes of its backend key (``read_status``)
+
+JSON encoding goes through kombu's encoder, so the types Celery puts in
+messages (datetimes, UUIDs) round-trip as with the stock serializer. Stored
+results are pruned after RESULT_EXPIRES, like the backend keys themselves.
+RESULT_STORE_DIR must be shared by the API and every worker.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from kombu.serialization import register
+from kombu.utils.json import dumps as kombu_dumps, loads as kombu_loads
+
+from app.core.config import get_settings
+
+
+TASK_SERIALIZER = "deid"
+RESULT_SERIALIZER = "deid-ref"
+CONTENT_TYPES = {
+    TASK_SERIALIZER: "application/x-deid-frame",
+    RESULT_SERIALIZER: "application/x-deid-frame-ref",
+}
+
+_RAW = b"J"
+_ZLIB = b"Z"
+_REF = b"R"
+_STATUS = b"@"
+# Fallback for stock-JSON metadata, where "status" is the first key
+_JSON_STATUS_RE = re.compile(rb'^\{\s*"status"\s*:\s*"([A-Z_]+)"')
+_REF_RE = re.compile(r"^[0-9a-f]{64}\.frame$")
+# Seconds between sweeps of expired stored results, per process
+_PRUNE_INTERVAL = 300.0
+_last_prune = 0.0
+
+
+def pack(obj: Any, compress_min: Optional[int] = None) -> bytes:
+    """Encode ``obj`` as a frame: compact UTF-8 JSON, zlib compressed when large."""
+    if compress_min is None:
+        compress_min = get_settings().payload_compress_min_bytes
+    body = kombu_dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if compress_min >= 0 and len(body) >= compress_min:
+        packed = zlib.compress(body, 6)
+        if len(packed) < len(body):
+            return _ZLIB + packed
+    return _RAW + body
+
+
+def unpack(frame: bytes) -> Any:
+    """Decode a frame produced by ``pack`` or ``pack_result``."""
+    if isinstance(frame, (memoryview, bytearray)):
+        frame = bytes(frame)
+    kind, body = frame[:1], frame[1:]
+    if kind == _STATUS:
+        return unpack(body[body.index(b"\0") + 1:])
+    if kind == _RAW:
+        return kombu_loads(body)
+    if kind == _ZLIB:
+        return kombu_loads(zlib.decompress(body))
+    if kind == _REF:
+        return unpack(_store_path(json.loads(body)["ref"]).read_bytes())
+    if kind == b"{":
+        # Stock-JSON metadata stored before the frame serializers took over
+        return kombu_loads(frame)
+    raise ValueError(f"Unknown payload frame type {kind!r}")
+
+
+def _store_dir() -> Path:
+    return Path(get_settings().result_store_dir)
+
+
+def _store_path(ref: str) -> Path:
+    if not _REF_RE.match(ref or ""):
+        raise ValueError(f"Invalid result reference {ref!r}")
+    path = _store_dir() / ref
+    if not path.exists():
+        raise KeyError(f"Stored result {ref} is missing or expired")
+    return path
+
+
+def prune_results(max_age: Optional[float] = None) -> int:
+    """Delete stored results older than ``max_age`` seconds (default RESULT_EXPIRES)."""
+    directory = _store_dir()
+    if not directory.exists():
+        return 0
+    if max_age is None:
+        max_age = float(get_settings().result_expires)
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in directory.glob("*.frame"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _maybe_prune() -> None:
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune >= _PRUNE_INTERVAL:
+        _last_prune = now
+        if get_settings().result_expires > 0:
+            prune_results()
+
+
+def pack_result(obj: Any) -> bytes:
+    """``pack``, storing frames over RESULT_INLINE_MAX_BYTES out of band."""
+    frame = _stored_if_large(pack(obj))
+    status = obj.get("status") if isinstance(obj, dict) else None
+    if isinstance(status, str):
+        return _STATUS + status.encode("ascii") + b"\0" + frame
+    return frame
+
+
+def read_status(prefix: bytes) -> Optional[str]:
+    """A job's state from the first bytes of its stored metadata; None if not readable there."""
+    if prefix[:1] == _STATUS:
+        end = prefix.find(b"\0")
+        return prefix[1:end].decode("ascii") if end > 0 else None
+    match = _JSON_STATUS_RE.match(prefix)
+    return match.group(1).decode("ascii") if match else None
+
+
+def _stored_if_large(frame: bytes) -> bytes:
+    limit = get_settings().result_inline_max_bytes
+    if limit <= 0 or len(frame) <= limit:
+        return frame
+    directory = _store_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    # Content-addressed, so re-storing the same result is a no-op rename
+    ref = f"{hashlib.sha256(frame).hexdigest()}.frame"
+    tmp = directory / f".{ref}.{os.getpid()}.tmp"
+    tmp.write_bytes(frame)
+    os.replace(tmp, directory / ref)
+    _maybe_prune()
+    return _REF + json.dumps({"ref": ref, "bytes": len(frame)}).encode("utf-8")
+
+
+def frame_info(frame: bytes) -> Dict[str, Any]:
+    """Kind and sizes of a frame without decoding its payload (for diagnostics)."""
+    info: Dict[str, Any] = {"bytes": len(frame)}
+    if frame[:1] == _STATUS:
+        end = frame.index(b"\0")
+        info["status"] = frame[1:end].decode("ascii")
+        frame = frame[end + 1:]
+    kind = frame[:1]
+    if kind == _REF:
+        ref = json.loads(frame[1:])
+        info.update(kind="ref", ref=ref["ref"], stored_bytes=ref["bytes"])
+    else:
+        info["kind"] = "zlib" if kind == _ZLIB else "raw"
+    return info
+
+
+def register_serializers() -> None:
+    register(
+        TASK_SERIALIZER, pack, unpack,
+        content_type=CONTENT_TYPES[TASK_SERIALIZER], content_encoding="binary",
+    )
+    register(
+        RESULT_SERIALIZER, pack_result, unpack,
+        content_type=CONTENT_TYPES[RESULT_SERIALIZER], content_encoding="binary",
+    )
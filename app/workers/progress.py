@@ -0,0 +1,171 @@
+"""
+Chunk-level progress of long-running jobs (bulk de-identification, evaluation).
+
+A job is identified by its chord callback's task id, the ``task_id`` the API
+returns. Workers report per shard, at most every PROGRESS_INTERVAL_SEC:
+
+- the latest report per shard is kept in the hash ``deid:progress:<job>``
+  (fields ``job``, ``shard:<id>``, ``done``), so late watchers start from the
+  current state
+- every report is also published on the channel of the same name, which the
+  API fans out to ``GET /jobs/{task_id}/events`` streams (app/workers/events.py)
+
+Publishing is best effort: a Redis error mutes reports from this process for
+a while instead of slowing the job down. ``JobProgress`` folds the reports
+into the job view (documents, bytes, throughput, ETA).
+"""
+
+import json
+import time
+from typing import Any, Dict, Optional
+
+import redis
+from redis.exceptions import RedisError
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+
+log = get_logger("progress")
+
+KEY_PREFIX = "deid:progress:"
+# After a failed publish, reports are dropped for this many seconds
+_MUTE_SEC = 30.0
+_muted_until = 0.0
+_clients: Dict[str, redis.Redis] = {}
+
+
+def progress_key(job_id: str) -> str:
+    """Hash key and pub/sub channel of a job's progress."""
+    return KEY_PREFIX + job_id
+
+
+def _client() -> redis.Redis:
+    url = get_settings().redis_url
+    client = _clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=2)
+        _clients[url] = client
+    return client
+
+
+def publish(job_id: str, field: str, report: Dict[str, Any]) -> bool:
+    """Store ``report`` as the job's latest ``field`` and publish it; False if dropped."""
+    global _muted_until
+    if time.monotonic() < _muted_until:
+        return False
+    key = progress_key(job_id)
+    data = json.dumps({"field": field, **report}, separators=(",", ":"))
+    try:
+        pipe = _client().pipeline(transaction=False)
+        pipe.hset(key, field, data)
+        expires = get_settings().result_expires
+        if expires > 0:
+            pipe.expire(key, expires)
+        pipe.publish(key, data)
+        pipe.execute()
+    except RedisError as e:
+        _muted_until = time.monotonic() + _MUTE_SEC
+        log.warning(f"Progress reports paused for {_MUTE_SEC:.0f}s: {e}")
+        return False
+    return True
+
+
+def announce_job(job_id: str, shards: int, bytes_total: int) -> None:
+    """Record a job's size when it is dispatched."""
+    publish(job_id, "job", {"shards": shards, "bytes_total": bytes_total, "started_at": time.time()})
+
+
+def job_finished(job_id: str, status: str) -> None:
+    publish(job_id, "done", {"status": status})
+
+
+class ShardProgress:
+    """
+    Progress reporter for one shard covering input bytes [start, end).
+    Call it with the next input offset and the documents done so far; it
+    publishes at most every ``interval`` seconds, and always the final report.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        shard: str,
+        start: int,
+        end: int,
+        offset: Optional[int] = None,
+        docs: int = 0,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.job_id = job_id
+        self.shard = shard
+        self.start = start
+        self.end = end
+        self.interval = get_settings().progress_interval_sec if interval is None else interval
+        # Rates cover this run only: a resumed shard starts from its checkpoint
+        self._offset0 = start if offset is None else offset
+        self._docs0 = docs
+        self._t0 = time.monotonic()
+        self._last = 0.0
+
+    def __call__(self, offset: int, docs: int, errors: int = 0, done: bool = False) -> None:
+        now = time.monotonic()
+        if not done and now - self._last < self.interval:
+            return
+        self._last = now
+        offset = min(max(offset, self.start), self.end)
+        elapsed = max(now - self._t0, 1e-9)
+        publish(self.job_id, f"shard:{self.shard}", {
+            "shard": self.shard,
+            "bytes_done": offset - self.start,
+            "bytes_total": self.end - self.start,
+            "docs": docs,
+            "errors": errors,
+            "bytes_per_sec": (offset - self._offset0) / elapsed,
+            "docs_per_sec": (docs - self._docs0) / elapsed,
+            "done": done,
+        })
+
+
+class JobProgress:
+    """A job's state folded from its shard reports (in any order, repeats allowed)."""
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self.job: Dict[str, Any] = {}
+        self.shards: Dict[str, Dict[str, Any]] = {}
+        self.status: Optional[str] = None
+
+    def update(self, report: Dict[str, Any]) -> None:
+        field = report.get("field", "")
+        if field == "job":
+            self.job = report
+        elif field == "done":
+            self.status = report.get("status")
+        elif field.startswith("shard:"):
+            self.shards[field[len("shard:"):]] = report
+
+    def snapshot(self) -> Dict[str, Any]:
+        shards = self.shards.values()
+        bytes_total = int(self.job.get("bytes_total") or sum(s["bytes_total"] for s in shards))
+        bytes_done = sum(int(s["bytes_done"]) for s in shards)
+        running = [s for s in shards if not s.get("done")]
+        # Shards run concurrently: the job's rate is the sum of the running shards'
+        bytes_per_sec = sum(float(s.get("bytes_per_sec", 0.0)) for s in running)
+        remaining = max(bytes_total - bytes_done, 0)
+        if remaining == 0:
+            eta: Optional[float] = 0.0
+        else:
+            eta = remaining / bytes_per_sec if bytes_per_sec > 0 else None
+        return {
+            "task_id": self.job_id,
+            "shards": int(self.job.get("shards") or len(self.shards)),
+            "shards_done": sum(bool(s.get("done")) for s in shards),
+            "docs": sum(int(s.get("docs", 0)) for s in shards),
+            "errors": sum(int(s.get("errors", 0)) for s in shards),
+            "bytes_done": bytes_done,
+            "bytes_total": bytes_total,
+            "percent": (100.0 * bytes_done / bytes_total) if bytes_total else 0.0,
+            "docs_per_sec": sum(float(s.get("docs_per_sec", 0.0)) for s in running),
+            "eta_sec": eta,
+        }
@@ -0,0 +1,101 @@
+"""
+Celery queues, routing and priorities.
+
+Two queues keep long jobs from starving interactive ones:
+
+- ``interactive``: single documents and small batches up to
+  INTERACTIVE_MAX_CHARS in total
+- ``bulk``: evaluations, bulk exports and any larger de-identification
+
+Run a worker pool per queue (``-Q interactive`` / ``-Q bulk``) to bound
+interactive latency whatever the bulk backlog; a worker without ``-Q``
+consumes both. Within a queue, smaller documents get a higher priority (on
+Redis 0 is the highest of ``PRIORITY_STEPS``).
+
+Producers stamp an ``enqueued_at`` header on every message; workers observe
+the queue wait when they start the task (``deid_queue_wait_seconds``).
+``queue_depths`` reads the backlog per queue from the broker.
+"""
+
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from celery.signals import before_task_publish, task_prerun
+from kombu import Queue
+from kombu.exceptions import ChannelError
+
+from app.core import metrics
+from app.core.config import get_settings
+
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+QUEUES = (INTERACTIVE, BULK)
+TASK_QUEUES = tuple(Queue(name, routing_key=name) for name in QUEUES)
+PRIORITY_STEPS = [0, 3, 6, 9]
+
+# Long-running by nature, whatever their arguments
+_BULK_TASKS = frozenset({
+    "workers.evaluate_dataset_task",
+    "workers.evaluate_shard_task",
+    "workers.evaluate_reduce_task",
+    "workers.bulk_deid_shard_task",
+    "workers.bulk_deid_finalize_task",
+    "workers.maintain_deid_logs",
+})
+# Short documents jump ahead of longer ones in the same queue
+_SMALL_DOC_CHARS = 2_000
+
+
+def _payload_chars(name: str, args: Optional[Sequence], kwargs: Optional[Dict]) -> Optional[int]:
+    args, kwargs = args or (), kwargs or {}
+    if name == "workers.deid_text_task":
+        text = args[0] if args else kwargs.get("text")
+        return len(text or "")
+    if name == "workers.deid_batch_task":
+        texts = args[0] if args else kwargs.get("texts")
+        return sum(len(t or "") for t in texts or ())
+    return None
+
+
+def route_task(name: str, args, kwargs, options, task=None, **kw) -> Optional[Dict[str, Any]]:
+    """Celery router: queue and priority from the task type and document size."""
+    if name in _BULK_TASKS:
+        return {"queue": BULK, "routing_key": BULK, "priority": PRIORITY_STEPS[-1]}
+    chars = _payload_chars(name, args, kwargs)
+    if chars is None:
+        return None
+    if chars > get_settings().interactive_max_chars:
+        return {"queue": BULK, "routing_key": BULK, "priority": PRIORITY_STEPS[2]}
+    priority = PRIORITY_STEPS[0] if chars <= _SMALL_DOC_CHARS else PRIORITY_STEPS[1]
+    return {"queue": INTERACTIVE, "routing_key": INTERACTIVE, "priority": priority}
+
+
+@before_task_publish.connect
+def _stamp_enqueued_at(headers: Optional[Dict] = None, **_kwargs) -> None:
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+
+@task_prerun.connect
+def _observe_queue_wait(task=None, **_kwargs) -> None:
+    request = getattr(task, "request", None)
+    enqueued_at = getattr(request, "enqueued_at", None)
+    if enqueued_at is None:
+        return  # eager / direct calls never went through a queue
+    queue = (getattr(request, "delivery_info", None) or {}).get("routing_key") or "unknown"
+    metrics.observe_queue_wait(queue, time.time() - float(enqueued_at))
+
+
+def queue_depths(connection) -> Dict[str, int]:
+    """Messages waiting per queue (all priorities), read from the broker."""
+    depths: Dict[str, int] = {}
+    with connection.channel() as channel:
+        for name in QUEUES:
+            try:
+                depths[name] = int(channel.queue_declare(queue=name, passive=True).message_count)
+            except ChannelError:
+                depths[name] = 0  # never declared: nothing was ever queued
+    for name, depth in depths.items():
+        metrics.set_queue_depth(name, depth)
+    return depths
@@ -0,0 +1,136 @@
+"""
+Async job status reads straight from the Celery result backend (Redis).
+
+``AsyncResult.status`` / ``.result`` are synchronous: every poll blocks the
+API's event loop on a Redis round trip and pulls the whole result. Here all
+reads go through one ``redis.asyncio`` connection pool per event loop and one
+pipeline per request, however many task ids it covers:
+
+- ``job_statuses`` reads only the first bytes of each task's metadata
+  (GETRANGE); result frames carry the state in a header (see
+  app/workers/payloads.py), so the result body is never transferred
+- ``job_results`` fetches whole metadata and decodes it off the event loop
+- ``wait_for_job`` long-polls one job's state with backed-off prefix reads
+
+Unknown ids are PENDING, as in Celery.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+from celery import states
+from kombu.serialization import loads as kombu_loads
+from redis import asyncio as aioredis
+
+from app.core.config import get_settings
+from app.workers.celery_app import celery_app
+from app.workers.payloads import read_status
+
+
+PENDING = "PENDING"
+# Enough for "@<STATUS>\0" and the head of stock-JSON metadata
+_STATUS_PREFIX_BYTES = 64
+
+_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = WeakKeyDictionary()
+
+
+def redis_client() -> aioredis.Redis:
+    # redis.asyncio connections belong to the loop that opened them
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        settings = get_settings()
+        client = aioredis.from_url(
+            settings.redis_url,
+            max_connections=settings.status_pool_size,
+            socket_connect_timeout=2,
+            socket_timeout=5,
+        )
+        _clients[loop] = client
+    return client
+
+
+def _key(task_id: str) -> str:
+    return celery_app.backend.get_key_for_task(task_id).decode()
+
+
+def _decode_meta(raw: bytes) -> Dict[str, Any]:
+    backend = celery_app.backend
+    meta = kombu_loads(
+        raw, content_type=backend.content_type, content_encoding=backend.content_encoding, accept=backend.accept
+    )
+    return backend.meta_from_decoded(meta)
+
+
+def job_payload(task_id: str, meta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The public job view: status plus the result on success or the error on failure."""
+    if meta is None:
+        return {"task_id": task_id, "status": PENDING}
+    status = meta.get("status", PENDING)
+    payload: Dict[str, Any] = {"task_id": task_id, "status": status}
+    if status == "SUCCESS":
+        payload["result"] = meta.get("result")
+    elif status == "FAILURE":
+        # meta_from_decoded already rebuilt the exception
+        payload["error"] = str(meta.get("result"))
+    return payload
+
+
+async def _fetch(task_ids: Sequence[str]) -> List[Optional[bytes]]:
+    async with redis_client().pipeline(transaction=False) as pipe:
+        for task_id in task_ids:
+            pipe.get(_key(task_id))
+        return await pipe.execute()
+
+
+async def job_statuses(task_ids: Sequence[str]) -> Dict[str, str]:
+    """State per task id from metadata prefixes; one pipelined round trip."""
+    async with redis_client().pipeline(transaction=False) as pipe:
+        for task_id in task_ids:
+            pipe.getrange(_key(task_id), 0, _STATUS_PREFIX_BYTES - 1)
+        prefixes = await pipe.execute()
+    out: Dict[str, str] = {}
+    unreadable: List[str] = []
+    for task_id, prefix in zip(task_ids, prefixes):
+        if not prefix:
+            out[task_id] = PENDING
+            continue
+        status = read_status(prefix)
+        if status is None:
+            unreadable.append(task_id)
+        else:
+            out[task_id] = status
+    if unreadable:
+        # Metadata written without a status header: decode it whole
+        for task_id, meta in (await job_results(unreadable)).items():
+            out[task_id] = meta["status"]
+    return out
+
+
+async def job_results(task_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Full job views per task id; decoding (and out-of-band reads) run in a worker thread."""
+    raws = await _fetch(task_ids)
+
+    def decode() -> Dict[str, Dict[str, Any]]:
+        return {
+            task_id: job_payload(task_id, _decode_meta(raw) if raw else None)
+            for task_id, raw in zip(task_ids, raws)
+        }
+
+    return await asyncio.to_thread(decode)
+
+
+async def wait_for_job(task_id: str, timeout: float) -> str:
+    """Long-poll: the job's state once it is ready or ``timeout`` seconds have passed."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while True:
+        state = (await job_statuses([task_id]))[task_id]
+        remaining = deadline - time.monotonic()
+        if state in states.READY_STATES or remaining <= 0:
+            return state
+        # Prefix reads are cheap, but back off so long jobs cost a few reads per second
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.5)
@@ -1,97 +1,326 @@
+import os
 import time
 import uuid
-from typing import Optional
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 
+from celery import chord, group
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown
 from sqlalchemy.orm import Session
 
 from app.workers.celery_app import celery_app, log
 from app.deid.engine import DeidEngine, POLICY_MAP as DEFAULT_POLICY_MAP
+from app.core import profiling
 from app.core.config import get_settings
+from app.core.sharding import byte_range_shards
+from app.deid.bulk import Shard, load_checkpoint, plan_shards, process_shard, summarize
+from app.deid.evaluation import Counts, label_metrics, metric_run_fields, score_byte_range
+from app.deid.recognizers import _get_nlp
 from app.db.session import session_scope
-from app.db.crud import create_deid_log, create_metric_run
+from app.db.audit import audit_log, deid_log_row
+from app.db.crud import create_metric_run
+from app.db.maintenance import maintain
+from app.workers.progress import ShardProgress, announce_job, job_finished
+
+
+_engine: Optional[DeidEngine] = None
+
+
+def get_engine() -> DeidEngine:
+    """The worker process's engine, built once (policy and salt come from settings)."""
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        _engine = DeidEngine(
+            policy_map={**DEFAULT_POLICY_MAP},
+            salt=settings.deid_salt,
+            default_policy=settings.deid_default_policy,
+        )
+    return _engine
+
+
+@worker_process_init.connect
+def _warm_worker_process(**_kwargs) -> None:
+    # Build the engine and load the spaCy models before the first task arrives
+    get_engine()
+    for lang in ("en", "el"):
+        _get_nlp(lang)
+
+
+def _log_row(result: Dict[str, Any], lang_hint: Optional[str], settings) -> Dict[str, Any]:
+    return deid_log_row(result, lang_hint, f"{settings.app_version}:{settings.deid_default_policy}")
+
+
+def _persist_logs(rows: List[Dict[str, Any]]) -> None:
+    # Buffered: the process's audit writer inserts them in batches off the task's path
+    if not rows or not get_settings().deid_task_logs:
+        return
+    audit = audit_log()
+    for row in rows:
+        audit.record(row)
+
+
+@worker_process_shutdown.connect
+def _drain_audit_log(**_kwargs) -> None:
+    # Prefork children skip atexit handlers
+    audit_log().close()
 
 
 @celery_app.task(name="workers.deid_text_task")
-def deid_text_task(text: str, lang_hint: Optional[str] = None):
+def deid_text_task(
+    text: str,
+    lang_hint: Optional[str] = None,
+    mode: str = "full",
+    labels: Optional[List[str]] = None,
+    exclude_labels: Optional[List[str]] = None,
+    deadline_ms: Optional[int] = None,
+    fail_closed: Optional[bool] = None,
+    profile: bool = False,
+    policy_map: Optional[Dict[str, str]] = None,
+    default_policy: Optional[str] = None,
+):
     settings = get_settings()
-    engine = DeidEngine(
-        policy_map={**DEFAULT_POLICY_MAP},
-        salt=settings.deid_salt,
-        default_policy=settings.deid_default_policy,
-    )
+    engine = get_engine()
+    if policy_map is not None or default_policy is not None:
+        # The API's policy was changed at runtime (PUT /config)
+        engine = DeidEngine(
+            policy_map=policy_map if policy_map is not None else {**DEFAULT_POLICY_MAP},
+            salt=settings.deid_salt,
+            default_policy=default_policy or settings.deid_default_policy,
+        )
+    budget_ms = deadline_ms if deadline_ms is not None else settings.deid_deadline_ms
+    deadline = (time.monotonic() + budget_ms / 1000.0) if budget_ms and budget_ms > 0 else None
 
     req_id = uuid.uuid4()
-    result = engine.deidentify(text or "", lang_hint=lang_hint)
-
-    # Persist log
-    try:
-        with session_scope() as db:  # type: Session
-            create_deid_log(
-                db,
-                request_id=req_id,
-                num_entities=len(result.get("entities", [])),
-                time_ms=float(result.get("time_ms", 0)),
-                input_len=int(result.get("original_len", 0)),
-                output_len=len(result.get("result_text", "")),
-                policy_version=f"{settings.app_version}:{settings.deid_default_policy}",
-                lang_hint=lang_hint or "",
-                sample_preview=(result.get("result_text", "")[:200]),
-            )
-    except Exception as e:  # pragma: no cover - logging only
-        log.warning(f"Failed to persist DeidLog: {e}")
-
-    return {"request_id": str(req_id), **result}
-
-
-@celery_app.task(name="workers.evaluate_dataset_task")
-def evaluate_dataset_task(dataset_path: str):
-    """Very lightweight placeholder evaluation: treat each non-empty line as a doc."""
-    settings = get_settings()
-    engine = DeidEngine(
-        policy_map={**DEFAULT_POLICY_MAP},
-        salt=settings.deid_salt,
-        default_policy=settings.deid_default_policy,
+    # Profiles land in the worker's PROFILE_DIR; share it with the API to fetch them there
+    profiler = (
+        profiling.profile("workers.deid_text_task", {"request_id": str(req_id), "chars": len(text or "")})
+        if profile else nullcontext()
     )
+    with profiler as prof:
+        result = engine.deidentify(
+            text or "",
+            lang_hint=lang_hint,
+            mode=mode,
+            labels=labels,
+            exclude_labels=exclude_labels,
+            deadline=deadline,
+            fail_closed=settings.deid_fail_closed if fail_closed is None else fail_closed,
+        )
+    if prof is not None:
+        result["profile_id"] = prof.id
+    result = {"request_id": str(req_id), **result}
+    _persist_logs([_log_row(result, lang_hint, settings)])
+    return result
 
-    started = time.perf_counter()
-    n_docs = 0
-    try:
-        with open(dataset_path, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                text = line.strip()
-                if not text:
-                    continue
-                engine.deidentify(text)
-                n_docs += 1
-    except FileNotFoundError:
-        raise
 
-    elapsed = time.perf_counter() - started
-    docs_per_sec = (n_docs / elapsed) if elapsed > 0 else 0.0
+@celery_app.task(name="workers.deid_batch_task")
+def deid_batch_task(
+    texts: List[str],
+    lang_hint: Optional[str] = None,
+    mode: str = "full",
+    labels: Optional[List[str]] = None,
+    exclude_labels: Optional[List[str]] = None,
+):
+    """
+    De-identify many texts in one message: NER runs through ``nlp.pipe`` and the
+    DeidLog rows go to the audit writer together. Returns one result per text, in
+    order; a text that cannot be processed (too long) gets ``{"error": ...}``.
+    """
+    settings = get_settings()
+    engine = get_engine()
+    texts = [t or "" for t in texts]
+    ok = [i for i, t in enumerate(texts) if len(t) <= settings.max_text_size]
+    results: List[Dict[str, Any]] = [
+        {"error": f"Text too long: {len(t)} chars (max {settings.max_text_size})"} for t in texts
+    ]
+    done = engine.deidentify_batch(
+        [texts[i] for i in ok],
+        [lang_hint] * len(ok),
+        mode=mode,
+        labels=labels,
+        exclude_labels=exclude_labels,
+    )
+    for i, res in zip(ok, done):
+        results[i] = {"request_id": str(uuid.uuid4()), **res}
+    _persist_logs([_log_row(results[i], lang_hint, settings) for i in ok])
+    return results
 
-    # Placeholder metrics
-    precision = {"micro": 0.0}
-    recall = {"micro": 0.0}
-    f1 = {"micro": 0.0}
-    fnr = {"overall": 0.0}
 
-    # Persist metric run
-    run = None
+def _persist_evaluation(
+    dataset_path: str, counts: Counts, elapsed: float, shards: int, busy_sec: float
+) -> Dict[str, Any]:
+    metrics = label_metrics(counts)
+    docs_per_sec = (counts.n_docs / elapsed) if elapsed > 0 else 0.0
     with session_scope() as db:  # type: Session
         run = create_metric_run(
             db,
             dataset_name=str(dataset_path),
-            precision=precision,
-            recall=recall,
-            f1=f1,
             docs_per_sec=docs_per_sec,
-            false_negative_rate=fnr,
+            **metric_run_fields(metrics),
         )
-
+        run_id = run.id
     return {
-        "id": run.id if run else None,
+        "id": run_id,
         "dataset_name": str(dataset_path),
-        "docs": n_docs,
+        "docs": counts.n_docs,
+        "skipped_lines": counts.skipped_lines,
+        "shards": shards,
         "elapsed_sec": elapsed,
         "docs_per_sec": docs_per_sec,
+        # Sum of per-shard scoring time; busy_sec / elapsed ~ effective parallelism
+        "worker_busy_sec": busy_sec,
+        "totals": metrics["totals"],
+        "micro": metrics["micro"],
+        "macro": metrics["macro"],
     }
+
+
+@celery_app.task(name="workers.evaluate_dataset_task", bind=True)
+def evaluate_dataset_task(self, dataset_path: str):
+    """Evaluate a gold JSONL dataset on this worker and persist the MetricRun."""
+    started = time.perf_counter()
+    size = os.path.getsize(dataset_path)
+    announce_job(self.request.id, 1, size)
+    report = ShardProgress(self.request.id, "0", 0, size)
+    counts = score_byte_range(dataset_path, 0, size, progress=report)
+    report(size, counts.n_docs, done=True)
+    elapsed = time.perf_counter() - started
+    return _persist_evaluation(dataset_path, counts, elapsed, shards=1, busy_sec=elapsed)
+
+
+@celery_app.task(name="workers.evaluate_shard_task")
+def evaluate_shard_task(dataset_path: str, start: int, end: int, job_id: Optional[str] = None) -> Dict[str, Any]:
+    """Score the lines starting in [start, end) of the dataset; returns mergeable counts."""
+    t0 = time.perf_counter()
+    report = ShardProgress(job_id, str(start), start, end) if job_id else None
+    counts = score_byte_range(dataset_path, start, end, progress=report)
+    if report is not None:
+        report(end, counts.n_docs, done=True)
+    return {**counts.to_dict(), "busy_sec": time.perf_counter() - t0}
+
+
+@celery_app.task(name="workers.evaluate_reduce_task")
+def evaluate_reduce_task(shard_results: List[Dict[str, Any]], dataset_path: str, started_at: float):
+    """Chord callback: merge shard counts and persist one MetricRun for the whole dataset."""
+    total = Counts()
+    busy = 0.0
+    for res in shard_results:
+        total.merge(Counts.from_dict(res))
+        busy += float(res.get("busy_sec", 0.0))
+    # Wall clock from dispatch to reduce, so docs/sec is the cluster's aggregate rate
+    elapsed = max(time.time() - started_at, 0.0)
+    return _persist_evaluation(dataset_path, total, elapsed, shards=len(shard_results), busy_sec=busy)
+
+
+def evaluate_dataset_distributed(dataset_path: str, shards: int):
+    """
+    Fan the dataset out as byte-range shards (a Celery group) reduced by a chord
+    callback. Returns the callback's AsyncResult; its result is the MetricRun summary.
+    """
+    ranges = byte_range_shards(dataset_path, shards)
+    callback = evaluate_reduce_task.s(dataset_path, time.time())
+    # Shards report progress under the callback's id, the job id clients see
+    job_id = callback.freeze().id
+    announce_job(job_id, len(ranges), os.path.getsize(dataset_path))
+    header = group(evaluate_shard_task.s(dataset_path, start, end, job_id) for start, end in ranges)
+    return chord(header)(callback)
+
+
+@celery_app.task(name="workers.bulk_deid_shard_task")
+def bulk_deid_shard_task(
+    shard: Dict[str, Any],
+    output_dir: str,
+    text_field: str = "text",
+    lang_hint: Optional[str] = None,
+    batch_size: int = 256,
+    job_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """De-identify one shard of a bulk job, resuming from its checkpoint."""
+    shard = Shard(**shard)
+    if not job_id:
+        return process_shard(
+            shard, output_dir, get_engine(),
+            text_field=text_field, lang_hint=lang_hint, batch_size=batch_size,
+        )
+    resumed = load_checkpoint(output_dir, shard.part) or {}
+    report = ShardProgress(
+        job_id, shard.part, shard.start, shard.end,
+        offset=resumed.get("offset"), docs=int(resumed.get("records", 0)),
+    )
+    ckpt = process_shard(
+        shard, output_dir, get_engine(),
+        text_field=text_field, lang_hint=lang_hint, batch_size=batch_size,
+        progress=lambda c: report(c["offset"], c["records"], c["errors"]),
+    )
+    # Also for shards finished by an earlier run, so the job's totals add up
+    report(ckpt["offset"], ckpt["records"], ckpt["errors"], done=True)
+    return ckpt
+
+
+@celery_app.task(name="workers.bulk_deid_finalize_task")
+def bulk_deid_finalize_task(shard_results: List[Dict[str, Any]], output_dir: str, started_at: float):
+    """Chord callback: job totals, also written to ``_SUCCESS`` in the output directory."""
+    return summarize(output_dir, shard_results, max(time.time() - started_at, 0.0))
+
+
+def bulk_deid(
+    input_path: str,
+    output_dir: str,
+    shards: int,
+    text_field: str = "text",
+    lang_hint: Optional[str] = None,
+    batch_size: int = 256,
+):
+    """
+    Fan a bulk job out as one task per shard, finalized by a chord callback.
+    Re-submitting a job with the same output directory resumes it. Returns the
+    callback's AsyncResult and the shard count.
+    """
+    plan = plan_shards(input_path, output_dir, shards)
+    callback = bulk_deid_finalize_task.s(output_dir, time.time())
+    job_id = callback.freeze().id
+    announce_job(job_id, len(plan), sum(s.end - s.start for s in plan))
+    header = group(
+        bulk_deid_shard_task.s(
+            {"part": s.part, "input": s.input, "start": s.start, "end": s.end},
+            output_dir, text_field, lang_hint, batch_size, job_id,
+        )
+        for s in plan
+    )
+    return chord(header)(callback), len(plan)
+
+
+@celery_app.task(name="workers.maintain_deid_logs")
+def maintain_deid_logs_task() -> Dict[str, Any]:
+    """Hourly (Celery beat): deid_logs partitions ahead, recent rollups, retention."""
+    settings = get_settings()
+    with session_scope() as db:  # type: Session
+        if db.get_bind().dialect.name != "postgresql":
+            return {"skipped": "deid_logs is only partitioned on PostgreSQL"}
+        report = maintain(
+            db,
+            datetime.now(timezone.utc),
+            ahead=settings.deid_log_partitions_ahead,
+            lookback_hours=settings.deid_log_rollup_lookback_hours,
+            retention_days=settings.deid_log_retention_days,
+        )
+    if report["created"] or report["dropped"]:
+        log.info(f"deid_logs partitions created {report['created']}, dropped {report['dropped']}")
+    return report
+
+
+# Tasks whose end is the end of a job; progress streams close on it
+_JOB_TASKS = frozenset({
+    "workers.evaluate_dataset_task",
+    "workers.evaluate_reduce_task",
+    "workers.bulk_deid_finalize_task",
+})
+
+
+@task_postrun.connect
+def _publish_job_done(task_id=None, task=None, state=None, **_kwargs) -> None:
+    # After the result is stored, so a watcher told "done" can read it
+    if task is not None and task.name in _JOB_TASKS and state:
+        job_finished(task_id, state)
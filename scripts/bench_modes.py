@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark response size and serialization cost of each DeidEngine result mode.
+
+For every mode ("full", "spans", "patch", "counts") the script runs the engine
+on the same document, serializes the result to JSON the way the API does, and
+reports engine time, serialization time and response bytes.
+
+Usage:
+  python scripts/bench_modes.py --file note_big_ok.txt --repeat 5
+  python scripts/bench_modes.py --out scripts/bench_modes.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from app.core.config import get_settings  # noqa: E402
+from app.deid.engine import DeidEngine, POLICY_MAP, RESULT_MODES  # noqa: E402
+
+
+_SAMPLE_UNIT = (
+    "Ο ασθενής Γιάννης Παπαδόπουλος, ΑΜΚΑ 12039912345, τηλ 210 123 4567, "
+    "email giannis@example.com, Οδός Σοφοκλέους 10, ΤΚ 10559, Αθήνα.\n"
+    "Patient John, MRN ZXCVB-1234, https://hospital.example.org/c/7788 IP 192.168.1.100\n"
+)
+
+
+def bench_modes(text: str, repeat: int = 3, lang_hint: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    settings = get_settings()
+    engine = DeidEngine(
+        policy_map={**POLICY_MAP},
+        salt=settings.deid_salt,
+        default_policy=settings.deid_default_policy,
+    )
+    report: Dict[str, Dict[str, float]] = {}
+    for mode in RESULT_MODES:
+        engine_s: List[float] = []
+        serialize_s: List[float] = []
+        size = 0
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            result = engine.deidentify(text, lang_hint=lang_hint, mode=mode)
+            t1 = time.perf_counter()
+            body = json.dumps(result, ensure_ascii=True).encode("utf-8")
+            t2 = time.perf_counter()
+            engine_s.append(t1 - t0)
+            serialize_s.append(t2 - t1)
+            size = len(body)
+        report[mode] = {
+            "engine_ms": statistics.median(engine_s) * 1000,
+            "serialize_ms": statistics.median(serialize_s) * 1000,
+            "response_bytes": size,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DeidEngine result modes")
+    parser.add_argument("--file", type=str, default=None, help="Text file to de-identify")
+    parser.add_argument("--size", type=int, default=200_000, help="Synthetic text size when --file is not given")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lang-hint", type=str, default=None, choices=["en", "el"])
+    parser.add_argument("--out", type=str, default=None, help="Optional path to write a JSON report")
+    args = parser.parse_args()
+
+    if args.file:
+        text = Path(args.file).read_text(encoding="utf-8")
+    else:
+        text = (_SAMPLE_UNIT * (args.size // len(_SAMPLE_UNIT) + 1))[: args.size]
+
+    report = bench_modes(text, repeat=args.repeat, lang_hint=args.lang_hint)
+
+    print(f"Document: {len(text)} chars")
+    header = f"{'MODE':8} {'ENGINE ms':>10} {'JSON ms':>9} {'BYTES':>10}"
+    print(header)
+    print("-" * len(header))
+    for mode, m in report.items():
+        print(f"{mode:8} {m['engine_ms']:10.1f} {m['serialize_ms']:9.2f} {int(m['response_bytes']):10d}")
+
+    if args.out:
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump({"chars": len(text), "modes": report}, f, indent=2)
+        print(f"\nWrote report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
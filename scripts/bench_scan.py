@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the short-circuit contains_phi scan against full detect_entities.
+
+Two synthetic corpora are built: "clean" notes with no identifiers (the scan
+must run every detector to prove absence) and "dirty" notes with identifiers
+placed at random offsets (the scan should stop early).
+
+Usage:
+  python scripts/bench_scan.py --docs 200 --doc-size 5000
+  python scripts/bench_scan.py --min-priority 85 --out scripts/bench_scan.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from app.deid.recognizers import contains_phi, detect_entities  # noqa: E402
+
+
+_CLEAN_SENTENCES = [
+    "Ο ασθενής παρουσίασε πυρετό και βήχα για τρεις ημέρες. ",
+    "The patient reported mild pain and was discharged in good condition. ",
+    "Συνεστήθη ανάπαυση και επανέλεγχος σε δύο εβδομάδες. ",
+    "Vitals were stable throughout the observation period. ",
+]
+
+_PHI_SNIPPETS = [
+    "email maria@example.gr ",
+    "τηλ 6912345678 ",
+    "ΑΜΚΑ 12039912345 ",
+    "MRN: ZXCV-778899 ",
+    "https://hospital.example.org/c/1 ",
+]
+
+
+def build_corpus(n_docs: int, doc_size: int, dirty: bool, seed: int = 1337) -> List[str]:
+    rng = random.Random(seed)
+    docs: List[str] = []
+    for _ in range(n_docs):
+        parts: List[str] = []
+        size = 0
+        while size < doc_size:
+            s = rng.choice(_CLEAN_SENTENCES)
+            parts.append(s)
+            size += len(s)
+        if dirty:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(_PHI_SNIPPETS))
+        docs.append("".join(parts))
+    return docs
+
+
+def _time(fn: Callable[[str], object], docs: List[str]) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    hits = 0
+    for d in docs:
+        if fn(d):
+            hits += 1
+    elapsed = time.perf_counter() - t0
+    return {
+        "elapsed_sec": elapsed,
+        "docs_per_sec": (len(docs) / elapsed) if elapsed > 0 else 0.0,
+        "positive_docs": hits,
+    }
+
+
+def bench_scan(n_docs: int, doc_size: int, min_priority: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    report: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for corpus in ("clean", "dirty"):
+        docs = build_corpus(n_docs, doc_size, dirty=(corpus == "dirty"))
+        report[corpus] = {
+            "detect_entities": _time(lambda d: detect_entities(d), docs),
+            "contains_phi": _time(lambda d: contains_phi(d, min_priority=min_priority), docs),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark contains_phi vs detect_entities")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--doc-size", type=int, default=5000, help="Approximate characters per doc")
+    parser.add_argument("--min-priority", type=int, default=0)
+    parser.add_argument("--out", type=str, default=None, help="Optional path to write a JSON report")
+    args = parser.parse_args()
+
+    report = bench_scan(args.docs, args.doc_size, min_priority=args.min_priority)
+
+    header = f"{'CORPUS':8} {'DETECTOR':16} {'DOCS/S':>10} {'POSITIVE':>9}"
+    print(header)
+    print("-" * len(header))
+    for corpus, rows in report.items():
+        for name, m in rows.items():
+            print(f"{corpus:8} {name:16} {m['docs_per_sec']:10.1f} {int(m['positive_docs']):9d}")
+
+    if args.out:
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote report to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
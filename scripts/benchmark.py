@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark suite for the de-identification engine with regression gates.
+
+Cases cover document size (100 chars to 500k), entity density, EL/EN/mixed
+text, regex-only vs full (regex + NER) detection, and the individual stages:
+_regex_entities, _filter_mrn_overdetections, _dedupe and DeidEngine.deidentify.
+Each case records median/min wall time over repeats and the peak traced memory
+of one extra run (tracemalloc).
+
+Usage:
+  # Record a baseline
+  python scripts/benchmark.py --out scripts/bench_baseline.json
+  # Compare a change against it (exit code 1 on regression)
+  python scripts/benchmark.py --compare scripts/bench_baseline.json --threshold 0.25
+  # Small, fast matrix for CI
+  python scripts/benchmark.py --quick --out /tmp/bench.json
+  # Also store one MetricRun row per case (dataset_name "benchmark:<case>")
+  python scripts/benchmark.py --quick --write-db
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from app.deid.engine import DeidEngine, POLICY_MAP  # noqa: E402
+from app.deid.recognizers import (  # noqa: E402
+    SPACY_LABELS,
+    _dedupe,
+    _filter_mrn_overdetections,
+    _regex_entities,
+    detect_entities,
+)
+
+
+_FILLER = {
+    "en": [
+        "The patient reported mild pain and was discharged in good condition. ",
+        "Vitals were stable throughout the observation period. ",
+        "Follow-up imaging showed no new findings. ",
+    ],
+    "el": [
+        "Ο ασθενής παρουσίασε πυρετό και βήχα για τρεις ημέρες. ",
+        "Συνεστήθη ανάπαυση και επανέλεγχος σε δύο εβδομάδες. ",
+        "Η απεικόνιση δεν έδειξε νέα ευρήματα. ",
+    ],
+}
+_PHI = {
+    "en": [
+        "Contact john.doe@example.com. ",
+        "Phone +30 694 123 4567. ",
+        "MRN: ZXCV-778899. ",
+        "See https://hospital.example.org/c/7788 from 192.168.1.100. ",
+        "Patient John Papadopoulos. ",
+    ],
+    "el": [
+        "ΑΜΚΑ 12039912345. ",
+        "τηλ 210 123 4567. ",
+        "Οδός Σοφοκλέους 10, ΤΚ 10559, Αθήνα. ",
+        "email giannis@example.gr. ",
+        "Αριθμός φακέλου ABCD_778899. ",
+    ],
+}
+
+FULL_SIZES = (100, 1_000, 10_000, 100_000, 500_000)
+QUICK_SIZES = (100, 1_000, 10_000)
+FULL_DENSITIES = (0.0, 1.0, 5.0, 20.0)  # PHI snippets per 1k chars
+QUICK_DENSITIES = (0.0, 5.0)
+LANGS = ("en", "el", "mixed")
+DEFAULT_DENSITY = 5.0
+
+
+def make_text(size: int, density: float, lang: str, seed: int = 1337) -> str:
+    """Deterministic note of ~``size`` chars with ~``density`` PHI snippets per 1k chars."""
+    rng = random.Random(f"{seed}:{size}:{density}:{lang}")
+    langs = ("en", "el") if lang == "mixed" else (lang,)
+    parts: List[str] = []
+    n = 0
+    while n < size:
+        lg = rng.choice(langs)
+        chunk = rng.choice(_FILLER[lg])
+        if density > 0 and rng.random() < density * len(chunk) / 1000:
+            chunk += rng.choice(_PHI[lg])
+        parts.append(chunk)
+        n += len(chunk)
+    return "".join(parts)[:size]
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    times: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def _cases(quick: bool) -> Iterable[Tuple[str, int, float, str]]:
+    sizes = QUICK_SIZES if quick else FULL_SIZES
+    densities = QUICK_DENSITIES if quick else FULL_DENSITIES
+    seen = set()
+    for lang in LANGS:
+        for size in sizes:
+            seen.add((lang, size, DEFAULT_DENSITY))
+            yield lang, size, DEFAULT_DENSITY, "size"
+    mid = sizes[len(sizes) // 2]
+    for density in densities:
+        if ("mixed", mid, density) not in seen:
+            yield "mixed", mid, density, "density"
+
+
+def run_suite(quick: bool = False, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    engine = DeidEngine(policy_map={**POLICY_MAP}, salt="bench", default_policy="mask")
+    regex_only = sorted(SPACY_LABELS)
+    results: Dict[str, Dict[str, float]] = {}
+    for lang, size, density, _kind in _cases(quick):
+        text = make_text(size, density, lang)
+        lang_hint = None if lang == "mixed" else lang
+        # Repeats shrink for the biggest documents to keep the full run reasonable
+        reps = repeat if size <= 100_000 else max(1, repeat // 2)
+        rx = _regex_entities(text)
+        combined = _filter_mrn_overdetections(text, rx)
+        stages: Dict[str, Callable[[], object]] = {
+            "regex_entities": lambda: _regex_entities(text),
+            "filter_mrn": lambda: _filter_mrn_overdetections(text, rx),
+            "dedupe": lambda: _dedupe(combined),
+            "detect_regex_only": lambda: detect_entities(text, lang_hint, exclude_labels=regex_only),
+            "detect_full": lambda: detect_entities(text, lang_hint),
+            "deidentify": lambda: engine.deidentify(text, lang_hint=lang_hint),
+        }
+        for stage, fn in stages.items():
+            key = f"{stage}/{lang}/{size}/d{density:g}"
+            m = _measure(fn, reps)
+            m["chars"] = len(text)
+            results[key] = m
+    return results
+
+
+def compare(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    min_delta_ms: float = 0.05,
+) -> List[Dict]:
+    """
+    Cases whose median time grew by more than ``threshold`` (fraction) over the
+    baseline. Deltas under ``min_delta_ms`` are ignored as timer noise.
+    """
+    regressions: List[Dict] = []
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        b, c = base["median_ms"], cur["median_ms"]
+        if c - b > min_delta_ms and c > b * (1 + threshold):
+            regressions.append({"case": key, "baseline_ms": b, "current_ms": c, "ratio": c / b if b else float("inf")})
+    return sorted(regressions, key=lambda r: r["ratio"], reverse=True)
+
+
+def _write_db(results: Dict[str, Dict[str, float]]) -> None:
+    from app.db.crud import create_metric_run
+    from app.db.session import session_scope
+
+    with session_scope() as db:
+        for key, m in results.items():
+            create_metric_run(
+                db,
+                dataset_name=f"benchmark:{key}",
+                precision={},
+                recall={},
+                f1={},
+                docs_per_sec=(1000.0 / m["median_ms"]) if m["median_ms"] > 0 else None,
+            )
+    print(f"Saved {len(results)} MetricRun rows")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="De-identification micro-benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="Small matrix (sizes up to 10k)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=str, default=None, help="Write results as a JSON baseline")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown (0.25 = +25%%)")
+    parser.add_argument("--write-db", action="store_true", help="Store one MetricRun per case")
+    args = parser.parse_args(argv)
+
+    results = run_suite(quick=args.quick, repeat=args.repeat)
+
+    header = f"{'CASE':44} {'MEDIAN ms':>10} {'MIN ms':>9} {'PEAK KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for key, m in results.items():
+        print(f"{key:44} {m['median_ms']:10.3f} {m['min_ms']:9.3f} {m['peak_kb']:10.1f}")
+
+    if args.out:
+        payload = {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "quick": args.quick,
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"\nWrote baseline to {args.out}")
+
+    if args.write_db:
+        _write_db(results)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")).get("results", {})
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed more than {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['case']:44} {r['baseline_ms']:.3f} -> {r['current_ms']:.3f} ms ({r['ratio']:.2f}x)")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Calibrate the /deid cost estimator (app/deid/cost.py) on this machine.
+
+Synthetic notes of several sizes (EN, EL and mixed, each with and without a
+language hint) go through the engine with per-stage timings in every result
+mode; the per-stage linear fits are written to COST_MODEL_PATH, where the
+API loads them at startup. Run it where the API runs, with the same spaCy
+models installed: NER dominates large documents.
+
+Usage:
+  python scripts/calibrate_cost.py                        # writes COST_MODEL_PATH
+  python scripts/calibrate_cost.py --sizes 1000,20000,100000 --repeat 2 --out /tmp/cost.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from app.core.config import get_settings  # noqa: E402
+from app.deid.cost import CostModel, record_samples  # noqa: E402
+from app.deid.engine import POLICY_MAP, RESULT_MODES, DeidEngine  # noqa: E402
+from scripts.benchmark import make_text  # noqa: E402
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fit the /deid cost model from per-stage timings")
+    parser.add_argument("--sizes", type=str, default="1000,10000,50000,150000", help="Note sizes in chars")
+    parser.add_argument("--repeat", type=int, default=3, help="Samples per size, language and mode")
+    parser.add_argument("--out", type=str, default=None, help="Model path (default COST_MODEL_PATH)")
+    args = parser.parse_args(argv)
+
+    settings = get_settings()
+    engine = DeidEngine(policy_map={**POLICY_MAP}, salt="calibrate", default_policy=settings.deid_default_policy)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    texts, hints = [], []
+    for size in sizes:
+        for lang in ("en", "el", "mixed"):
+            for i in range(args.repeat):
+                text = make_text(size, 5.0, lang, seed=1000 + i)
+                # With a hint NER runs for one language, without it for both
+                texts += [text, text]
+                hints += [None if lang == "mixed" else lang, None]
+    engine.deidentify(texts[0], timings=True)  # warm-up: model loading is not a per-request cost
+    samples = record_samples(engine, texts, hints, modes=RESULT_MODES)
+    model = CostModel.fit(samples)
+
+    out = args.out or settings.cost_model_path
+    model.save(out)
+    print(f"{'STAGE':24} {'FIXED_MS':>10} {'US_PER_KCHAR':>13} {'SAMPLES':>8}")
+    for name, fit in sorted(model.stages.items()):
+        print(f"{name:24} {fit.fixed_sec * 1000:10.3f} {fit.per_char_sec * 1e9:13.1f} {fit.samples:8d}")
+    for size in sizes:
+        print(f"estimate {size:>7} chars, no hint: {model.estimate(size):.3f}s")
+    print(f"Wrote cost model to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,25 +13,53 @@ Outputs:
   - Prints a tabular per-label report with TP/FP/FN, P/R/F1, and FNR
   - Writes a JSON summary with per-label, micro, and macro metrics
   - Optionally writes results to DB (MetricRun)
+
+With --workers N the file is streamed in chunks to N processes (spaCy models
+preloaded in each); counts are merged and match the sequential run exactly.
+Several values (--workers 1 2 4) run each in turn and report scaling; they
+cannot be combined with --cache, whose hits would make every run after the
+first time cache lookups rather than detection.
+
+With --cache PATH raw predictions are stored per detector and document, keyed
+by a hash of the text and a fingerprint of the detector (pattern source, model
+name/version). Later runs only re-run detectors whose fingerprint changed and
+re-merge everything through the same MRN filter and dedupe.
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import sqlite3
 import sys
 import time
-from collections import defaultdict
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Set, Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 # Ensure project root on path
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from app.deid.recognizers import detect_entities  # noqa: E402
+from app.core import profiling  # noqa: E402
+from app.deid import recognizers  # noqa: E402
+from app.deid.evaluation import Counts, label_metrics, metric_run_fields  # noqa: E402
+from app.deid.recognizers import (  # noqa: E402
+    PATTERNS,
+    Entity,
+    _GREEK_ADDR_RE,
+    _cost_order,
+    _get_nlp,
+    _merge_detections,
+    _ner_entities,
+    _regex_entities,
+    _spacy_langs,
+    detector_plan,
+)
 from app.db.session import session_scope  # noqa: E402
 from app.db.crud import create_metric_run  # noqa: E402
 
@@ -56,100 +84,250 @@ def load_jsonl(path: Path) -> Iterable[dict]:
                 continue
 
 
-def f1_score(p: float, r: float) -> float:
-    return 0.0 if (p + r) == 0 else (2 * p * r) / (p + r)
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def detector_fingerprints() -> Dict[str, str]:
+    """
+    Fingerprint per detector of the default plan. Regex labels hash their pattern
+    source and flags; ``ner:<lang>`` hashes the model name/version, the spaCy
+    version and the pipes/labels it keeps (or "unavailable" when not installed).
+    """
+    plan = detector_plan()
+    patterns = {name: pattern for name, pattern, _prio in PATTERNS}
+    patterns["ADDRESS_GR"] = _GREEK_ADDR_RE
+    fps: Dict[str, str] = {}
+    for label in plan.regex:
+        pattern = patterns[label]
+        fps[label] = _digest(f"{pattern.pattern}\x00{pattern.flags}")
+    if plan.run_ner:
+        for lang in _spacy_langs(None):
+            nlp = _get_nlp(lang)
+            if nlp is None:
+                ident = "unavailable"
+            else:
+                meta = nlp.meta
+                ident = f"{meta.get('lang')}_{meta.get('name')}=={meta.get('version')};spacy=={recognizers.spacy.__version__}"
+            fps[f"ner:{lang}"] = _digest(f"{ident}\x00{plan.spacy_pipes}\x00{sorted(plan.ner_labels)}")
+    return fps
+
+
+class PredictionCache:
+    """
+    Raw per-detector predictions on disk (SQLite), keyed by document hash and
+    detector. A row is only used while its stored fingerprint matches the
+    detector's current one; recomputed output replaces it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # WAL lets pool workers read while others write; the timeout covers write locks
+        self.conn = sqlite3.connect(str(self.path), timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " doc TEXT NOT NULL, detector TEXT NOT NULL, fingerprint TEXT NOT NULL, spans TEXT NOT NULL,"
+            " PRIMARY KEY (doc, detector))"
+        )
+        self.conn.commit()
+
+    def get(self, doc: str, fingerprints: Dict[str, str]) -> Dict[str, List[List]]:
+        rows = self.conn.execute("SELECT detector, fingerprint, spans FROM predictions WHERE doc = ?", (doc,))
+        return {det: json.loads(spans) for det, fp, spans in rows if fingerprints.get(det) == fp}
+
+    def put_many(self, rows: List[Tuple[str, str, str, str]]) -> None:
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)", rows)
+
+
+class _Scorer:
+    """Scores chunks of raw lines, going through the prediction cache when one is configured."""
+
+    def __init__(self, cache_path: Optional[Path] = None) -> None:
+        # Load the spaCy models once per process instead of on the first document
+        _get_nlp("en")
+        _get_nlp("el")
+        self.cache = PredictionCache(cache_path) if cache_path else None
+        self.plan = detector_plan()
+        self.fingerprints = detector_fingerprints() if self.cache else {}
+
+    def _run(self, name: str, text: str) -> List[Entity]:
+        if name.startswith("ner:"):
+            nlp = _get_nlp(name[4:])
+            return _ner_entities(nlp, text, self.plan) if nlp is not None else []
+        return _regex_entities(text, [name])
+
+    def _detect_cached(self, counts: Counts, pending: List[Tuple[str, str, str, str]]):
+        def detect(text: str, lang: Optional[str]) -> List[Entity]:
+            doc = _digest(text)
+            # Same detector order as detect_entities_report, so the merge is identical
+            names = _cost_order(self.plan.regex)
+            ner_names = [f"ner:{lg}" for lg in _spacy_langs(lang)] if self.plan.run_ner else []
+            cached = self.cache.get(doc, self.fingerprints)
+            raw: Dict[str, List[Entity]] = {}
+            for name in ner_names + names:
+                if name in cached:
+                    kind = "spacy" if name.startswith("ner:") else "regex"
+                    raw[name] = [Entity(s, e, text[s:e], lab, kind) for s, e, lab in cached[name]]
+                    counts.cache_hits += 1
+                    continue
+                raw[name] = self._run(name, text)
+                counts.recomputed[name] += 1
+                spans = json.dumps([[e.start, e.end, e.label] for e in raw[name]])
+                pending.append((doc, name, self.fingerprints[name], spans))
+            ner = [e for name in ner_names for e in raw[name]]
+            rx = [e for name in names for e in raw[name]]
+            return _merge_detections(text, ner, rx, self.plan)
+
+        return detect
+
+    def score(self, chunk: List[Tuple[int, str]]) -> Counts:
+        counts = Counts()
+        pending: List[Tuple[str, str, str, str]] = []
+        detect = self._detect_cached(counts, pending) if self.cache else None
+        for i, line in chunk:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping invalid JSON at line {i}")
+                continue
+            counts.add_doc(rec, detect)
+        if self.cache:
+            self.cache.put_many(pending)
+        return counts
+
 
+def _read_chunks(path: Path, chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """Stream (line number, raw line) chunks; parsing happens where the chunk is scored."""
+    chunk: List[Tuple[int, str]] = []
+    with path.open("r", encoding="utf-8") as f:
+        for i, line in enumerate(f, start=1):
+            chunk.append((i, line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
 
-def evaluate(dataset_path: Path, out_path: Optional[Path] = None, write_db: bool = False):
-    tps: Dict[str, int] = defaultdict(int)
-    fps: Dict[str, int] = defaultdict(int)
-    fns: Dict[str, int] = defaultdict(int)
 
-    labels_present: Set[str] = set()
+_worker_scorer: Optional[_Scorer] = None
 
-    n_docs = 0
-    t0 = time.perf_counter()
-    for rec in load_jsonl(dataset_path):
-        text = rec.get("text", "") or ""
-        lang = rec.get("lang") or None
-        gold_list = rec.get("labels", []) or []
-        gold: Set[Tuple[int, int, str]] = set()
-        for item in gold_list:
-            try:
-                s = int(item["start"])  # type: ignore[index]
-                e = int(item["end"])  # type: ignore[index]
-                lab = str(item["label"])  # type: ignore[index]
-            except Exception:
-                continue
-            gold.add((s, e, lab))
-            labels_present.add(lab)
 
-        preds_ents = detect_entities(text, lang_hint=lang)
-        preds: Set[Tuple[int, int, str]] = {
-            (e.start, e.end, e.label) for e in preds_ents
-        }
-        for (_, _, lab) in preds:
-            labels_present.add(lab)
+def _init_worker(cache_path: Optional[Path]) -> None:
+    global _worker_scorer
+    _worker_scorer = _Scorer(cache_path)
 
-        # Count
-        matched = gold.intersection(preds)
-        for (_, _, lab) in matched:
-            tps[lab] += 1
 
-        for (_, _, lab) in preds.difference(matched):
-            fps[lab] += 1
+def _score_chunk(chunk: List[Tuple[int, str]]) -> Counts:
+    return _worker_scorer.score(chunk)  # type: ignore[union-attr]
 
-        for (_, _, lab) in gold.difference(matched):
-            fns[lab] += 1
 
-        n_docs += 1
+def count_dataset(
+    dataset_path: Path,
+    workers: int = 1,
+    chunk_size: int = 256,
+    cache_path: Optional[Path] = None,
+) -> Tuple[Counts, float]:
+    """
+    Score every document; returns the merged counts and the elapsed seconds.
 
-    elapsed = time.perf_counter() - t0
+    With ``workers > 1`` the file is streamed in chunks to a process pool (at
+    most two chunks in flight per worker) and the per-chunk counts are merged,
+    which gives exactly the sequential result. With ``cache_path`` only
+    detectors whose fingerprint changed are re-run; cached raw output goes
+    through the same MRN filter and dedupe as live detection.
+    """
+    total = Counts()
+    t0 = time.perf_counter()
+    if workers <= 1:
+        scorer = _Scorer(cache_path)
+        for chunk in _read_chunks(dataset_path, chunk_size):
+            total.merge(scorer.score(chunk))
+        return total, time.perf_counter() - t0
+
+    if cache_path:
+        PredictionCache(cache_path)  # create the schema before workers race for it
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_path,)) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in _read_chunks(dataset_path, chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                total.merge(pending.popleft().result())
+        while pending:
+            total.merge(pending.popleft().result())
+    return total, time.perf_counter() - t0
+
+
+def evaluate(
+    dataset_path: Path,
+    out_path: Optional[Path] = None,
+    write_db: bool = False,
+    workers: Union[int, Sequence[int]] = 1,
+    chunk_size: int = 256,
+    cache_path: Optional[Path] = None,
+):
+    worker_counts = [workers] if isinstance(workers, int) else list(workers)
+    if cache_path and len(worker_counts) > 1:
+        # Every run after the first would be all cache hits: the scaling would time SQLite lookups
+        raise ValueError("A prediction cache cannot be combined with several worker counts")
+    runs: List[Tuple[int, Counts, float]] = []
+    for n in worker_counts:
+        counts, run_elapsed = count_dataset(dataset_path, workers=n, chunk_size=chunk_size, cache_path=cache_path)
+        if runs and counts.key() != runs[0][1].key():
+            raise RuntimeError(f"Counts with {n} workers differ from the {runs[0][0]}-worker run")
+        runs.append((n, counts, run_elapsed))
+
+    # Metrics come from the last (usually the widest) run; all runs count identically
+    n_workers, counts, elapsed = runs[-1]
+    tps, fps, fns = counts.tps, counts.fps, counts.fns
+    labels_present = counts.labels_present
+    n_docs = counts.n_docs
     docs_per_sec = (n_docs / elapsed) if elapsed > 0 else 0.0
 
-    # Per-label metrics
-    per_label: Dict[str, Dict[str, float]] = {}
-    all_labels = sorted(labels_present)
-    for lab in all_labels:
-        tp, fp, fn = tps.get(lab, 0), fps.get(lab, 0), fns.get(lab, 0)
-        p = (tp / (tp + fp)) if (tp + fp) > 0 else 0.0
-        r = (tp / (tp + fn)) if (tp + fn) > 0 else 0.0
-        f1 = f1_score(p, r)
-        fnr = (fn / (tp + fn)) if (tp + fn) > 0 else 0.0
-        per_label[lab] = {
-            "precision": p,
-            "recall": r,
-            "f1": f1,
-            "false_negative_rate": fnr,
-            "tp": tp,
-            "fp": fp,
-            "fn": fn,
-        }
-
-    # Micro
-    tp_sum = sum(tps.values())
-    fp_sum = sum(fps.values())
-    fn_sum = sum(fns.values())
-    p_micro = (tp_sum / (tp_sum + fp_sum)) if (tp_sum + fp_sum) > 0 else 0.0
-    r_micro = (tp_sum / (tp_sum + fn_sum)) if (tp_sum + fn_sum) > 0 else 0.0
-    f1_micro = f1_score(p_micro, r_micro)
-    fnr_overall = (fn_sum / (tp_sum + fn_sum)) if (tp_sum + fn_sum) > 0 else 0.0
-
-    # Macro over labels with support in gold (tp+fn > 0)
-    labels_with_support = [lab for lab in all_labels if (tps.get(lab, 0) + fns.get(lab, 0)) > 0]
-    if labels_with_support:
-        p_macro = sum(per_label[lab]["precision"] for lab in labels_with_support) / len(labels_with_support)
-        r_macro = sum(per_label[lab]["recall"] for lab in labels_with_support) / len(labels_with_support)
-        f1_macro = sum(per_label[lab]["f1"] for lab in labels_with_support) / len(labels_with_support)
-    else:
-        p_macro = r_macro = f1_macro = 0.0
+    base_rate = (runs[0][1].n_docs / runs[0][2]) if runs[0][2] > 0 else 0.0
+    scaling = []
+    for n, c, secs in runs:
+        rate = (c.n_docs / secs) if secs > 0 else 0.0
+        speedup = (rate / base_rate) if base_rate > 0 else 0.0
+        scaling.append({
+            "workers": n,
+            "elapsed_sec": secs,
+            "docs_per_sec": rate,
+            "speedup": speedup,
+            # Relative to the first run's worker count
+            "efficiency": speedup * max(runs[0][0], 1) / max(n, 1),
+        })
+
+    metrics = label_metrics(counts)
+    per_label = metrics["per_label"]
+    all_labels = sorted(per_label)
+    tp_sum, fp_sum, fn_sum = (metrics["totals"][k] for k in ("tp", "fp", "fn"))
+    p_micro, r_micro, f1_micro = (metrics["micro"][k] for k in ("precision", "recall", "f1"))
+    p_macro, r_macro, f1_macro = (metrics["macro"][k] for k in ("precision", "recall", "f1"))
+    fnr_overall = metrics["false_negative_rate"]["overall"]
 
     # Print table
     def fmt(x: float) -> str:
         return f"{x:.3f}"
 
     print("")
-    print(f"Evaluated {n_docs} docs in {elapsed:.2f}s | {docs_per_sec:.1f} docs/sec")
+    print(f"Evaluated {n_docs} docs in {elapsed:.2f}s | {docs_per_sec:.1f} docs/sec | workers={n_workers}")
+    if cache_path:
+        recomputed = ", ".join(f"{k}={v}" for k, v in sorted(counts.recomputed.items())) or "none"
+        print(f"Prediction cache {cache_path}: {counts.cache_hits} hits | recomputed: {recomputed}")
+    if len(scaling) > 1:
+        for row in scaling:
+            print(
+                f"  workers={row['workers']:<3d} {row['docs_per_sec']:8.1f} docs/sec  "
+                f"speedup {row['speedup']:.2f}x  efficiency {row['efficiency']:.2f}"
+            )
     print("")
     header = f"{'LABEL':20} TP    FP    FN    P      R      F1     FNR"
     print(header)
@@ -176,10 +354,17 @@ def evaluate(dataset_path: Path, out_path: Optional[Path] = None, write_db: bool
         "docs": n_docs,
         "elapsed_sec": elapsed,
         "docs_per_sec": docs_per_sec,
+        "workers": n_workers,
+        "scaling": scaling,
+        **({"cache": {
+            "path": str(cache_path),
+            "hits": counts.cache_hits,
+            "recomputed": dict(sorted(counts.recomputed.items())),
+        }} if cache_path else {}),
         "per_label": per_label,
-        "micro": {"precision": p_micro, "recall": r_micro, "f1": f1_micro},
-        "macro": {"precision": p_macro, "recall": r_macro, "f1": f1_macro},
-        "false_negative_rate": {**{k: v["false_negative_rate"] for k, v in per_label.items()}, "overall": fnr_overall},
+        "micro": metrics["micro"],
+        "macro": metrics["macro"],
+        "false_negative_rate": metrics["false_negative_rate"],
     }
 
     if out_path is None:
@@ -190,19 +375,12 @@ def evaluate(dataset_path: Path, out_path: Optional[Path] = None, write_db: bool
 
     # Optionally write to DB
     if write_db:
-        precision_j = {**{k: v["precision"] for k, v in per_label.items()}, "micro": p_micro, "macro": p_macro}
-        recall_j = {**{k: v["recall"] for k, v in per_label.items()}, "micro": r_micro, "macro": r_macro}
-        f1_j = {**{k: v["f1"] for k, v in per_label.items()}, "micro": f1_micro, "macro": f1_macro}
-        fnr_j = {**{k: v["false_negative_rate"] for k, v in per_label.items()}, "overall": fnr_overall}
         with session_scope() as db:
             run = create_metric_run(
                 db,
                 dataset_name=str(dataset_path),
-                precision=precision_j,
-                recall=recall_j,
-                f1=f1_j,
                 docs_per_sec=docs_per_sec,
-                false_negative_rate=fnr_j,
+                **metric_run_fields(metrics),
             )
             print(f"Saved MetricRun id={run.id}")
 
@@ -212,11 +390,50 @@ def main():
     parser.add_argument("--dataset", type=str, default=str(Path(__file__).resolve().parent / "dataset.jsonl"))
     parser.add_argument("--out", type=str, default=None, help="Path to write JSON summary")
     parser.add_argument("--write-db", action="store_true", help="Store metrics to DB")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="Process pool size; several values (e.g. 1 2 4) run each and report scaling",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="SQLite file caching raw predictions per detector and document (e.g. scripts/.eval_cache.sqlite)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=256, help="Documents per chunk sent to a worker")
+    parser.add_argument(
+        "--profile", action="store_true", help="Profile the run; artifacts go to PROFILE_DIR"
+    )
     args = parser.parse_args()
+    if args.cache and len(args.workers) > 1:
+        parser.error("--cache cannot be combined with several --workers values (the scaling runs would be cache hits)")
 
     dataset_path = Path(args.dataset)
     out_path = Path(args.out) if args.out else None
-    evaluate(dataset_path, out_path=out_path, write_db=args.write_db)
+    cache_path = Path(args.cache) if args.cache else None
+    if not args.profile:
+        evaluate(
+            dataset_path,
+            out_path=out_path,
+            write_db=args.write_db,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            cache_path=cache_path,
+        )
+        return
+    with profiling.profile("scripts.evaluate", {"dataset": str(dataset_path)}) as prof:
+        evaluate(
+            dataset_path,
+            out_path=out_path,
+            write_db=args.write_db,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            cache_path=cache_path,
+        )
+    print(f"Profile {prof.id}: {prof.collapsed_path} (collapsed stacks), {prof.summary_path}")
 
 
 if __name__ == "__main__":
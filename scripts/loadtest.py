@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Load generator for the API: capacity model per code change.
+
+By default ``app.main:app`` is driven in-process through httpx's ASGI transport,
+so no server, database, broker or network is needed: Celery task submission is
+replaced by a stub that only hands out task ids, and the DB session dependency
+yields None (DB-backed endpoints are not part of the mix). ``--url`` targets a
+running server instead (e.g. a local ``uvicorn app.main:app``).
+
+A weighted mix of requests (single-note /deid, larger /deid, multi-file
+/deid/file batches, /jobs/deid submissions) is replayed at each concurrency
+level. Per level the report has throughput, p50/p95/p99 latency, the error and
+429 rates, and event-loop lag (in-process the API shares the loop with the
+generator, so lag is the time the handlers block it).
+
+Rate limits are per client IP. In-process each request is given a source
+address from a pool of ``--clients`` addresses (0 = a fresh one per request,
+so limits never trigger and raw capacity is measured).
+
+Usage:
+  python scripts/loadtest.py --concurrency 1 4 16 --requests 200
+  python scripts/loadtest.py --clients 4 --mix deid=1      # exercise 429s
+  python scripts/loadtest.py --url http://127.0.0.1:8000 --out scripts/load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from scripts.benchmark import make_text  # noqa: E402
+
+
+DEFAULT_MIX = {"deid": 6, "deid_large": 1, "deid_file": 2, "jobs": 1}
+_CLIENT_HEADER = "x-loadtest-client"
+
+
+def _build_requests(seed: int = 1337) -> Dict[str, Callable[[random.Random], Dict]]:
+    """Request factories per mix entry; each returns kwargs for ``httpx.AsyncClient.request``."""
+    small = [make_text(size, 5.0, lang, seed=seed + i) for i, (size, lang) in enumerate(
+        [(300, "en"), (600, "el"), (1_000, "mixed"), (2_000, "mixed")]
+    )]
+    large = [make_text(50_000, 5.0, "mixed", seed=seed)]
+
+    def deid(rng: random.Random) -> Dict:
+        return {"method": "POST", "url": "/api/v1/deid", "json": {"text": rng.choice(small)}}
+
+    def deid_large(rng: random.Random) -> Dict:
+        return {"method": "POST", "url": "/api/v1/deid", "json": {"text": large[0], "mode": "counts"}}
+
+    def deid_file(rng: random.Random) -> Dict:
+        n = rng.randint(2, 5)
+        files = [("files", (f"note{i}.txt", rng.choice(small).encode("utf-8"), "text/plain")) for i in range(n)]
+        return {"method": "POST", "url": "/api/v1/deid/file", "files": files, "data": {"mode": "spans"}}
+
+    def jobs(rng: random.Random) -> Dict:
+        return {"method": "POST", "url": "/api/v1/jobs/deid", "json": {"text": rng.choice(small)}}
+
+    return {"deid": deid, "deid_large": deid_large, "deid_file": deid_file, "jobs": jobs}
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix: Dict[str, int] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+class _StubTask:
+    """Stands in for a Celery task: accepts the call, hands back a task id."""
+
+    class _Result:
+        def __init__(self) -> None:
+            self.id = str(uuid.uuid4())
+
+    def delay(self, *args, **kwargs) -> "_StubTask._Result":
+        return self._Result()
+
+    def apply_async(self, *args, **kwargs) -> "_StubTask._Result":
+        return self._Result()
+
+
+async def _stub_wait_for_job(task_id: str, timeout: float) -> str:
+    # Stub tasks never run: offloaded /deid requests get their 202 without waiting
+    return "PENDING"
+
+
+async def _stub_job_results(task_ids: List[str]) -> Dict[str, Dict]:
+    return {t: {"task_id": t, "status": "PENDING"} for t in task_ids}
+
+
+def _with_client_address(app):
+    """ASGI wrapper setting scope["client"] from a header, so one transport can emulate many IPs."""
+    header = _CLIENT_HEADER.encode()
+
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            for k, v in scope.get("headers", []):
+                if k == header:
+                    scope = dict(scope, client=(v.decode(), 0))
+                    break
+        await app(scope, receive, send)
+
+    return wrapped
+
+
+@contextmanager
+def stubbed_app() -> Iterator[object]:
+    """``app.main:app`` with Celery submission, the result backend and the DB session stubbed out."""
+    from app.api import v1
+    from app.db.session import get_async_db
+    from app.main import app
+
+    async def _no_db():
+        yield None
+
+    # /deid offloads large or costly requests (apply_async + long-poll) and /jobs submits
+    stubs = {
+        "deid_text_task": _StubTask(),
+        "deid_batch_task": _StubTask(),
+        "wait_for_job": _stub_wait_for_job,
+        "job_results": _stub_job_results,
+    }
+    saved = {name: getattr(v1, name) for name in stubs}
+    for name, stub in stubs.items():
+        setattr(v1, name, stub)
+    app.dependency_overrides[get_async_db] = _no_db
+    try:
+        yield app
+    finally:
+        for name, value in saved.items():
+            setattr(v1, name, value)
+        app.dependency_overrides.pop(get_async_db, None)
+
+
+async def _loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - t0 - interval))
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    n_requests: int,
+    mix: Dict[str, int],
+    factories: Dict[str, Callable[[random.Random], Dict]],
+    clients: int = 0,
+    seed: int = 1337,
+) -> Dict:
+    rng = random.Random(f"{seed}:{concurrency}")
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[n] for n in names], k=n_requests)
+    # Build payloads up front so request construction isn't timed
+    prepared: List[Tuple[str, Dict]] = [(name, factories[name](rng)) for name in plan]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    per_kind: Dict[str, List[float]] = {n: [] for n in names}
+    errors = 0
+    next_idx = 0
+    lag: List[float] = []
+    stop = asyncio.Event()
+
+    async def worker() -> None:
+        nonlocal next_idx, errors
+        while next_idx < len(prepared):
+            i = next_idx
+            next_idx += 1
+            kind, kwargs = prepared[i]
+            ip = f"10.{(i // 65536) % 256}.{(i // 256) % 256}.{i % 256}" if clients <= 0 else f"10.1.0.{i % clients}"
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(headers={_CLIENT_HEADER: ip}, **kwargs)
+                key = str(r.status_code)
+            except httpx.HTTPError:
+                key = "exception"
+            elapsed = time.perf_counter() - t0
+            latencies.append(elapsed)
+            per_kind[kind].append(elapsed)
+            statuses[key] = statuses.get(key, 0) + 1
+            if key == "exception" or (key != "429" and int(key) >= 400):
+                errors += 1
+
+    monitor = asyncio.create_task(_loop_lag(lag, stop))
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t_start
+    stop.set()
+    await monitor
+
+    ms = [x * 1000 for x in latencies]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed_sec": elapsed,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": _pct(ms, 0.50),
+        "p95_ms": _pct(ms, 0.95),
+        "p99_ms": _pct(ms, 0.99),
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "rate_429": statuses.get("429", 0) / len(latencies) if latencies else 0.0,
+        "statuses": statuses,
+        "loop_lag_p99_ms": _pct(lag, 0.99) * 1000,
+        "loop_lag_max_ms": max(lag, default=0.0) * 1000,
+        "per_kind_p50_ms": {k: statistics.median(v) * 1000 for k, v in per_kind.items() if v},
+    }
+
+
+async def run_load(
+    concurrency_levels: List[int],
+    n_requests: int,
+    mix: Optional[Dict[str, int]] = None,
+    url: Optional[str] = None,
+    clients: int = 0,
+    api_key: Optional[str] = None,
+) -> List[Dict]:
+    mix = mix or dict(DEFAULT_MIX)
+    factories = _build_requests()
+    unknown = set(mix) - set(factories)
+    if unknown:
+        raise ValueError(f"Unknown mix entries: {sorted(unknown)} (known: {sorted(factories)})")
+    headers = {"X-API-Key": api_key} if api_key else {}
+    levels: List[Dict] = []
+    if url:
+        async with httpx.AsyncClient(base_url=url, headers=headers, timeout=120) as client:
+            for c in concurrency_levels:
+                levels.append(await run_level(client, c, n_requests, mix, factories, clients))
+        return levels
+    with stubbed_app() as app:
+        transport = httpx.ASGITransport(app=_with_client_address(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", headers=headers, timeout=120) as client:
+            for c in concurrency_levels:
+                levels.append(await run_level(client, c, n_requests, mix, factories, clients))
+    return levels
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a request mix against the API at increasing concurrency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=None, help="e.g. deid=6,deid_large=1,deid_file=2,jobs=1")
+    parser.add_argument("--clients", type=int, default=0, help="Distinct source IPs (0 = one per request)")
+    parser.add_argument("--url", type=str, default=None, help="Target a running server instead of in-process")
+    parser.add_argument("--api-key", type=str, default=None)
+    parser.add_argument("--out", type=str, default=None, help="Optional path to write a JSON report")
+    args = parser.parse_args(argv)
+    # One INFO line per request from httpx would dominate the run
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    levels = asyncio.run(
+        run_load(args.concurrency, args.requests, args.mix, args.url, args.clients, args.api_key)
+    )
+
+    header = (
+        f"{'CONC':>5} {'RPS':>8} {'P50 ms':>9} {'P95 ms':>9} {'P99 ms':>9} "
+        f"{'ERR %':>6} {'429 %':>6} {'LAG P99':>8} {'LAG MAX':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for lv in levels:
+        print(
+            f"{lv['concurrency']:5d} {lv['rps']:8.1f} {lv['p50_ms']:9.1f} {lv['p95_ms']:9.1f} {lv['p99_ms']:9.1f} "
+            f"{lv['error_rate'] * 100:6.1f} {lv['rate_429'] * 100:6.1f} {lv['loop_lag_p99_ms']:8.1f} {lv['loop_lag_max_ms']:8.1f}"
+        )
+
+    if args.out:
+        report = {"target": args.url or "in-process", "mix": args.mix or DEFAULT_MIX, "levels": levels}
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote report to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Worst-case performance audit for the detector regexes (ReDoS guard).
+
+For every entry in PATTERNS (plus the Greek address heuristic) the audit
+generates adversarial inputs aimed at the pattern's backtracking-prone shape,
+times the pattern at growing input sizes and reports ms per KB and the growth
+ratio between sizes. A linear pattern grows by ~the size factor; a quadratic one
+by its square.
+
+Rewritten patterns can be audited side by side with the shipped ones
+(``CANDIDATES``) and are checked for identical matches on the golden texts and
+the adversarial corpus before being adopted in app/deid/regex_rules.py.
+
+Usage:
+  python scripts/regex_audit.py
+  python scripts/regex_audit.py --sizes 8000 32000 --candidates --out scripts/regex_audit.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from app.deid.regex_rules import PATTERNS  # noqa: E402
+from app.deid.recognizers import _GREEK_ADDR_RE  # noqa: E402
+
+
+Generator = Callable[[int], str]
+
+
+def _repeat(unit: str, n: int) -> str:
+    return (unit * (n // len(unit) + 1))[:n]
+
+
+# Adversarial input families per label; each builds a string of ~n chars
+ADVERSARIAL: Dict[str, Dict[str, Generator]] = {
+    "EMAIL": {
+        "dotted_token": lambda n: _repeat("a.", n),
+        "dotted_token_at_fail": lambda n: _repeat("a.", n - 2) + "@!",
+        "long_domain_fail": lambda n: "a@" + _repeat("a.", n - 3) + "!",
+    },
+    "PHONE_GR": {
+        "digit_space_run": lambda n: _repeat("2 ", n),
+        "prefix_then_spaces": lambda n: _repeat("+30" + " " * 40 + "2", n),
+        "eight_digits": lambda n: _repeat("69 1 2 3 4 5 6 7 x ", n),
+    },
+    "PHONE_INTL": {
+        "long_digit_run": lambda n: "a+" + "1" * (n - 2),
+        "plus_runs": lambda n: _repeat("a+1234567890123456", n),
+    },
+    "AMKA": {
+        "digit_run": lambda n: "1" * n,
+    },
+    "MRN": {
+        "letter_run": lambda n: _repeat("AB", n),
+        "delim_runs": lambda n: _repeat("ABCDEF-", n),
+        "alnum_run": lambda n: _repeat("ABCD1234", n),
+    },
+    "URL": {
+        "slash_run": lambda n: "http://" + "/" * (n - 7),
+        "repeated_scheme": lambda n: _repeat("http://-", n),
+    },
+    "IP": {
+        "dotted_digits": lambda n: _repeat("1.", n),
+    },
+    "POSTAL_CODE_GR": {
+        "digit_run": lambda n: "1" * n,
+    },
+    "GENERIC_ID": {
+        "dash_tail": lambda n: "ID: a" + "-" * (n - 5),
+        "repeated_prefix": lambda n: _repeat("ID: ", n),
+    },
+    "ADDRESS_GR": {
+        "digit_run_no_boundary": lambda n: "Οδός " + "1" * (n - 6) + "a",
+        "whitespace_run": lambda n: "Οδός" + " " * (n - 5) + "x",
+        "repeated_keyword": lambda n: _repeat("Οδός " + "x" * 45, n),
+    },
+}
+
+
+# Rewritten patterns to evaluate against the shipped ones (label -> pattern).
+# Add an entry here, run with --candidates, and adopt it in regex_rules.py once
+# it is both linear and match-identical.
+CANDIDATES: Dict[str, re.Pattern] = {}
+
+
+# Pre-rewrite versions of patterns already replaced in regex_rules.py. They are
+# kept so the tests can prove the rewrites still match identically.
+LEGACY: Dict[str, re.Pattern] = {
+    "EMAIL": re.compile(
+        r"\b[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+\b"
+    ),
+    "ADDRESS_GR": re.compile(r"\b(Οδός|Λεωφόρος|Πλ\.|Οικ\.|ΤΚ)\s+[^\n,;]{0,50}?\d+\b"),
+}
+
+
+def audited_patterns() -> Dict[str, re.Pattern]:
+    patterns = {label: pattern for label, pattern, _prio in PATTERNS}
+    patterns["ADDRESS_GR"] = _GREEK_ADDR_RE
+    return patterns
+
+
+def _time_ms(pattern: re.Pattern, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        for _m in pattern.finditer(text):
+            pass
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def audit_pattern(
+    pattern: re.Pattern,
+    generators: Dict[str, Generator],
+    sizes: Iterable[int] = (8_000, 32_000),
+    repeat: int = 3,
+) -> Dict[str, Dict]:
+    """
+    Time ``pattern`` on each adversarial generator at every size. Returns per
+    generator the ms/KB at each size and ``growth``: the time ratio between the
+    largest and smallest size divided by their size ratio (~1 for linear).
+    """
+    sizes = sorted(sizes)
+    out: Dict[str, Dict] = {}
+    for name, gen in generators.items():
+        timings: List[Tuple[int, float]] = [(n, _time_ms(pattern, gen(n), repeat)) for n in sizes]
+        (n0, t0), (n1, t1) = timings[0], timings[-1]
+        # Clamp tiny timings so noise on sub-millisecond runs doesn't dominate
+        growth = (max(t1, 0.05) / max(t0, 0.05)) / (n1 / n0) if n1 > n0 else 1.0
+        out[name] = {
+            "ms_per_kb": {str(n): t / (n / 1000) for n, t in timings},
+            "growth": growth,
+        }
+    return out
+
+
+def audit_all(sizes: Iterable[int] = (8_000, 32_000), repeat: int = 3, candidates: bool = False) -> Dict[str, Dict]:
+    report: Dict[str, Dict] = {}
+    patterns = audited_patterns()
+    for label, pattern in patterns.items():
+        report[label] = audit_pattern(pattern, ADVERSARIAL.get(label, {}), sizes, repeat)
+    if candidates:
+        for label, pattern in CANDIDATES.items():
+            report[f"{label}*"] = audit_pattern(pattern, ADVERSARIAL.get(label, {}), sizes, repeat)
+    return report
+
+
+def golden_texts(include_dataset: bool = True) -> List[str]:
+    """Texts used to prove rewrites match identically: test fixtures + synthetic dataset."""
+    texts: List[str] = []
+    data_dir = ROOT / "tests" / "data"
+    for p in sorted(data_dir.glob("*.txt")):
+        texts.append(p.read_text(encoding="utf-8"))
+    paths = [data_dir / "dataset_small.jsonl"]
+    if include_dataset:
+        paths.append(ROOT / "scripts" / "dataset.jsonl")
+    for p in paths:
+        if not p.exists():
+            continue
+        with p.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    texts.append(json.loads(line).get("text", ""))
+    return texts
+
+
+def fuzz_texts(n_docs: int = 300, seed: int = 1337) -> List[str]:
+    """Random mixes of identifier fragments, delimiters and EL/EN words."""
+    rng = random.Random(seed)
+    atoms = [
+        "a", "Γ", "é", ".", "-", "_", "+", "@", " ", "\n", ",", "1", "12", "30", "69",
+        "Οδός ", "ΤΚ ", "http://", "ID: ", "MRN ", "x@y.gr", "john.doe", "example.com",
+    ]
+    return ["".join(rng.choice(atoms) for _ in range(rng.randint(5, 80))) for _ in range(n_docs)]
+
+
+def _spans(pattern: re.Pattern, text: str) -> List[Tuple[int, int]]:
+    return [m.span() for m in pattern.finditer(text)]
+
+
+def compare_patterns(
+    reference: re.Pattern, candidate: re.Pattern, texts: Iterable[str]
+) -> List[Dict]:
+    """Return the texts (with both span lists) on which the two patterns disagree."""
+    diffs: List[Dict] = []
+    for text in texts:
+        a, b = _spans(reference, text), _spans(candidate, text)
+        if a != b:
+            diffs.append({"text": text[:200], "reference": a, "candidate": b})
+    return diffs
+
+
+def long_local_parts() -> List[str]:
+    """Addresses whose local part is past the 64-char RFC limit, with and without dots."""
+    texts = []
+    for n in (65, 100, 500):
+        for prefix in ("", "contact ", "(", "x@y.gr ", "Γ "):
+            texts.append(prefix + "x" * n + "@example.com please")
+            texts.append(prefix + _repeat("john.", n - 3) + "doe@mail.com please")
+    return texts
+
+
+def equivalence_corpus(label: str, adversarial_size: int = 2_000) -> List[str]:
+    texts = golden_texts() + fuzz_texts() + long_local_parts()
+    texts.extend(gen(adversarial_size) for gen in ADVERSARIAL.get(label, {}).values())
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit detector regexes for super-linear behavior")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8_000, 32_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--candidates", action="store_true", help="Also audit and diff CANDIDATES rewrites")
+    parser.add_argument("--max-growth", type=float, default=2.0, help="Flag growth ratios above this")
+    parser.add_argument("--out", type=str, default=None, help="Optional path to write a JSON report")
+    args = parser.parse_args()
+
+    report = audit_all(args.sizes, args.repeat, candidates=args.candidates)
+    largest = str(max(args.sizes))
+
+    header = f"{'PATTERN':16} {'INPUT':24} {'MS/KB@' + largest:>14} {'GROWTH':>8}"
+    print(header)
+    print("-" * len(header))
+    flagged = 0
+    for label, rows in report.items():
+        for name, m in rows.items():
+            mark = ""
+            if m["growth"] > args.max_growth:
+                mark = "  <-- super-linear"
+                flagged += 1
+            print(f"{label:16} {name:24} {m['ms_per_kb'][largest]:14.3f} {m['growth']:8.2f}{mark}")
+
+    diffs: Dict[str, List[Dict]] = {}
+    if args.candidates:
+        current = audited_patterns()
+        for label, pattern in CANDIDATES.items():
+            diffs[label] = compare_patterns(current[label], pattern, equivalence_corpus(label))
+            print(f"\n{label}: candidate differs on {len(diffs[label])} texts")
+
+    if args.out:
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump({"timings": report, "candidate_diffs": diffs}, f, ensure_ascii=False, indent=2)
+        print(f"\nWrote report to {args.out}")
+
+    if flagged:
+        print(f"\n{flagged} input families grew super-linearly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Throughput of per-message ``deid_text_task`` vs batched ``deid_batch_task``.
+
+Short notes are de-identified once as one task per note and once in batches
+of ``--batch-size`` notes per task (NER through ``nlp.pipe``). By default tasks run in-process via ``Task.apply`` (no
+broker, the same code path as CELERY_TASK_ALWAYS_EAGER), which isolates the
+per-task overhead; ``--broker`` submits to the configured broker instead and
+waits for running workers to finish every task, so broker round trips count.
+
+DeidLog rows go to POSTGRES_DSN through the buffered audit writer
+(app/db/audit.py); in-process runs wait for it to drain before stopping the
+clock. ``--no-log`` skips them (DEID_TASK_LOGS=false).
+
+Usage:
+  python scripts/task_throughput.py                       # 100k notes, in-process
+  python scripts/task_throughput.py --n 20000 --batch-size 128 --no-log
+  python scripts/task_throughput.py --broker --out scripts/tasks.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Ensure project root on path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from scripts.benchmark import make_text  # noqa: E402
+
+
+def make_notes(n: int, size: int = 240, seed: int = 1337) -> List[str]:
+    # A small pool of distinct notes keeps generation cheap for 100k+ runs
+    pool = [make_text(size, 5.0, "mixed", seed=seed + i) for i in range(min(n, 500))]
+    return [pool[i % len(pool)] for i in range(n)]
+
+
+def _rate(n: int, elapsed: float) -> Dict[str, float]:
+    return {"notes": n, "elapsed_sec": elapsed, "notes_per_sec": (n / elapsed) if elapsed > 0 else 0.0}
+
+
+def run_comparison(notes: List[str], batch_size: int, broker: bool = False, timeout: float = 3600) -> Dict[str, Dict]:
+    from app.db.audit import audit_log
+    from app.workers.tasks import deid_batch_task, deid_text_task
+
+    batches = [notes[i:i + batch_size] for i in range(0, len(notes), batch_size)]
+    report: Dict[str, Dict] = {}
+
+    t0 = time.perf_counter()
+    if broker:
+        pending = [deid_text_task.delay(t, None, "counts") for t in notes]
+        for r in pending:
+            r.get(timeout=timeout)
+    else:
+        for t in notes:
+            deid_text_task.apply(args=(t, None, "counts")).get()
+        audit_log().flush(timeout)
+    report["per_message"] = _rate(len(notes), time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    if broker:
+        pending = [deid_batch_task.delay(b, None, "counts") for b in batches]
+        for r in pending:
+            r.get(timeout=timeout)
+    else:
+        for b in batches:
+            deid_batch_task.apply(args=(b, None, "counts")).get()
+        audit_log().flush(timeout)
+    report["batched"] = {**_rate(len(notes), time.perf_counter() - t0), "batch_size": batch_size}
+
+    base = report["per_message"]["notes_per_sec"]
+    report["speedup"] = {"batched": (report["batched"]["notes_per_sec"] / base) if base else 0.0}
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-message vs batched de-identification task throughput")
+    parser.add_argument("--n", type=int, default=100_000, help="Number of short notes")
+    parser.add_argument("--size", type=int, default=240, help="Characters per note")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--broker", action="store_true", help="Go through the broker and running workers")
+    parser.add_argument("--no-log", action="store_true", help="Skip DeidLog persistence")
+    parser.add_argument("--out", type=str, default=None, help="Optional path to write a JSON report")
+    args = parser.parse_args(argv)
+
+    if args.no_log:
+        os.environ["DEID_TASK_LOGS"] = "false"
+        from app.core.config import get_settings
+
+        get_settings.cache_clear()  # type: ignore[attr-defined]
+    # After the worker's logging setup: one "Task ... succeeded" INFO line per task would dominate the run
+    import app.workers.celery_app  # noqa: F401
+
+    logging.getLogger("celery").setLevel(logging.WARNING)
+
+    notes = make_notes(args.n, args.size)
+    report = run_comparison(notes, args.batch_size, broker=args.broker)
+
+    print(f"{'MODE':12} {'NOTES':>8} {'SEC':>9} {'NOTES/S':>10}")
+    for mode in ("per_message", "batched"):
+        r = report[mode]
+        print(f"{mode:12} {r['notes']:8d} {r['elapsed_sec']:9.2f} {r['notes_per_sec']:10.1f}")
+    print(f"\nBatched speedup: {report['speedup']['batched']:.2f}x (batch size {args.batch_size})")
+
+    if args.out:
+        payload = {"n": args.n, "size": args.size, "broker": args.broker, "log": not args.no_log, **report}
+        with Path(args.out).open("w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Wrote report to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
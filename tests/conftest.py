@@ -1,12 +1,16 @@
 import os
 import json
 import subprocess
+import tempfile
 from pathlib import Path
 from typing import Dict
 
 import pytest
 from dotenv import load_dotenv
 
+# Audit rows spill here while no database is reachable, not into the working tree
+os.environ.setdefault("AUDIT_SPILL_PATH", os.path.join(tempfile.gettempdir(), "deid-test-audit-spill.jsonl"))
+
 
 def _running_in_container() -> bool:
     return os.path.exists("/.dockerenv") or os.environ.get("PYTHONPATH") == "/app" or os.environ.get("RUNNING_IN_DOCKER") == "1"
@@ -94,3 +98,15 @@ def sample_texts() -> Dict[str, str]:
 def data_dir(tmp_path_factory) -> Path:
     root = Path(__file__).resolve().parent / "data"
     return root
+
+
+@pytest.fixture()
+def redis_standin():
+    """In-process Redis stand-in (strings, pub/sub); ``.url`` for clients."""
+    from redis_standin import RedisStandIn
+
+    server = RedisStandIn().start()
+    try:
+        yield server
+    finally:
+        server.stop()
@@ -0,0 +1,214 @@
+"""
+Minimal in-process Redis (RESP2) for tests: strings, hashes and pub/sub.
+
+Enough of the protocol for redis-py's sync and asyncio clients (pipelines
+included): PING, CLIENT, SELECT, GET, SET, SETEX, GETRANGE, MGET, DEL,
+EXISTS, EXPIRE, HSET, HGETALL, PUBLISH, (P)SUBSCRIBE, (P)UNSUBSCRIBE and
+MULTI/EXEC/DISCARD. Expiry is accepted and ignored.
+"""
+
+import asyncio
+import fnmatch
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+def _int(n: int) -> bytes:
+    return b":%d\r\n" % n
+
+
+_OK = b"+OK\r\n"
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.strip().split()  # inline command
+    args: List[bytes] = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+class RedisStandIn:
+    def __init__(self) -> None:
+        self.data: Dict[bytes, bytes] = {}
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = defaultdict(dict)
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.patterns: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.commands: List[List[bytes]] = []
+        self.connections = 0
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._loop = asyncio.new_event_loop()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        return f"redis://127.0.0.1:{port}/0"
+
+    def start(self) -> "RedisStandIn":
+        self._thread.start()
+        fut = asyncio.run_coroutine_threadsafe(asyncio.start_server(self._handle, "127.0.0.1", 0), self._loop)
+        self._server = fut.result(5)
+        return self
+
+    def stop(self) -> None:
+        async def _close() -> None:
+            self._server.close()  # type: ignore[union-attr]
+            # Drop client connections before the loop goes away
+            for w in list(self._writers):
+                w.close()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=2)
+
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    def publish(self, channel: str, message: bytes) -> int:
+        """Publish from the test thread."""
+        return asyncio.run_coroutine_threadsafe(self._publish(channel.encode(), message), self._loop).result(5)
+
+    def subscribers(self) -> int:
+        """Open channel and pattern subscriptions, over all connections."""
+        return sum(len(w) for w in self.channels.values()) + sum(len(w) for w in self.patterns.values())
+
+    async def _publish(self, channel: bytes, message: bytes) -> int:
+        writers = list(self.channels.get(channel, ()))
+        for w in writers:
+            w.write(_array([_bulk(b"message"), _bulk(channel), _bulk(message)]))
+        sent = len(writers)
+        for pattern, pwriters in list(self.patterns.items()):
+            if fnmatch.fnmatchcase(channel.decode(), pattern.decode()):
+                for w in list(pwriters):
+                    w.write(_array([_bulk(b"pmessage"), _bulk(pattern), _bulk(channel), _bulk(message)]))
+                    sent += 1
+        return sent
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())  # type: ignore[arg-type]
+        subscribed: Set[bytes] = set()
+        psubscribed: Set[bytes] = set()
+        queued: Optional[List[List[bytes]]] = None  # inside MULTI
+        try:
+            while True:
+                try:
+                    cmd = await _read_command(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if not cmd:
+                    break
+                self.commands.append(cmd)
+                name = cmd[0].upper()
+                if name == b"MULTI":
+                    queued, reply = [], _OK
+                elif name == b"DISCARD":
+                    queued, reply = None, _OK
+                elif name == b"EXEC":
+                    replies = [await self._dispatch(c, writer, subscribed, psubscribed) for c in queued or []]
+                    queued, reply = None, b"*%d\r\n" % len(replies) + b"".join(replies)
+                elif queued is not None:
+                    queued.append(cmd)
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = await self._dispatch(cmd, writer, subscribed, psubscribed)
+                writer.write(reply)
+                await writer.drain()
+        finally:
+            for ch in subscribed:
+                self.channels[ch].discard(writer)
+            for pattern in psubscribed:
+                self.patterns[pattern].discard(writer)
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())  # type: ignore[arg-type]
+            writer.close()
+
+    async def _dispatch(
+        self, cmd: List[bytes], writer: asyncio.StreamWriter, subscribed: Set[bytes], psubscribed: Set[bytes]
+    ) -> bytes:
+        name, args = cmd[0].upper(), cmd[1:]
+        if name == b"PING":
+            return b"+PONG\r\n" if not (subscribed or psubscribed) else _array([_bulk(b"pong"), _bulk(b"")])
+        if name in (b"CLIENT", b"SELECT"):
+            return _OK
+        if name == b"GET":
+            return _bulk(self.data.get(args[0]))
+        if name == b"SET":
+            self.data[args[0]] = args[1]
+            return _OK
+        if name == b"SETEX":
+            self.data[args[0]] = args[2]
+            return _OK
+        if name == b"GETRANGE":
+            value = self.data.get(args[0], b"")
+            start, end = int(args[1]), int(args[2])
+            return _bulk(value[start:(end + 1) if end >= 0 else len(value) + end + 1])
+        if name == b"MGET":
+            return _array([_bulk(self.data.get(k)) for k in args])
+        if name == b"DEL":
+            return _int(sum((self.data.pop(k, None) is not None) | (self.hashes.pop(k, None) is not None) for k in args))
+        if name == b"EXISTS":
+            return _int(sum(k in self.data or k in self.hashes for k in args))
+        if name == b"EXPIRE":
+            return _int(int(args[0] in self.data))
+        if name == b"HSET":
+            h = self.hashes[args[0]]
+            added = sum(f not in h for f in args[1::2])
+            h.update(zip(args[1::2], args[2::2]))
+            return _int(added)
+        if name == b"HGETALL":
+            return _array([_bulk(x) for kv in self.hashes.get(args[0], {}).items() for x in kv])
+        if name == b"PUBLISH":
+            return _int(await self._publish(args[0], args[1]))
+        if name == b"SUBSCRIBE":
+            out = b""
+            for ch in args:
+                subscribed.add(ch)
+                self.channels[ch].add(writer)
+                out += _array([_bulk(b"subscribe"), _bulk(ch), _int(len(subscribed))])
+            return out
+        if name == b"PSUBSCRIBE":
+            out = b""
+            for pattern in args:
+                psubscribed.add(pattern)
+                self.patterns[pattern].add(writer)
+                out += _array([_bulk(b"psubscribe"), _bulk(pattern), _int(len(subscribed) + len(psubscribed))])
+            return out
+        if name == b"PUNSUBSCRIBE":
+            if not args and not psubscribed:
+                return _array([_bulk(b"punsubscribe"), _bulk(None), _int(len(subscribed))])
+            out = b""
+            for pattern in args or list(psubscribed):
+                psubscribed.discard(pattern)
+                self.patterns[pattern].discard(writer)
+                out += _array([_bulk(b"punsubscribe"), _bulk(pattern), _int(len(subscribed) + len(psubscribed))])
+            return out
+        if name == b"UNSUBSCRIBE":
+            if not args and not subscribed:
+                return _array([_bulk(b"unsubscribe"), _bulk(None), _int(0)])
+            out = b""
+            for ch in args or list(subscribed):
+                subscribed.discard(ch)
+                self.channels[ch].discard(writer)
+                out += _array([_bulk(b"unsubscribe"), _bulk(ch), _int(len(subscribed))])
+            return out
+        return b"-ERR unknown command '%s'\r\n" % name
@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.admission import CHEAP, EXPENSIVE, AdmissionController, classify
+from app.core import metrics
+from app.main import app
+
+
+def _settings(**overrides):
+    values = dict(
+        admission_cheap_max_inflight=2,
+        admission_expensive_max_inflight=1,
+        admission_max_inflight_chars=1_000,
+        admission_max_queue_depth=100,
+        admission_queue_check_sec=60.0,
+        admission_retry_after_sec=3,
+        interactive_max_chars=500,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_routes_are_classified():
+    assert classify("POST", "/api/v1/deid", 10, 500) == (EXPENSIVE, None)
+    assert classify("POST", "/api/v1/jobs/deid", 10, 500) == (CHEAP, "interactive")
+    assert classify("POST", "/api/v1/jobs/deid", 10_000, 500) == (CHEAP, "bulk")
+    assert classify("POST", "/api/v1/jobs/evaluate", 10, 500) == (CHEAP, "bulk")
+    assert classify("GET", "/api/v1/jobs/abc", 0, 500) == (CHEAP, None)
+    for path in ("/api/v1/health", "/api/v1/metrics", "/api/v1/jobs/abc/events", "/static/app.js", "/"):
+        assert classify("GET", path, 0, 500) is None
+
+
+def test_budgets_per_class_and_chars():
+    c = AdmissionController(_settings())
+    c.acquire(EXPENSIVE, 800)
+    # Expensive work does not use up the cheap budget
+    assert c.check(EXPENSIVE, 10) == "in_flight" and c.check(CHEAP, 10) is None
+    c.acquire(CHEAP, 0)
+    c.acquire(CHEAP, 0)
+    assert c.check(CHEAP, 0) == "in_flight"
+
+    c = AdmissionController(_settings(admission_expensive_max_inflight=0))
+    assert c.check(EXPENSIVE, 5_000) is None  # one oversized request alone gets through
+    c.acquire(EXPENSIVE, 800)
+    assert c.check(EXPENSIVE, 150) is None and c.check(EXPENSIVE, 300) == "chars"
+    c.release(EXPENSIVE, 800)
+    assert c.in_flight == {CHEAP: 0, EXPENSIVE: 0} and c.in_flight_chars == 0
+
+
+def test_job_submissions_shed_on_queue_depth():
+    calls = []
+
+    def depths():
+        calls.append(1)
+        return {"interactive": 3, "bulk": 250}
+
+    async def scenario():
+        c = AdmissionController(_settings(), depth_source=depths)
+        # Unknown depths never shed; the lookup happens in the background
+        assert c.check(CHEAP, 10, "bulk") is None
+        await asyncio.sleep(0.1)
+        return c.check(CHEAP, 10, "bulk"), c.check(CHEAP, 10, "interactive")
+
+    assert asyncio.run(scenario()) == ("queue_depth", None)
+    assert len(calls) == 1  # fresh depths are reused
+
+    def broker_down():
+        raise ConnectionError("refused")
+
+    async def unreachable():
+        c = AdmissionController(_settings(), depth_source=broker_down)
+        c.check(CHEAP, 10, "bulk")
+        await asyncio.sleep(0.1)
+        return c.check(CHEAP, 10, "bulk")
+
+    assert asyncio.run(unreachable()) is None
+
+
+@pytest.fixture()
+def controller(monkeypatch):
+    c = app.state.admission
+    monkeypatch.setattr(c, "settings", _settings())
+    yield c
+    assert c.in_flight == {CHEAP: 0, EXPENSIVE: 0}
+
+
+def test_overloaded_requests_get_503_with_retry_after(controller):
+    client = TestClient(app)
+    controller.acquire(EXPENSIVE, 100)
+    try:
+        r = client.post("/api/v1/deid", json={"text": "Email john@example.com"})
+        assert r.status_code == 503 and r.headers["Retry-After"] == "3"
+        assert "expensive" in r.json()["detail"]
+        # Cheap endpoints and health checks keep their own budget
+        assert client.get("/api/v1/config").status_code == 200
+        assert client.get("/api/v1/health").status_code == 200
+    finally:
+        controller.release(EXPENSIVE, 100)
+    assert client.post("/api/v1/deid", json={"text": "Email john@example.com"}).status_code == 200
+
+
+@pytest.mark.skipif(not metrics.AVAILABLE, reason="prometheus_client not installed")
+def test_shedding_decisions_are_exported(controller, monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", True)
+    client = TestClient(app)
+
+    def count(decision):
+        return metrics.ADMISSIONS.labels(EXPENSIVE, decision)._value.get()
+
+    shed, admitted = count("in_flight"), count("admitted")
+    controller.acquire(EXPENSIVE, 0)
+    try:
+        client.post("/api/v1/deid", json={"text": "hello"})
+    finally:
+        controller.release(EXPENSIVE, 0)
+    client.post("/api/v1/deid", json={"text": "hello"})
+    assert (count("in_flight"), count("admitted")) == (shed + 1, admitted + 1)
+    text = client.get("/api/v1/metrics").text
+    assert 'deid_admission_total{class="expensive",decision="in_flight"}' in text
+    assert 'deid_in_flight{class="expensive"} 0.0' in text
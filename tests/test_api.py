@@ -35,6 +35,52 @@ def test_deid_endpoint_text_and_config_roundtrip(tmp_path):
     assert any(ent.get("label") in ("EMAIL",) for ent in data.get("entities", []))
 
 
+def test_deid_counts_mode_omits_text():
+    r = client.post("/api/v1/deid", json={"text": "Email alice@example.com", "mode": "counts"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["counts"] == {"EMAIL": 1}
+    assert "result_text" not in data and "entities" not in data
+
+
+def test_deid_label_selection_reports_plan():
+    text = "Email alice@example.com, IP 10.0.0.1"
+    r = client.post("/api/v1/deid", json={"text": text, "labels": ["EMAIL"], "mode": "spans"})
+    assert r.status_code == 200
+    data = r.json()
+    assert [e["label"] for e in data["entities"]] == ["EMAIL"]
+    assert data["plan"]["regex"] == ["EMAIL"] and data["plan"]["ner"] is False
+    r = client.post("/api/v1/deid", json={"text": text, "labels": ["BOGUS"]})
+    assert r.status_code == 422
+
+
+def test_deid_deadline_header_reports_coverage():
+    r = client.post(
+        "/api/v1/deid",
+        json={"text": "Email alice@example.com", "mode": "counts"},
+        headers={"X-Deadline-Ms": "60000"},
+    )
+    assert r.status_code == 200
+    cov = r.json()["coverage"]
+    assert cov["complete"] is True and cov["incomplete"] == []
+
+
+def test_server_timing_header():
+    r = client.post("/api/v1/deid", json={"text": "Email alice@example.com", "timings": True})
+    assert r.status_code == 200
+    assert "total" in r.json()["timings"]
+    header = r.headers["server-timing"]
+    assert "regex.EMAIL;dur=" in header and "serialize;dur=" in header
+
+
+def test_scan_endpoint():
+    r = client.post("/api/v1/scan", json={"text": "AMKA 12039912345", "lang_hint": "el"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["contains_phi"] is True
+    assert data["label"] == "AMKA" and data["span"] == [5, 16]
+
+
 def test_deid_file_upload(tmp_path):
     content = "Patient John, AMKA 13059912345, phone 6912345678".encode("utf-8")
     files = [
@@ -55,3 +101,18 @@ def test_oversized_input_returns_413():
     too_long = "A" * (settings.max_text_size + 1)
     r = client.post("/api/v1/deid", json={"text": too_long})
     assert r.status_code == 413
+
+
+def test_jobs_deid_batch_limits_and_queues(monkeypatch):
+    from app.api import v1
+    from app.workers.celery_app import celery_app
+
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(v1._settings, "deid_batch_max", 2)
+    monkeypatch.setattr(v1._settings, "deid_task_logs", False)
+    r = client.post("/api/v1/jobs/deid/batch", json={"texts": ["a", "b", "c"]})
+    assert r.status_code == 413
+    r = client.post("/api/v1/jobs/deid/batch", json={"texts": []})
+    assert r.status_code == 422
+    r = client.post("/api/v1/jobs/deid/batch", json={"texts": ["Email a@b.com", "hi"], "mode": "counts"})
+    assert r.status_code == 200 and r.json()["texts"] == 2
@@ -0,0 +1,142 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import v1
+from app.db import audit
+from app.db.audit import AuditLog, deid_log_row
+from app.main import app
+from app.workers import tasks
+
+
+class Sink:
+    def __init__(self):
+        self.batches = []
+        self.replayed = []
+        self.down = False
+
+    def __call__(self, rows, replayed=False):
+        if self.down:
+            raise ConnectionError("database is down")
+        self.batches.append(list(rows))
+        self.replayed.append(replayed)
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def _writer(tmp_path, sink, **overrides):
+    values = dict(
+        audit_queue_size=100,
+        audit_batch_size=3,
+        audit_flush_interval_sec=0.02,
+        audit_spill_path=str(tmp_path / "spill.jsonl"),
+    )
+    values.update(overrides)
+    return AuditLog(SimpleNamespace(**values), sink=sink)
+
+
+def _row(n=1):
+    return deid_log_row({"original_len": 10, "counts": {"EMAIL": n}, "time_ms": 2}, "en", "test:mask")
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_rows_are_inserted_in_batches(tmp_path):
+    sink = Sink()
+    writer = _writer(tmp_path, sink)
+    for i in range(7):
+        writer.record(_row(i))
+    assert writer.flush()
+    assert len(sink.rows) == 7 and max(len(b) for b in sink.batches) <= 3
+    # Stamped when recorded, not when the batch is written
+    assert all(isinstance(row["created_at"], datetime) for row in sink.rows)
+    assert [row["num_entities"] for row in sink.rows] == list(range(7))
+    writer.close()
+
+
+def test_outage_spills_and_replays_once_the_database_is_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit, "_REPLAY_INTERVAL_SEC", 0.05)
+    sink = Sink()
+    sink.down = True
+    writer = _writer(tmp_path, sink)
+    rows = [_row(i) for i in range(4)]
+    for row in rows:
+        writer.record(row)
+    assert writer.flush()
+    assert len(writer.spill_path.read_text().splitlines()) == 4 and not sink.rows
+
+    sink.down = False
+    _wait(lambda: len(sink.rows) == 4)
+    replayed = sorted(sink.rows, key=lambda r: r["num_entities"])
+    assert [r["request_id"] for r in replayed] == [r["request_id"] for r in rows]
+    assert isinstance(replayed[0]["request_id"], uuid.UUID) and replayed[0]["created_at"] == rows[0]["created_at"]
+    # Replayed batches are flagged so their hours get re-rolled up
+    assert sink.replayed and all(sink.replayed)
+    assert writer.spill_path.read_text() == ""
+    writer.close()
+
+
+def test_full_queue_spills_instead_of_blocking(tmp_path):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_sink(rows, replayed=False):
+        entered.set()
+        release.wait(5)
+
+    writer = _writer(tmp_path, slow_sink, audit_queue_size=1, audit_batch_size=1)
+    writer.record(_row())
+    assert entered.wait(5)  # the flusher holds the first row
+    writer.record(_row())  # fills the queue
+    t0 = time.monotonic()
+    writer.record(_row())
+    assert time.monotonic() - t0 < 0.5
+    assert len(writer.spill_path.read_text().splitlines()) == 1
+    release.set()
+    assert writer.flush()
+    writer.close()
+
+
+@pytest.fixture()
+def captured(tmp_path, monkeypatch):
+    sink = Sink()
+    writer = _writer(tmp_path, sink)
+    monkeypatch.setattr(v1, "audit_log", lambda: writer)
+    monkeypatch.setattr(tasks, "audit_log", lambda: writer)
+    yield writer, sink
+    writer.close()
+
+
+def test_api_and_workers_feed_the_audit_log(captured):
+    writer, sink = captured
+    client = TestClient(app)
+    r = client.post("/api/v1/deid", json={"text": "Email john@example.com", "mode": "counts", "lang_hint": "en"})
+    assert r.status_code == 200
+    files = [("files", ("a.txt", b"call 2101234567", "text/plain")), ("files", ("b.txt", b"hello", "text/plain"))]
+    assert client.post("/api/v1/deid/file", files=files).status_code == 200
+    result = tasks.deid_text_task.run("Email a@b.com and c@d.com", "en")
+    assert writer.flush()
+
+    api, file_a, file_b, task = sink.rows
+    assert (api["num_entities"], api["input_len"], api["lang_hint"]) == (1, 22, "en")
+    assert api["policy_version"].endswith(":" + v1._policy_state.default_policy)
+    assert (file_a["num_entities"], file_b["num_entities"]) == (1, 0)
+    assert task["request_id"] == uuid.UUID(result["request_id"]) and task["num_entities"] == 2
+
+
+def test_api_audit_can_be_disabled(captured, monkeypatch):
+    writer, sink = captured
+    monkeypatch.setattr(v1._settings, "deid_api_logs", False)
+    assert TestClient(app).post("/api/v1/deid", json={"text": "hello"}).status_code == 200
+    assert writer.flush() and sink.rows == []
@@ -0,0 +1,164 @@
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.deid.bulk import Shard, bulk_progress, plan_shards, process_shard
+from app.deid.engine import DeidEngine, POLICY_MAP
+from app.main import app
+
+
+def _engine() -> DeidEngine:
+    return DeidEngine(policy_map={**POLICY_MAP}, salt="bulk", default_policy="mask")
+
+
+def _write_input(path: Path, n: int) -> Path:
+    lines = []
+    for i in range(n):
+        lines.append(json.dumps({"id": i, "text": f"Note {i}: email user{i}@example.com, ΑΜΚΑ 1203991234{i % 10}"}, ensure_ascii=False))
+        if i == 7:
+            lines.append("{not json")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def _output(out_dir: Path) -> list:
+    return [
+        json.loads(line)
+        for part in sorted(out_dir.glob("part-*[0-9].jsonl"))
+        for line in part.read_text(encoding="utf-8").splitlines()
+    ]
+
+
+def _run(input_path: Path, out_dir: Path, shards: int, **kwargs) -> list:
+    return [process_shard(s, str(out_dir), _engine(), **kwargs) for s in plan_shards(str(input_path), str(out_dir), shards)]
+
+
+def test_bulk_shards_deidentify_every_record_once(tmp_path):
+    src = _write_input(tmp_path / "in.jsonl", 40)
+    one = _run(src, tmp_path / "one", 1)
+    many = _run(src, tmp_path / "many", 5, batch_size=3)
+    assert _output(tmp_path / "one") == _output(tmp_path / "many")
+    records = _output(tmp_path / "many")
+    assert [r["id"] for r in records] == list(range(40))
+    assert all("@example.com" not in r["text"] and r["deid"]["counts"].get("EMAIL") == 1 for r in records)
+    assert sum(c["records"] for c in one) == 40 and sum(c["errors"] for c in many) == 1
+    errors = [json.loads(x) for p in (tmp_path / "many").glob("*.errors.jsonl") for x in p.read_text().splitlines()]
+    assert len(errors) == 1 and errors[0]["error"].startswith("invalid JSON")
+
+
+def test_bulk_resumes_from_checkpoint_without_duplicates(tmp_path):
+    src = _write_input(tmp_path / "in.jsonl", 60)
+    out = tmp_path / "out"
+    (shard,) = plan_shards(str(src), str(out), 1)
+    calls = []
+
+    def crash(state):
+        calls.append(state)
+        if len(calls) == 2:
+            raise RuntimeError("worker lost")
+
+    with pytest.raises(RuntimeError):
+        process_shard(shard, str(out), _engine(), batch_size=5, checkpoint_every=2, progress=crash)
+    ckpt = calls[-1]
+    assert 0 < ckpt["records"] < 60 and not ckpt["done"]
+    # Junk written after the last checkpoint is discarded on resume
+    with (out / "part-00000.jsonl").open("ab") as f:
+        f.write(b'{"partial": ')
+    progress = bulk_progress(str(out))
+    assert progress["records"] == ckpt["records"] and 0 < progress["percent"] < 100
+
+    final = process_shard(shard, str(out), _engine(), batch_size=5, checkpoint_every=2)
+    assert final["done"] and final["records"] == 60
+    assert [r["id"] for r in _output(out)] == list(range(60))
+    # A finished shard is not processed again
+    assert process_shard(shard, str(out), _engine())["records"] == 60
+
+
+class CountingEngine(DeidEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def deidentify_batch(self, texts, lang_hints=None, **kwargs):
+        self.batches.append(len(texts))
+        return super().deidentify_batch(texts, lang_hints, **kwargs)
+
+
+def test_bulk_runs_each_batch_through_the_engine_once(tmp_path, monkeypatch):
+    from app.core.config import get_settings
+
+    src = _write_input(tmp_path / "in.jsonl", 23)
+    with src.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": 23, "text": "x" * 200}) + "\n")
+    monkeypatch.setattr(get_settings(), "max_text_size", 100)
+    (shard,) = plan_shards(str(src), str(tmp_path / "out"), 1)
+    engine = CountingEngine(policy_map={**POLICY_MAP}, salt="bulk", default_policy="mask")
+    final = process_shard(shard, str(tmp_path / "out"), engine, batch_size=5)
+    # 25 lines in batches of 5; the invalid JSON line never reaches the engine
+    assert engine.batches[:4] == [5, 4, 5, 5]
+    assert [r["id"] for r in _output(tmp_path / "out")] == list(range(23))
+    # The over-long record fails its batch call, which is retried record by record
+    assert final["records"] == 23 and final["errors"] == 2 and engine.batches[4:] == [5]
+    errors = [json.loads(x) for x in (tmp_path / "out" / "part-00000.errors.jsonl").read_text().splitlines()]
+    assert errors[0]["error"].startswith("invalid JSON") and errors[1]["error"].startswith("Text too long")
+
+
+def test_bulk_directory_input_and_manifest(tmp_path):
+    src = tmp_path / "exports"
+    src.mkdir()
+    _write_input(src / "a.jsonl", 10)
+    _write_input(src / "b.jsonl", 30)
+    plan = plan_shards(str(src), str(tmp_path / "out"), 4)
+    assert {Path(s.input).name for s in plan} == {"a.jsonl", "b.jsonl"}
+    # The manifest pins the plan for resumes, whatever shard count is asked for later
+    assert plan_shards(str(src), str(tmp_path / "out"), 16) == plan
+    with pytest.raises(ValueError):
+        plan_shards(str(src / "a.jsonl"), str(tmp_path / "out"), 4)
+    assert isinstance(plan[0], Shard)
+
+
+def test_bulk_job_eager_chord_and_api(tmp_path, monkeypatch):
+    from app.api import v1
+    from app.workers.celery_app import celery_app
+
+    monkeypatch.setattr(v1._settings, "bulk_root", str(tmp_path))
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_eager_propagates", True)
+    src = _write_input(tmp_path / "in.jsonl", 25)
+    client = TestClient(app)
+    r = client.post(
+        "/api/v1/jobs/deid/bulk",
+        json={"input_path": str(src), "output_path": str(tmp_path / "out"), "shards": 3},
+    )
+    assert r.status_code == 200 and r.json()["shards"] == 3
+    summary = json.loads((tmp_path / "out" / "_SUCCESS").read_text())
+    assert summary["records"] == 25 and summary["errors"] == 1 and summary["shards"] == 3
+    p = client.get("/api/v1/jobs/deid/bulk/progress", params={"output_path": str(tmp_path / "out")}).json()
+    assert p["complete"] and p["percent"] == 100.0 and p["shards_done"] == 3
+
+    r = client.post("/api/v1/jobs/deid/bulk", json={"input_path": str(tmp_path / "missing"), "output_path": str(tmp_path / "o2")})
+    assert r.status_code == 404
+    r = client.get("/api/v1/jobs/deid/bulk/progress", params={"output_path": str(tmp_path / "o2")})
+    assert r.status_code == 404
+
+
+def test_bulk_paths_stay_inside_bulk_root(tmp_path, monkeypatch):
+    from app.api import v1
+
+    root = tmp_path / "bulk"
+    root.mkdir()
+    src = _write_input(root / "in.jsonl", 3)
+    monkeypatch.setattr(v1._settings, "bulk_root", str(root))
+    client = TestClient(app)
+    for input_path, output_path in (
+        ("/etc/passwd", "out"),
+        (str(src), str(tmp_path / "elsewhere")),
+        ("in.jsonl", "../escaped"),
+    ):
+        r = client.post("/api/v1/jobs/deid/bulk", json={"input_path": input_path, "output_path": output_path})
+        assert r.status_code == 400, (input_path, output_path)
+    assert not (tmp_path / "elsewhere").exists() and not (tmp_path / "escaped").exists()
+    r = client.get("/api/v1/jobs/deid/bulk/progress", params={"output_path": str(tmp_path)})
+    assert r.status_code == 400
@@ -103,3 +103,111 @@ def test_hash_deterministic(api_client):
 
     exp = _sha256((settings.deid_salt + email).encode("utf-8")).hexdigest()
     assert f"EMAIL_HASH:{exp}" in body["result_text"]
+
+
+def test_engine_result_modes_share_spans():
+    from app.deid.engine import DeidEngine, POLICY_MAP
+
+    eng = DeidEngine(policy_map={**POLICY_MAP}, salt="s", default_policy="mask")
+    txt = "Email alice@example.com, call 2101234567"
+    full = eng.deidentify(txt, lang_hint="en")
+    spans = eng.deidentify(txt, lang_hint="en", mode="spans")
+    patch = eng.deidentify(txt, lang_hint="en", mode="patch")
+    counts = eng.deidentify(txt, lang_hint="en", mode="counts")
+
+    assert "result_text" not in spans and spans["entities"] == full["entities"]
+    assert [p["span"] for p in patch["patch"]] == [e["span"] for e in full["entities"]]
+    # Applying the patch reproduces the full-mode output
+    rebuilt, last = [], 0
+    for op in patch["patch"]:
+        rebuilt.append(txt[last:op["span"][0]])
+        rebuilt.append(op["replacement"])
+        last = op["span"][1]
+    rebuilt.append(txt[last:])
+    assert "".join(rebuilt) == full["result_text"]
+    assert counts["counts"] == {"EMAIL": 1, "PHONE_GR": 1}
+    assert "entities" not in counts
+
+
+def test_engine_rejects_unknown_mode():
+    from app.deid.engine import DeidEngine
+
+    eng = DeidEngine(policy_map={}, salt="", default_policy="mask")
+    with pytest.raises(ValueError):
+        eng.deidentify("x", mode="nope")
+
+
+def test_engine_deadline_reports_coverage_and_fails_closed():
+    import time
+
+    from app.deid.engine import DeidEngine, POLICY_MAP
+
+    eng = DeidEngine(policy_map={**POLICY_MAP}, salt="s", default_policy="mask")
+    txt = "Email alice@example.com"
+
+    ok = eng.deidentify(txt, lang_hint="en", deadline=time.monotonic() + 60)
+    assert ok["coverage"]["complete"] is True and ok["coverage"]["unscanned"] == []
+    assert "EMAIL" in ok["coverage"]["completed"]
+
+    expired = time.monotonic() - 1
+    open_res = eng.deidentify(txt, lang_hint="en", deadline=expired)
+    assert open_res["coverage"]["complete"] is False
+    assert open_res["coverage"]["unscanned"] == [[0, len(txt)]]
+    assert open_res["result_text"] == txt  # fail-open passes text through
+
+    closed = eng.deidentify(txt, lang_hint="en", deadline=expired, fail_closed=True)
+    assert closed["result_text"] == "[REDACTED:UNSCANNED]"
+    assert closed["entities"] == [{"label": "UNSCANNED", "span": [0, len(txt)], "action": "redact"}]
+
+
+def test_no_deadline_omits_coverage():
+    from app.deid.engine import DeidEngine
+
+    eng = DeidEngine(policy_map={}, salt="", default_policy="mask")
+    assert "coverage" not in eng.deidentify("a@b.com")
+
+
+def test_engine_timings_opt_in():
+    from app.core import metrics
+    from app.deid.engine import DeidEngine, POLICY_MAP
+
+    eng = DeidEngine(policy_map={**POLICY_MAP}, salt="s", default_policy="mask")
+    assert "timings" not in eng.deidentify("a@b.com")
+    res = eng.deidentify("Email alice@example.com", timings=True)
+    t = res["timings"]
+    for key in ("regex.EMAIL", "dedupe", "detect", "overlap", "replace.full", "total"):
+        assert key in t and isinstance(t[key], int)
+    assert t["total"] >= t["detect"]
+    assert metrics._TIMINGS.get() is None  # collector does not leak past the call
+
+
+def test_engine_batch_matches_single_calls(monkeypatch):
+    import spacy
+
+    from app.deid import recognizers
+    from app.deid.engine import DeidEngine, POLICY_MAP
+
+    # Real blank pipelines with a rule-based "ner" pipe, so the nlp.pipe path runs
+    pipes = {}
+    for lang, name in (("en", "John Smith"), ("el", "Γιάννης Παππάς")):
+        nlp = spacy.blank(lang)
+        nlp.add_pipe("entity_ruler", name="ner").add_patterns([{"label": "PERSON", "pattern": name}])
+        pipes[lang] = nlp
+    monkeypatch.setattr(recognizers, "_get_nlp", lambda lang: pipes.get(lang))
+
+    eng = DeidEngine(policy_map={**POLICY_MAP}, salt="s", default_policy="mask")
+    texts = [
+        "John Smith, email alice@example.com",
+        "Ο Γιάννης Παππάς, ΑΜΚΑ 12039912345, τηλ 2101234567",
+        "",
+        "MRN: ZXCV-778899 for John Smith",
+    ]
+    hints = ["en", "el", None, None]
+    for mode in ("full", "counts"):
+        batch = eng.deidentify_batch(texts, hints, mode=mode)
+        single = [eng.deidentify(t, lang_hint=h, mode=mode) for t, h in zip(texts, hints)]
+        strip = lambda r: {k: v for k, v in r.items() if k != "time_ms"}  # noqa: E731
+        assert [strip(r) for r in batch] == [strip(r) for r in single]
+    assert "PERSON" in batch[0]["counts"] and "PERSON" in batch[1]["counts"]
+    sel = eng.deidentify_batch(texts[:1], ["en"], mode="counts", labels=["EMAIL"])
+    assert sel[0]["counts"] == {"EMAIL": 1} and sel[0]["plan"]["ner"] is False
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import v1
+from app.core.config import get_settings
+from app.main import app
+from app.workers import events, progress, status
+from app.workers.celery_app import celery_app
+from app.workers.events import JobEvents
+from app.workers.progress import JobProgress, ShardProgress, announce_job, job_finished, progress_key
+
+
+@pytest.fixture()
+def redis_server(redis_standin, monkeypatch):
+    monkeypatch.setattr(get_settings(), "redis_url", redis_standin.url)
+    monkeypatch.setattr(progress, "_muted_until", 0.0)
+    status._clients.clear()
+    progress._clients.clear()
+    yield redis_standin
+    status._clients.clear()
+    progress._clients.clear()
+
+
+def _parse(text):
+    """SSE text -> [(event, data)]; comments and retry lines dropped."""
+    out = []
+    for block in text.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if line.startswith(("event:", "data:")))
+        if "event" in lines:
+            out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+async def _collect(gen):
+    return "".join([x async for x in gen])
+
+
+def _run_job(job_id, docs=(5, 10, 8)):
+    announce_job(job_id, 2, 200)
+    a = ShardProgress(job_id, "p0", 0, 100, interval=0)
+    b = ShardProgress(job_id, "p1", 100, 200, interval=0)
+    a(50, docs[0])
+    a(100, docs[1], done=True)
+    b(200, docs[2], errors=1, done=True)
+    job_finished(job_id, "SUCCESS")
+
+
+def test_job_progress_snapshot():
+    p = JobProgress("j")
+    p.update({"field": "job", "shards": 4, "bytes_total": 400})
+    p.update({"field": "shard:a", "bytes_done": 100, "bytes_total": 100, "docs": 10, "done": True,
+              "bytes_per_sec": 50.0, "docs_per_sec": 5.0})
+    p.update({"field": "shard:b", "bytes_done": 50, "bytes_total": 100, "docs": 4, "done": False,
+              "bytes_per_sec": 25.0, "docs_per_sec": 2.0})
+    snap = p.snapshot()
+    assert snap["shards"] == 4 and snap["shards_done"] == 1 and snap["docs"] == 14
+    assert snap["percent"] == pytest.approx(37.5)
+    # Only running shards count towards the rate: 250 bytes left at 25 B/s
+    assert snap["docs_per_sec"] == 2.0 and snap["eta_sec"] == pytest.approx(10.0)
+
+
+def test_many_streams_share_one_subscription(redis_server):
+    async def scenario():
+        streams = [await JobEvents(f"job-{i % 2}", heartbeat=5).open() for i in range(40)]
+        assert redis_server.subscribers() == 1
+        gens = [s.stream() for s in streams]
+        for g in gens:
+            assert (await g.__anext__()).startswith("retry:")
+        await asyncio.to_thread(_run_job, "job-0")
+        await asyncio.to_thread(_run_job, "job-1", (1, 2, 3))
+        bodies = await asyncio.gather(*(_collect(g) for g in gens))
+        await asyncio.sleep(0.1)  # the hub closes its subscription after the last stream
+        return bodies
+
+    bodies = asyncio.run(scenario())
+    assert redis_server.subscribers() == 0
+    for i, body in enumerate(bodies):
+        evs = _parse(body)
+        assert evs[-1] == ("done", {"task_id": f"job-{i % 2}", "status": "SUCCESS"})
+        last = [data for name, data in evs if name == "progress"][-1]
+        assert last["docs"] == (18 if i % 2 == 0 else 5) and last["percent"] == 100.0
+        assert last["shards_done"] == 2 and last["errors"] == 1 and last["eta_sec"] == 0.0
+
+
+def test_stream_ends_when_job_fails_without_callback(redis_server):
+    backend = celery_app.backend
+
+    async def scenario():
+        stream = await JobEvents("job-x", heartbeat=0.05).open()
+        # A failed chord marks the callback failed without running it: no "done" report
+        meta = backend._get_result_meta(result=backend.prepare_exception(RuntimeError("shard lost")),
+                                        state="FAILURE", traceback=None, request=None)
+        redis_server.data[backend.get_key_for_task("job-x")] = backend.encode(meta)
+        return "".join([x async for x in stream.stream()])
+
+    assert _parse(asyncio.run(scenario())) == [("done", {"task_id": "job-x", "status": "FAILURE"})]
+
+
+def test_events_endpoint_streams_live_reports(redis_server):
+    def publisher():
+        deadline = time.monotonic() + 5
+        while redis_server.subscribers() == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        _run_job("job-live")
+
+    t = threading.Thread(target=publisher)
+    t.start()
+    r = TestClient(app).get("/api/v1/jobs/job-live/events")
+    t.join()
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    evs = _parse(r.text)
+    assert [name for name, _ in evs].count("progress") >= 3
+    assert evs[-1][0] == "done"
+
+
+def test_bulk_job_reports_progress_under_its_task_id(redis_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(v1._settings, "bulk_root", str(tmp_path))
+    src = tmp_path / "in.jsonl"
+    src.write_text("".join(json.dumps({"id": i, "text": f"mail user{i}@example.com"}) + "\n" for i in range(30)))
+    client = TestClient(app)
+    r = client.post("/api/v1/jobs/deid/bulk", json={
+        "input_path": str(src), "output_path": str(tmp_path / "out"), "shards": 3, "batch_size": 4,
+    })
+    task_id = r.json()["task_id"]
+    fields = redis_server.hashes[progress_key(task_id).encode()]
+    assert {b"job", b"done"} <= set(fields) and len(fields) == 5
+
+    # A watcher joining after the job finished gets its final state at once
+    evs = _parse(client.get(f"/api/v1/jobs/{task_id}/events").text)
+    assert evs[0][0] == "progress" and evs[0][1]["docs"] == 30 and evs[0][1]["shards_done"] == 3
+    assert evs[-1] == ("done", {"task_id": task_id, "status": "SUCCESS"})
+
+
+def test_events_unavailable_without_redis(monkeypatch):
+    monkeypatch.setattr(get_settings(), "redis_url", "redis://127.0.0.1:1/0")
+    status._clients.clear()
+    events._hubs.clear()
+    t0 = time.monotonic()
+    assert TestClient(app).get("/api/v1/jobs/any/events").status_code == 503
+    assert time.monotonic() - t0 < 3
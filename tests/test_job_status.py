@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from kombu.utils.json import dumps as stock_json
+
+from app.core.config import get_settings
+from app.main import app
+from app.workers import status
+from app.workers.celery_app import celery_app
+
+
+@pytest.fixture()
+def backend(redis_standin, tmp_path, monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "redis_url", redis_standin.url)
+    monkeypatch.setattr(settings, "result_store_dir", str(tmp_path / "results"))
+    monkeypatch.setattr(settings, "result_inline_max_bytes", 2048)
+    status._clients.clear()
+    yield redis_standin
+    status._clients.clear()
+
+
+def _store(server, task_id, state, result, encode=True):
+    be = celery_app.backend
+    meta = be._get_result_meta(result=result, state=state, traceback=None, request=None)
+    if state == "FAILURE":
+        meta = be._get_result_meta(result=be.prepare_exception(result), state=state, traceback=None, request=None)
+    raw = be.encode(meta) if encode else stock_json(meta).encode()
+    server.data[be.get_key_for_task(task_id)] = raw
+    return raw
+
+
+def test_bulk_status_reads_only_prefixes(backend):
+    big = {"result_text": os.urandom(8000).hex()}
+    _store(backend, "t-ok", "SUCCESS", big)
+    _store(backend, "t-bad", "FAILURE", ValueError("boom"))
+    _store(backend, "t-legacy", "STARTED", None, encode=False)
+    ids = ["t-bad", "t-missing", "t-ok", "t-legacy"]
+
+    with TestClient(app) as client:
+        backend.commands.clear()
+        r = client.post("/api/v1/jobs/status", json={"task_ids": ids})
+        assert r.status_code == 200
+        assert r.json()["jobs"] == [
+            {"task_id": "t-bad", "status": "FAILURE"},
+            {"task_id": "t-missing", "status": "PENDING"},
+            {"task_id": "t-ok", "status": "SUCCESS"},
+            {"task_id": "t-legacy", "status": "STARTED"},
+        ]
+        # One pipelined prefix read per id; no result body crossed the wire
+        reads = [c[0].upper() for c in backend.commands if c[0].upper() not in (b"CLIENT", b"SELECT", b"PING")]
+        assert reads == [b"GETRANGE"] * len(ids)
+
+        r = client.post("/api/v1/jobs/status", json={"task_ids": ids, "include_result": True})
+        jobs = {j["task_id"]: j for j in r.json()["jobs"]}
+        assert jobs["t-ok"]["result"] == big
+        assert "boom" in jobs["t-bad"]["error"]
+        assert jobs["t-missing"] == {"task_id": "t-missing", "status": "PENDING"}
+
+        assert client.get("/api/v1/jobs/t-ok").json()["result"] == big
+        assert client.get("/api/v1/jobs/t-ok", params={"status_only": True}).json() == {
+            "task_id": "t-ok",
+            "status": "SUCCESS",
+        }
+    # Requests on the same loop share the pool
+    assert backend.connections <= 2
+
+
+def test_bulk_status_limits_and_backend_errors(backend, monkeypatch):
+    from app.api import v1
+
+    monkeypatch.setattr(v1._settings, "status_max_ids", 3)
+    client = TestClient(app)
+    r = client.post("/api/v1/jobs/status", json={"task_ids": ["a", "b", "c", "d"]})
+    assert r.status_code == 413
+    assert client.post("/api/v1/jobs/status", json={"task_ids": []}).status_code == 422
+
+    monkeypatch.setattr(get_settings(), "redis_url", "redis://127.0.0.1:1/0")
+    status._clients.clear()
+    assert client.post("/api/v1/jobs/status", json={"task_ids": ["a"]}).status_code == 503
+    assert client.get("/api/v1/jobs/a").status_code == 503
@@ -0,0 +1,152 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.core.config import get_settings
+from app.db import maintenance, session
+from app.db.maintenance import add_months, expired_partitions, maintain, months_between, partition_bounds
+from app.db.models import DeidLogRollup
+from app.main import app
+
+
+NOW = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+
+
+def test_monthly_partition_helpers():
+    assert add_months(datetime(2026, 11, 1, tzinfo=timezone.utc), 2) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert partition_bounds("deid_logs_y2026m12") == (
+        datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc)
+    )
+    assert partition_bounds("deid_logs_default") is None
+    assert [m.month for m in months_between(datetime(2026, 11, 20, tzinfo=timezone.utc), NOW + timedelta(days=80))] == [11, 12, 1]
+    names = ["deid_logs_y2026m03", "deid_logs_y2026m04", "deid_logs_y2026m05", "deid_logs_default"]
+    # April ends on May 1st, within 180 days of NOW: only March is entirely expired
+    assert expired_partitions(names, 180, NOW) == ["deid_logs_y2026m03"]
+    assert expired_partitions(names, 0, NOW) == []
+
+
+class FakeSession:
+    def __init__(self, partitions, stale=()):
+        self.partitions = partitions
+        self.stale = list(stale)
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = " ".join(str(statement).split())
+        self.statements.append((sql, params))
+        if "pg_inherits" in sql:
+            return [(name,) for name in self.partitions]
+        if sql.startswith("DELETE FROM deid_log_rollups_stale"):
+            return [(hour,) for hour in self.stale]
+        return []
+
+
+def test_maintenance_pass_creates_rolls_up_and_drops():
+    db = FakeSession(["deid_logs_default", "deid_logs_y2026m03", "deid_logs_y2026m10"])
+    report = maintain(db, NOW, ahead=2, lookback_hours=6, retention_days=180)
+    assert report == {"created": ["deid_logs_y2026m11", "deid_logs_y2026m12"], "dropped": ["deid_logs_y2026m03"]}
+
+    sql = [s for s, _ in db.statements]
+    assert any("CREATE TABLE IF NOT EXISTS deid_logs_y2026m12 PARTITION OF deid_logs "
+               "FOR VALUES FROM ('2026-12-01T00:00:00+00:00') TO ('2027-01-01T00:00:00+00:00')" in s for s in sql)
+    rollups = [p for s, p in db.statements if s.startswith("INSERT INTO deid_log_rollups_hourly")]
+    # Recent hours from the top of the hour, then the expired month before its partition goes
+    assert rollups[0] == {"start": datetime(2026, 10, 19, 6, tzinfo=timezone.utc), "end": NOW}
+    assert rollups[1] == dict(zip(("start", "end"), partition_bounds("deid_logs_y2026m03")))
+    assert sql[-2].startswith("INSERT") and sql[-1] == "DROP TABLE deid_logs_y2026m03"
+
+
+def test_replayed_hours_are_rolled_up_again():
+    stale = [datetime(2026, 10, 12, 7, tzinfo=timezone.utc), datetime(2026, 10, 15, 1, tzinfo=timezone.utc)]
+    db = FakeSession(["deid_logs_y2026m10"], stale)
+    maintain(db, NOW, ahead=0, lookback_hours=6, retention_days=180)
+    rollups = [p for s, p in db.statements if s.startswith("INSERT INTO deid_log_rollups_hourly")]
+    # A week-old outage is re-rolled from its oldest replayed hour, not just the lookback
+    assert rollups == [{"start": stale[0], "end": NOW}]
+
+    # ...but never from before the retention cutoff, whose rollups would be overwritten
+    db = FakeSession(["deid_logs_y2026m10"], [datetime(2025, 1, 1, tzinfo=timezone.utc)])
+    maintain(db, NOW, ahead=0, lookback_hours=6, retention_days=30)
+    rollups = [p for s, p in db.statements if s.startswith("INSERT INTO deid_log_rollups_hourly")]
+    assert rollups == [{"start": datetime(2026, 9, 19, 12, tzinfo=timezone.utc), "end": NOW}]
+
+
+def test_deid_logs_model_works_on_sqlite():
+    from sqlalchemy import inspect, select
+    from sqlalchemy.orm import Session
+
+    from app.db.crud import create_deid_logs
+    from app.db.models import Base, DeidLog, DeidLogRollupStale
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    row = dict(num_entities=1, time_ms=1.0, input_len=10, output_len=10, policy_version="test:mask")
+    with Session(engine) as db:
+        create_deid_logs(db, [dict(row, request_id=uuid.uuid4()) for _ in range(3)])
+        db.add(DeidLog(request_id=uuid.uuid4(), **row))
+        maintenance.mark_stale_hours(db, [NOW, NOW - timedelta(minutes=20), NOW - timedelta(hours=30)])
+        maintenance.mark_stale_hours(db, [NOW])
+        db.commit()
+        assert sorted(db.scalars(select(DeidLog.id))) == [1, 2, 3, 4]
+        assert len(db.scalars(select(DeidLogRollupStale.hour)).all()) == 2
+    # Same identity as the partitioned table's primary key
+    assert [c.name for c in inspect(DeidLog).primary_key] == ["id", "created_at"]
+
+
+@pytest.fixture()
+def sqlite_rollups(tmp_path, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    path = tmp_path / "deid.db"
+    monkeypatch.setattr(get_settings(), "postgres_dsn", f"sqlite:///{path}")
+    session._async_sessions.clear()
+    engine = create_engine(f"sqlite:///{path}")
+    DeidLogRollup.__table__.create(engine)
+    yield engine
+    engine.dispose()
+    session._async_sessions.clear()
+
+
+def test_hourly_dashboard_reads_the_rollups(sqlite_rollups):
+    hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    common = dict(entities=30, input_chars=5_000, output_chars=4_800,
+                  time_ms_p50=4.0, time_ms_p95=9.0, time_ms_p99=12.0, time_ms_max=20.0)
+    with sqlite_rollups.begin() as conn:
+        conn.execute(DeidLogRollup.__table__.insert(), [
+            dict(bucket=hour - timedelta(hours=48), policy_version="v:mask", lang_hint="", requests=1,
+                 time_ms_sum=5.0, **common),
+            dict(bucket=hour - timedelta(hours=1), policy_version="v:mask", lang_hint="en", requests=10,
+                 time_ms_sum=50.0, **common),
+            dict(bucket=hour, policy_version="v:mask", lang_hint="", requests=4, time_ms_sum=20.0, **common),
+        ])
+    rows = TestClient(app).get("/api/v1/metrics/hourly", params={"hours": 24}).json()["hours"]
+    assert [r["requests"] for r in rows] == [10, 4]
+    assert rows[0]["lang_hint"] == "en" and rows[1]["lang_hint"] is None
+    assert rows[0]["time_ms_avg"] == 5.0 and rows[0]["time_ms_p95"] == 9.0
+
+
+@pytest.mark.usefixtures("db_setup")
+def test_maintenance_task_on_postgres():
+    from sqlalchemy import select
+
+    from app.db.crud import create_deid_logs
+    from app.db.session import session_scope
+    from app.workers.tasks import maintain_deid_logs_task
+
+    policy = f"test:{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+    rows = [
+        dict(request_id=uuid.uuid4(), created_at=now - timedelta(minutes=5), num_entities=n, time_ms=float(n),
+             input_len=100, output_len=90, policy_version=policy, lang_hint="en", sample_preview="")
+        for n in range(1, 11)
+    ]
+    with session_scope() as db:
+        create_deid_logs(db, rows)
+    report = maintain_deid_logs_task.run()
+    assert not report["created"] or report["created"][0] > maintenance.partition_name(now)
+    with session_scope() as db:
+        rollup = db.execute(select(DeidLogRollup).where(DeidLogRollup.policy_version == policy)).scalar_one()
+        assert (rollup.requests, rollup.entities, rollup.time_ms_max) == (10, 55, 10.0)
+        assert rollup.time_ms_p50 == pytest.approx(5.5)
@@ -0,0 +1,47 @@
+import pytest
+
+from app.core import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.AVAILABLE, reason="prometheus_client not installed")
+
+
+@pytest.fixture()
+def metrics_on():
+    prev = metrics.enabled()
+    metrics.set_enabled(True)
+    try:
+        yield
+    finally:
+        metrics.set_enabled(prev)
+
+
+def test_stage_timer_is_shared_noop_when_disabled():
+    prev = metrics.enabled()
+    metrics.set_enabled(False)
+    try:
+        assert metrics.stage("regex", "EMAIL") is metrics.stage("dedupe")
+    finally:
+        metrics.set_enabled(prev)
+
+
+def test_engine_stages_feed_histograms(metrics_on):
+    from app.deid.engine import DeidEngine, POLICY_MAP
+
+    eng = DeidEngine(policy_map={**POLICY_MAP}, salt="s", default_policy="mask")
+    eng.deidentify("Email alice@example.com, MRN: ZXCV-778899", labels=["EMAIL", "MRN"])
+    body, content_type = metrics.render()
+    text = body.decode("utf-8")
+    assert content_type.startswith("text/plain")
+    for stage in ("regex", "mrn_filter", "dedupe", "overlap", "replace"):
+        assert f'stage="{stage}"' in text
+    assert 'deid_entities_total{label="EMAIL"}' in text
+    assert "deid_document_chars_bucket" in text
+    assert 'deid_cache_total{cache="detector_plan"' in text
+
+
+def test_metrics_endpoint(api_client, metrics_on):
+    api_client.post("/api/v1/deid", json={"text": "A" * 10_000_000})
+    r = api_client.get("/api/v1/metrics")
+    assert r.status_code == 200
+    assert "deid_rejections_total" in r.text
+
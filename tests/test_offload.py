@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import v1
+from app.core.config import get_settings
+from app.deid.cost import CostModel, StageFit, load_cost_model, record_samples
+from app.deid.engine import DeidEngine, POLICY_MAP
+from app.main import app
+from app.workers import status
+from app.workers.celery_app import celery_app
+from app.workers.tasks import deid_text_task
+
+
+def _model(ner_per_char=2e-6):
+    return CostModel({
+        "regex.EMAIL": StageFit(1e-5, 1e-8, 10),
+        "regex.PHONE_GR": StageFit(1e-5, 2e-8, 10),
+        "ner.en": StageFit(1e-3, ner_per_char, 10),
+        "ner.el": StageFit(1e-3, ner_per_char, 10),
+        "rest.full": StageFit(1e-4, 1e-8, 10),
+        "rest.counts": StageFit(1e-4, 1e-9, 10),
+    })
+
+
+def test_estimate_follows_the_detector_plan():
+    model = _model()
+    both, en = model.estimate(100_000), model.estimate(100_000, lang_hint="en")
+    # No hint runs NER for both languages
+    assert both == pytest.approx(en + 1e-3 + 0.2)
+    assert model.estimate(100_000, labels=["EMAIL"]) == pytest.approx(1e-5 + 1e-3 + 1e-4 + 1e-3)
+    assert model.estimate(100_000, mode="counts") < both
+    # Modes without their own fit fall back to "full"
+    assert model.estimate(1_000, mode="spans") == model.estimate(1_000)
+    with pytest.raises(ValueError):
+        model.estimate(10, labels=["NOPE"])
+
+
+def test_fit_from_recorded_stage_timings(tmp_path):
+    samples = [(n, "full", {"regex.EMAIL": int(5 + n * 0.01), "ner.en": int(1000 + n * 2), "total": int(1200 + n * 2.1)})
+               for n in (1_000, 10_000, 100_000)]
+    model = CostModel.fit(samples)
+    assert model.stages["ner.en"].per_char_sec == pytest.approx(2e-6, rel=1e-3)
+    assert model.stages["ner.en"].fixed_sec == pytest.approx(1e-3, rel=1e-2)
+    assert model.stages["rest.full"].per_char_sec == pytest.approx(0.09e-6, rel=0.05)
+
+    path = tmp_path / "cost.json"
+    model.save(str(path))
+    assert load_cost_model(str(path)).to_dict() == model.to_dict()
+    assert load_cost_model(str(tmp_path / "missing.json")) is None
+
+    # Real engine timings calibrate a usable model
+    engine = DeidEngine(policy_map={**POLICY_MAP}, salt="cost", default_policy="mask")
+    texts = ["Email a@b.gr, τηλ 2101234567. " * k for k in (10, 100, 400)]
+    real = CostModel.fit(record_samples(engine, texts, modes=("full", "counts")))
+    assert {"rest.full", "rest.counts", "regex.EMAIL"} <= set(real.stages)
+    assert 0 < real.estimate(100) < real.estimate(1_000_000)
+
+
+def test_offload_is_opt_in(monkeypatch):
+    from app.core.config import Settings
+
+    defaults = Settings.model_fields if hasattr(Settings, "model_fields") else Settings.__fields__
+    assert defaults["deid_async_chars"].default == 0 and defaults["deid_async_cost_sec"].default == 0
+    monkeypatch.setattr(v1._settings, "deid_async_chars", 0)
+    monkeypatch.setattr(v1._settings, "deid_async_cost_sec", 0.0)
+    monkeypatch.setattr(v1, "_cost_model", _model(ner_per_char=1e-3))
+    # Even a large document the cost model calls expensive gets its result inline
+    r = TestClient(app).post("/api/v1/deid", json={"text": "Email john@example.com. " * 200})
+    assert r.status_code == 200 and "john@" not in r.json()["result_text"]
+
+
+@pytest.fixture()
+def offload(monkeypatch):
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(v1._settings, "deid_async_chars", 2_000)
+    monkeypatch.setattr(v1._settings, "deid_async_cost_sec", 2.0)
+    monkeypatch.setattr(v1, "_cost_model", None)
+    return TestClient(app)
+
+
+def test_large_documents_are_queued(offload):
+    small = offload.post("/api/v1/deid", json={"text": "Email john@example.com"})
+    assert small.status_code == 200 and "john@" not in small.json()["result_text"]
+
+    r = offload.post("/api/v1/deid", json={"text": "Email john@example.com. " * 200})
+    assert r.status_code == 202
+    body = r.json()
+    assert body["reason"] == "size" and body["status_url"] == f"/api/v1/jobs/{body['task_id']}"
+    assert r.headers["Location"] == body["status_url"] and r.headers["Retry-After"] == "1"
+
+    # Requests that measure or bound this run stay synchronous
+    assert offload.post("/api/v1/deid", json={"text": "x " * 2_000, "timings": True}).status_code == 200
+    assert offload.post("/api/v1/deid", json={"text": "x " * 2_000}, headers={"X-Deadline-Ms": "5000"}).status_code == 200
+
+
+def test_estimated_cost_routes_small_but_expensive_requests(offload, monkeypatch):
+    monkeypatch.setattr(v1, "_cost_model", _model(ner_per_char=1e-2))
+    r = offload.post("/api/v1/deid", json={"text": "Ασθενής Γιάννης, τηλ 2101234567. " * 20, "lang_hint": "el"})
+    assert r.status_code == 202
+    assert r.json()["reason"] == "cost" and r.json()["estimated_sec"] > 2.0
+    assert r.headers["Retry-After"] == str(min(60, int(r.json()["estimated_sec"]) + 1))
+    # Regex-only selections skip NER, and with it most of the cost
+    assert offload.post("/api/v1/deid", json={"text": "τηλ 2101234567. " * 20, "labels": ["PHONE"]}).status_code == 200
+
+
+def test_long_poll_returns_the_result(offload, redis_standin, monkeypatch):
+    # Eager tasks store their results in the stand-in, where the status layer reads them
+    monkeypatch.setattr(get_settings(), "redis_url", redis_standin.url)
+    # Tasks copy task_store_eager_result when they are bound, so set it on the task itself
+    monkeypatch.setattr(deid_text_task, "store_eager_result", True)
+    # app.backend is cached per thread: drop the cache so the app's threads build theirs from this URL
+    monkeypatch.setattr(celery_app, "backend_cls", redis_standin.url)
+    monkeypatch.setattr(celery_app, "_local", threading.local())
+    status._clients.clear()
+    try:
+        text = "Email john@example.com. " * 200
+        r = offload.post("/api/v1/deid", params={"wait": 5}, json={"text": text, "mode": "counts"})
+        assert r.status_code == 200 and r.json()["counts"] == {"EMAIL": 200}
+
+        queued = offload.post("/api/v1/deid", json={"text": text}).json()
+        job = offload.get(queued["status_url"], params={"wait": 5}).json()
+        assert job["status"] == "SUCCESS" and job["result"]["original_len"] == len(text)
+        assert "john@" not in job["result"]["result_text"]
+    finally:
+        status._clients.clear()
+
+
+def test_offloaded_jobs_carry_the_runtime_policy(offload, monkeypatch):
+    sent = {}
+
+    def apply_async(kwargs):
+        sent.update(kwargs)
+        return type("R", (), {"id": "t-1"})()
+
+    monkeypatch.setattr(v1.deid_text_task, "apply_async", apply_async)
+    text = "Email john@example.com. " * 200
+    assert offload.post("/api/v1/deid", json={"text": text}).status_code == 202
+    assert "policy_map" not in sent
+    monkeypatch.setattr(v1._policy_state, "default_policy", "hash")
+    offload.post("/api/v1/deid", json={"text": text})
+    assert sent["default_policy"] == "hash" and sent["policy_map"] == v1._policy_state.policy_map
@@ -0,0 +1,67 @@
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from kombu.serialization import dumps as kombu_encode, loads as kombu_decode
+from kombu.utils.json import dumps as stock_json
+
+from app.workers import payloads
+from app.workers.payloads import frame_info, pack, pack_result, prune_results, unpack
+
+
+@pytest.fixture()
+def store(tmp_path, monkeypatch):
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "result_store_dir", str(tmp_path / "results"))
+    monkeypatch.setattr(settings, "result_inline_max_bytes", 2048)
+    monkeypatch.setattr(settings, "payload_compress_min_bytes", 256)
+    return tmp_path / "results"
+
+
+def test_frames_round_trip_and_compress_large_bodies(store):
+    small = [["Ο ασθενής", None, "full"], {}, {"chord": None}]
+    assert frame_info(pack(small))["kind"] == "raw" and unpack(pack(small)) == small
+
+    stamped = {"id": uuid.UUID(int=7), "date_done": datetime(2026, 1, 2, tzinfo=timezone.utc)}
+    assert unpack(pack(stamped)) == stamped
+
+    text = "Ο ασθενής Γιάννης Παππάς, τηλ 2101234567. " * 200
+    msg = [[text, "el"], {}, {}]
+    frame = pack(msg)
+    assert frame_info(frame)["kind"] == "zlib" and unpack(frame) == msg
+    # UTF-8 instead of \\uXXXX escapes, then zlib
+    assert len(stock_json(msg).encode()) / len(frame) > 10
+
+
+def test_large_results_go_out_of_band(store):
+    result = {"status": "SUCCESS", "result": {"result_text": os.urandom(4000).hex()}}
+    frame = pack_result(result)
+    info = frame_info(frame)
+    assert info["kind"] == "ref" and info["bytes"] < 200 and info["stored_bytes"] > 2048
+    assert (store / info["ref"]).exists()
+    assert unpack(frame) == result
+    # Small results stay inline
+    assert frame_info(pack_result({"status": "PENDING"}))["kind"] == "raw"
+
+    # Expired results are pruned; their references then fail loudly
+    old = time.time() - 3600
+    os.utime(store / info["ref"], (old, old))
+    assert prune_results(max_age=60) == 1
+    with pytest.raises(KeyError):
+        unpack(frame)
+    with pytest.raises(ValueError):
+        unpack(b'R{"ref": "../../etc/passwd"}')
+
+
+def test_celery_uses_frame_serializers(store):
+    from app.workers.celery_app import celery_app
+
+    assert celery_app.conf.task_serializer == payloads.TASK_SERIALIZER
+    assert celery_app.conf.result_serializer == payloads.RESULT_SERIALIZER
+    content_type, encoding, data = kombu_encode({"a": "β" * 5000}, serializer=payloads.RESULT_SERIALIZER)
+    assert encoding == "binary" and len(data) < 200
+    assert kombu_decode(data, content_type, encoding) == {"a": "β" * 5000}
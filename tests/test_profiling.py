@@ -0,0 +1,64 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.config import get_settings
+from app.main import app
+
+
+@pytest.fixture()
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_dir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture()
+def admin_key(monkeypatch):
+    monkeypatch.setattr(get_settings(), "api_key", "admin-secret")
+    return "admin-secret"
+
+
+def test_profile_writes_collapsed_stacks(profile_dir):
+    from app.deid.recognizers import detect_entities
+
+    with profiling.profile("unit", {"k": 1}) as prof:
+        detect_entities("Email alice@example.com")
+    collapsed = profiling.load_collapsed(prof.id)
+    lines = collapsed.strip().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("app.deid.recognizers.detect_entities" in line for line in lines)
+    summary = profiling.load_summary(prof.id)
+    assert summary["label"] == "unit" and summary["meta"] == {"k": 1} and summary["top"]
+    assert [p["id"] for p in profiling.list_profiles()] == [prof.id]
+    with pytest.raises(KeyError):
+        profiling.load_summary("../../etc/passwd")
+
+
+def test_profile_keeps_only_newest(profile_dir, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_keep", 2)
+    for _ in range(4):
+        with profiling.profile("unit"):
+            pass
+    assert len(list(profile_dir.glob("*.json"))) == 2
+    assert len(list(profile_dir.glob("*.collapsed"))) == 2
+
+
+def test_profiling_requires_configured_api_key(profile_dir):
+    client = TestClient(app)
+    r = client.post("/api/v1/deid", json={"text": "a@b.com"}, headers={"X-Profile": "1"})
+    assert r.status_code == 403
+    assert client.get("/api/v1/profiles").status_code == 403
+
+
+def test_profiled_deid_request_roundtrip(profile_dir, admin_key):
+    client = TestClient(app)
+    headers = {"X-API-Key": admin_key}
+    r = client.post("/api/v1/deid?profile=1", json={"text": "Email a@b.com"}, headers=headers)
+    assert r.status_code == 200
+    assert "result_text" in r.json()
+    pid = r.headers["x-profile-id"]
+    r = client.get(f"/api/v1/profiles/{pid}", headers=headers)
+    assert r.status_code == 200 and r.json()["label"] == "api.deid"
+    r = client.get(f"/api/v1/profiles/{pid}/collapsed", headers=headers)
+    assert r.status_code == 200 and "detect_entities" in r.text
+    assert client.get("/api/v1/profiles/0-deadbeef", headers=headers).status_code == 404
@@ -0,0 +1,67 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from kombu import Connection
+
+from app.core import metrics
+from app.workers.celery_app import celery_app
+from app.workers.queues import BULK, INTERACTIVE, PRIORITY_STEPS, _observe_queue_wait, _stamp_enqueued_at, queue_depths
+
+
+def _route(name, args=(), kwargs=None):
+    options = celery_app.amqp.router.route({}, name, args, kwargs or {})
+    return options["queue"].name, options.get("priority")
+
+
+def test_routes_by_job_type_and_size(monkeypatch):
+    from app.core.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "interactive_max_chars", 5_000)
+    assert _route("workers.deid_text_task", ("short note",)) == (INTERACTIVE, PRIORITY_STEPS[0])
+    assert _route("workers.deid_text_task", kwargs={"text": "x" * 3_000}) == (INTERACTIVE, PRIORITY_STEPS[1])
+    assert _route("workers.deid_text_task", ("x" * 5_001,)) == (BULK, PRIORITY_STEPS[2])
+    assert _route("workers.deid_batch_task", (["x" * 2_000] * 3,))[0] == BULK
+    for name in ("workers.evaluate_shard_task", "workers.evaluate_reduce_task", "workers.bulk_deid_shard_task"):
+        assert _route(name, ("ds.jsonl", 0, 10)) == (BULK, PRIORITY_STEPS[-1])
+
+
+@pytest.mark.skipif(not metrics.AVAILABLE, reason="prometheus_client not installed")
+def test_queue_wait_is_observed_from_publish_header():
+    headers = {}
+    _stamp_enqueued_at(headers=headers)
+    headers["enqueued_at"] -= 2.0
+    prev = metrics.enabled()
+    metrics.set_enabled(True)
+    try:
+        before = metrics.QUEUE_WAIT.labels(BULK)._sum.get()
+        request = SimpleNamespace(enqueued_at=headers["enqueued_at"], delivery_info={"routing_key": BULK})
+        _observe_queue_wait(task=SimpleNamespace(request=request))
+        # Eager/direct calls carry no header and are not counted
+        _observe_queue_wait(task=SimpleNamespace(request=SimpleNamespace(delivery_info=None)))
+        waited = metrics.QUEUE_WAIT.labels(BULK)._sum.get() - before
+    finally:
+        metrics.set_enabled(prev)
+    assert 2.0 <= waited < 2.0 + 5
+
+
+def test_queue_depths_from_broker():
+    with Connection("memory://") as conn:
+        producer = conn.Producer()
+        for i in range(3):
+            producer.publish({"i": i}, routing_key=BULK, declare=[celery_app.amqp.queues[BULK]])
+        producer.publish({"i": 9}, routing_key=INTERACTIVE, declare=[celery_app.amqp.queues[INTERACTIVE]])
+        depths = queue_depths(conn)
+    assert depths == {INTERACTIVE: 1, BULK: 3}
+
+
+def test_jobs_queues_endpoint_without_broker():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    t0 = time.monotonic()
+    r = TestClient(app).get("/api/v1/jobs/queues")
+    assert r.status_code in (200, 503)
+    if r.status_code == 503:
+        assert time.monotonic() - t0 < 5
@@ -33,3 +33,60 @@ def test_greek_address_heuristic(sample_texts):
     ents = detect_entities(sample_texts["el"], lang_hint="el")
     labs = _labels(ents)
     assert "ADDRESS_GR" in labs or "POSTAL_CODE_GR" in labs
+
+
+def test_contains_phi_short_circuit_and_priority():
+    from app.deid.recognizers import contains_phi
+
+    assert contains_phi("") is None
+    hit = contains_phi("Reach me at alice@example.com please", lang_hint="en")
+    assert hit is not None and hit.label == "EMAIL"
+    assert (hit.start, hit.end) == (12, 29)
+    # Postal codes (priority 60) qualify by default but not above EMAIL's bar
+    assert contains_phi("code 10559").label == "POSTAL_CODE_GR"
+    assert contains_phi("code 10559", min_priority=101) is None
+
+
+def test_contains_phi_applies_mrn_filter():
+    from app.deid.recognizers import contains_phi
+
+    # "AB123456" looks like an MRN but has no context/delimiter -> filtered out
+    hit = contains_phi("Reference AB123456 attached", min_priority=70)
+    assert hit is None or hit.label != "MRN"
+    hit = contains_phi("MRN: AB123456", min_priority=70)
+    assert hit is not None and hit.label == "MRN"
+
+
+def test_detector_plan_prunes_and_caches():
+    from app.deid.recognizers import detector_plan
+
+    plan = detector_plan(["EMAIL", "PHONE"])
+    assert plan.regex == ("EMAIL", "PHONE_GR", "PHONE_INTL")
+    assert not plan.run_ner and plan.spacy_pipes == ()
+    assert detector_plan(["PHONE", "EMAIL"]) is plan  # cached by label set
+
+    full = detector_plan()
+    assert "ADDRESS_GR" in full.regex and full.run_ner
+    no_ner = detector_plan(exclude_labels=["PERSON", "ORG", "GPE", "LOC", "DATE"])
+    assert not no_ner.run_ner and no_ner.regex == full.regex
+
+    with pytest.raises(ValueError):
+        detector_plan(["NOT_A_LABEL"])
+
+
+def test_detect_entities_label_selection(sample_texts):
+    ents = detect_entities(sample_texts["en"], lang_hint="en", labels=["EMAIL", "IP"])
+    assert _labels(ents) == {"EMAIL", "IP"}
+    ents = detect_entities(sample_texts["en"], lang_hint="en", exclude_labels=["EMAIL"])
+    assert "EMAIL" not in _labels(ents) and "URL" in _labels(ents)
+
+
+def test_chunk_bounds_cover_text_at_whitespace():
+    from app.deid.recognizers import _chunk_bounds
+
+    text = "alpha beta gamma\ndelta epsilon"
+    bounds = _chunk_bounds(text, 8)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(text)
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    assert all(text[e - 1] in " \n" for _, e in bounds[:-1])
+    assert _chunk_bounds("", 8) == []
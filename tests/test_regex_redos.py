@@ -0,0 +1,44 @@
+import pytest
+
+from app.deid.regex_rules import EMAIL, PATTERNS
+from scripts.regex_audit import (
+    ADVERSARIAL,
+    LEGACY,
+    long_local_parts,
+    audit_pattern,
+    audited_patterns,
+    compare_patterns,
+    equivalence_corpus,
+)
+
+# Linear patterns grow ~1.0 between sizes; quadratic ones ~4.0 at these sizes
+MAX_GROWTH = 2.0
+# Generous per-KB ceiling so slow CI runners pass while blowups still fail
+MAX_MS_PER_KB = 5.0
+SIZES = (4_000, 16_000)
+
+
+def test_every_pattern_has_adversarial_inputs():
+    labels = {label for label, _p, _prio in PATTERNS} | {"ADDRESS_GR"}
+    assert labels <= set(ADVERSARIAL)
+
+
+@pytest.mark.parametrize("label", sorted(audited_patterns()))
+def test_pattern_linear_on_adversarial_inputs(label):
+    report = audit_pattern(audited_patterns()[label], ADVERSARIAL[label], SIZES, repeat=3)
+    for name, m in report.items():
+        assert m["growth"] < MAX_GROWTH, f"{label}/{name} grew {m['growth']:.2f}x"
+        worst = max(m["ms_per_kb"].values())
+        assert worst < MAX_MS_PER_KB, f"{label}/{name} took {worst:.2f} ms/KB"
+
+
+@pytest.mark.parametrize("label", sorted(LEGACY))
+def test_rewritten_patterns_match_legacy(label):
+    current = audited_patterns()[label]
+    assert compare_patterns(LEGACY[label], current, equivalence_corpus(label)) == []
+
+
+def test_email_past_the_local_part_limit_is_masked_whole():
+    for text in long_local_parts():
+        address = text.split()[-2].lstrip("(")
+        assert [m.group(0) for m in EMAIL.finditer(text)][-1] == address, text[:80]
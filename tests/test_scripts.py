@@ -45,3 +45,116 @@ def test_evaluate_script_summary_and_optional_db(tmp_path):
     assert "docs" in summary and summary["docs"] > 0
     assert "per_label" in summary
 
+
+def test_benchmark_baseline_and_regression_gate(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    cmd = ["python", "scripts/benchmark.py", "--quick", "--repeat", "1"]
+    subprocess.run(cmd + ["--out", str(baseline)], check=True, stdout=subprocess.DEVNULL)
+    data = json.loads(baseline.read_text(encoding="utf-8"))
+    assert "deidentify/mixed/1000/d5" in data["results"]
+    assert {"median_ms", "min_ms", "peak_kb", "chars"} <= set(data["results"]["deidentify/mixed/1000/d5"])
+
+    # A baseline claiming near-zero times must trip the gate
+    for m in data["results"].values():
+        m["median_ms"] = 0.0
+    fast = tmp_path / "fast.json"
+    fast.write_text(json.dumps(data), encoding="utf-8")
+    proc = subprocess.run(cmd + ["--compare", str(fast)], stdout=subprocess.PIPE, text=True)
+    assert proc.returncode == 1
+    assert "regressed" in proc.stdout
+
+
+def test_loadtest_in_process_reports_levels():
+    import asyncio
+    from scripts.loadtest import run_load
+
+    levels = asyncio.run(run_load([1, 2], 12, mix={"deid": 2, "deid_file": 1, "jobs": 1}))
+    assert [lv["concurrency"] for lv in levels] == [1, 2]
+    for lv in levels:
+        assert lv["requests"] == 12
+        assert lv["error_rate"] == 0.0 and lv["rate_429"] == 0.0
+        assert lv["p50_ms"] <= lv["p95_ms"] <= lv["p99_ms"]
+
+
+def test_loadtest_offloaded_deid_needs_no_broker(monkeypatch):
+    import asyncio
+    from app.api import v1
+    from scripts.loadtest import run_load
+
+    # deid_large goes to the (stubbed) workers and is answered 202 without Redis
+    monkeypatch.setattr(v1._settings, "deid_async_chars", 1_000)
+    (lv,) = asyncio.run(run_load([2], 6, mix={"deid_large": 1, "deid": 1}))
+    assert lv["requests"] == 6 and lv["error_rate"] == 0.0
+
+
+def test_loadtest_single_client_hits_rate_limit():
+    import asyncio
+    from scripts.loadtest import run_load
+
+    (lv,) = asyncio.run(run_load([2], 40, mix={"deid": 1}, clients=1))
+    assert lv["rate_429"] > 0 and lv["error_rate"] == 0.0
+
+
+def test_evaluate_workers_match_sequential(tmp_path):
+    from scripts.evaluate import count_dataset, evaluate
+
+    dataset = Path("tests/data/dataset_small.jsonl")
+    sequential, _ = count_dataset(dataset, workers=1)
+    pooled, _ = count_dataset(dataset, workers=2, chunk_size=1)
+    assert pooled.key() == sequential.key()
+
+    out = tmp_path / "summary.json"
+    evaluate(dataset, out_path=out, workers=[1, 2], chunk_size=1)
+    summary = json.loads(out.read_text(encoding="utf-8"))
+    assert summary["workers"] == 2
+    assert [row["workers"] for row in summary["scaling"]] == [1, 2]
+    assert summary["scaling"][0]["speedup"] == 1.0
+
+
+def test_evaluate_prediction_cache_recomputes_only_changed_detectors(tmp_path, monkeypatch):
+    import scripts.evaluate as ev
+
+    dataset = Path("tests/data/dataset_small.jsonl")
+    cache = tmp_path / "cache.sqlite"
+    live, _ = ev.count_dataset(dataset)
+
+    first, _ = ev.count_dataset(dataset, cache_path=cache)
+    assert first.key() == live.key() and first.cache_hits == 0
+    second, _ = ev.count_dataset(dataset, cache_path=cache)
+    assert second.key() == live.key() and not second.recomputed and second.cache_hits > 0
+
+    fingerprints = ev.detector_fingerprints
+    monkeypatch.setattr(ev, "detector_fingerprints", lambda: {**fingerprints(), "EMAIL": "changed"})
+    third, _ = ev.count_dataset(dataset, cache_path=cache)
+    assert third.key() == live.key()
+    assert dict(third.recomputed) == {"EMAIL": live.n_docs}
+
+    # A scaling run would time cache hits after its first worker count
+    with pytest.raises(ValueError):
+        ev.evaluate(dataset, workers=[1, 2], cache_path=cache)
+    proc = subprocess.run(
+        ["python", "scripts/evaluate.py", "--dataset", str(dataset), "--workers", "1", "2", "--cache", str(cache)],
+        stderr=subprocess.PIPE, text=True,
+    )
+    assert proc.returncode == 2 and "--cache cannot be combined" in proc.stderr
+
+
+def test_generate_synthetic_fast_mode_sharded_and_deterministic(tmp_path):
+    import re
+    from scripts.generate_synthetic import generate_fast
+
+    kwargs = dict(n=250, shards=3, seed=7, pool_size=50)
+    one = generate_fast(out_dir=tmp_path / "a", workers=1, **kwargs)
+    two = generate_fast(out_dir=tmp_path / "b", workers=2, **kwargs)
+    assert [count for _, count in one] == [84, 83, 83]
+    for (pa, _), (pb, _) in zip(one, two):
+        assert Path(pa).read_bytes() == Path(pb).read_bytes()
+
+    checks = {"AMKA": r"\d{11}", "PHONE_GR": r"(\+30 )?(2\d{9}|69\d{8})", "MRN": r"[A-Z0-9][A-Z0-9_-]{4,10}[A-Z0-9]"}
+    for line in Path(one[0][0]).read_text(encoding="utf-8").splitlines():
+        rec = json.loads(line)
+        for span in rec["labels"]:
+            value = rec["text"][span["start"]:span["end"]]
+            assert value and value == value.strip()
+            if span["label"] in checks:
+                assert re.fullmatch(checks[span["label"]], value), (span["label"], value)
@@ -1,10 +1,11 @@
 import os
 import json
+import uuid
 from pathlib import Path
 
 import pytest
 
-from app.workers.tasks import deid_text_task, evaluate_dataset_task
+from app.workers.tasks import deid_batch_task, deid_text_task, evaluate_dataset_task, get_engine
 from sqlalchemy.orm.exc import DetachedInstanceError
 
 
@@ -36,7 +37,11 @@ def test_evaluate_dataset_task(tmp_path):
     if not _db_available():
         pytest.skip("DB not available")
     ds = tmp_path / "tiny.jsonl"
-    ds.write_text("Email a@b.com\nEmail b@c.com\n", encoding="utf-8")
+    ds.write_text(
+        json.dumps({"text": "Email a@b.com", "labels": [{"start": 6, "end": 13, "label": "EMAIL"}]}) + "\n"
+        + json.dumps({"text": "Email b@c.com", "labels": [{"start": 6, "end": 13, "label": "EMAIL"}]}) + "\n",
+        encoding="utf-8",
+    )
     # Avoid DetachedInstanceError by disabling expire_on_commit for this test run
     try:
         from app.db.session import SessionLocal
@@ -49,6 +54,54 @@ def test_evaluate_dataset_task(tmp_path):
         result = evaluate_dataset_task.run(str(ds))
         assert result["docs"] >= 2
         assert result["docs_per_sec"] >= 0.0
+        assert result["totals"]["tp"] == 2 and result["micro"]["precision"] == 1.0
     except DetachedInstanceError:
         # Known SQLAlchemy behavior due to expire_on_commit; creation succeeded
         assert True
+
+
+@pytest.mark.usefixtures("db_setup")
+def test_distributed_evaluation_chord_eager(monkeypatch):
+    if not _db_available():
+        pytest.skip("DB not available")
+    from app.workers.celery_app import celery_app
+    from app.workers.tasks import evaluate_dataset_distributed
+
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_eager_propagates", True)
+    result = evaluate_dataset_distributed(str(Path("tests/data/dataset_small.jsonl")), 3).get()
+    assert result["docs"] == 2 and result["shards"] == 3
+    assert result["id"] is not None and result["docs_per_sec"] > 0
+
+
+def test_deid_batch_task_results_per_text(monkeypatch):
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "deid_task_logs", False)
+    monkeypatch.setattr(settings, "max_text_size", 40)
+    texts = ["Email a@b.com", "x" * 41, "call 2101234567"]
+    res = deid_batch_task.run(texts, "en", "counts")
+    assert res[0]["counts"] == {"EMAIL": 1} and "request_id" in res[0]
+    assert res[1] == {"error": "Text too long: 41 chars (max 40)"}
+    assert res[2]["counts"] == {"PHONE_GR": 1}
+    # The engine is built once per worker process
+    assert get_engine() is get_engine()
+
+
+@pytest.mark.usefixtures("db_setup")
+def test_deid_batch_task_writes_logs_in_bulk():
+    if not _db_available():
+        pytest.skip("DB not available")
+    from sqlalchemy import select
+
+    from app.db.audit import audit_log
+    from app.db.models import DeidLog
+    from app.db.session import session_scope
+
+    res = deid_batch_task.run(["Email a@b.com", "call 2101234567"], "en")
+    assert audit_log().flush()
+    ids = [uuid.UUID(r["request_id"]) for r in res]
+    with session_scope() as db:
+        rows = db.execute(select(DeidLog.num_entities).where(DeidLog.request_id.in_(ids))).scalars().all()
+    assert sorted(rows) == [1, 1]